@@ -0,0 +1,146 @@
+"""
+Логирование slashbot: уровни, JSON для Railway, запись в отдельном потоке.
+
+Модули пишут в logging.getLogger(__name__). setup_logging() вешает на корневой
+логгер QueueHandler: log.info() на event loop только кладёт запись в очередь,
+в stdout пишет поток QueueListener — медленный stdout не тормозит хендлеры.
+
+Частые события (каждое входящее сообщение, каждый чат рассылки, пропуск по
+кулдауну) помечаются extra={"sample": "<ключ>"}: из них проходит первая и
+дальше каждая LOG_SAMPLE_EVERY-я по этому ключу.
+"""
+from __future__ import annotations
+
+import atexit
+import datetime as dt
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper() or "INFO"
+# text — строка для человека, json — одна JSON-запись на строку (фильтры Railway по полям)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+# 1 — писать все частые события; 20 — каждое двадцатое по ключу
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("LOG_SAMPLE_EVERY", "1") or 1))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+# Библиотеки, которые на INFO пишут каждый HTTP-запрос / запуск задачи
+QUIET_LOGGERS = ("httpx", "httpcore", "apscheduler", "hpack")
+
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись → одна строка JSON: ts, level, logger, msg и поля из extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, object] = {
+            "ts": dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Пропускает первую и каждую every-ю запись с одинаковым extra["sample"]; остальные — без ограничений."""
+
+    def __init__(self, every: int) -> None:
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.every == 1:
+            return True
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if seen % self.every:
+            return False
+        record.sample_every = self.every
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладёт запись в очередь как есть: форматирование (msg % args, JSON) делает
+    поток QueueListener, а не event loop. Аргументы логов — строки и числа,
+    поэтому форматировать позже безопасно.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    return JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    *,
+    stream=None,
+    sample_every: Optional[int] = None,
+) -> None:
+    """
+    Настроить корневой логгер (повторный вызов перенастраивает).
+    Пишет поток QueueListener; при выходе процесса очередь дописывается.
+    """
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(_formatter(fmt or LOG_FORMAT))
+
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        handler.addFilter(SampleFilter(LOG_SAMPLE_EVERY if sample_every is None else sample_every))
+
+        # Эти поля LogRecord в формате не используются, а собираются на каждый вызов
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        logging.logAsyncioTasks = False
+
+        root = logging.getLogger()
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Дописать очередь и остановить поток (atexit делает это сам)."""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
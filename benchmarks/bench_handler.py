@@ -0,0 +1,119 @@
+"""
+Микробенчмарк входящего текстового апдейта: стадия приёма (group=-1,
+ingest_text_message) и handle_text_message на фейковых апдейтах, без сети.
+
+    python3 benchmarks/bench_handler.py [--messages 3000] [--sink-delay-us 50]
+
+Данные пишутся во временный каталог; логи бота уходят в /dev/null.
+--sink-delay-us — задержка на каждую запись в вывод (медленный stdout/pipe
+контейнера): видно, сколько апдейт ждёт логирование.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MESSAGES = [
+    "ну короче я посмотрел вчера, там всё как обычно",
+    "кто сегодня обедать идёт?",
+    "клиент опять просит сделать логотип побольше",
+    "залил макет в фигму, гляньте",
+    "ахах да",
+    "а где ссылка на доку по проекту",
+    "завтра созвон в 12?",
+    "котики это гениально",
+    "ребят, у меня интернет отвалился, я с телефона",
+    "ок",
+]
+
+
+class FakeMessage:
+    def __init__(self, text: str, user):
+        self.text = text
+        self.entities = ()
+        self.reply_to_message = None
+        self.from_user = user
+
+    async def reply_text(self, text, **kwargs):
+        return None
+
+
+class SlowSink:
+    """/dev/null, который на каждую запись спит delay секунд."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def make_update(update_id: int, chat, text: str):
+    user = SimpleNamespace(id=1000 + update_id % 7, is_bot=False, username=None, first_name="Тест")
+    return SimpleNamespace(
+        update_id=update_id,
+        message=FakeMessage(text, user),
+        effective_chat=chat,
+        effective_user=user,
+    )
+
+
+async def run(count: int) -> None:
+    import bot
+
+    context = SimpleNamespace(bot=None, job_queue=SimpleNamespace(run_once=lambda *a, **k: None))
+    chats = [
+        ("группа", SimpleNamespace(id=-100500, type="supergroup", title="Бенч")),
+        ("S:P9 works", SimpleNamespace(id=bot.SP9_WORKS_CHAT_ID, type="supergroup", title="S:P9 works")),
+    ]
+    for label, chat in chats:
+        texts = itertools.cycle(MESSAGES)
+        # прогрев: история чата, кэши
+        for i in range(200):
+            update = make_update(i, chat, next(texts))
+            await bot.ingest_text_message(update, context)
+            await bot.handle_text_message(update, context)
+        started = time.perf_counter()
+        for i in range(count):
+            update = make_update(10_000 + i, chat, next(texts))
+            await bot.ingest_text_message(update, context)
+            await bot.handle_text_message(update, context)
+        elapsed = time.perf_counter() - started
+        print(f"{label:>12}: {elapsed / count * 1e6:7.1f} мкс/апдейт", file=sys.__stdout__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sink-delay-us", type=float, default=0.0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("SLASHBOT_DATA_DIR", tempfile.mkdtemp(prefix="slashbot-bench-"))
+    os.environ["OPENAI_API_KEY"] = ""  # никакой сети: мемы только локальные
+    sink = SlowSink(args.sink_delay_us / 1e6)
+    with contextlib.redirect_stdout(sink):
+        from app_logging import setup_logging, shutdown_logging
+
+        setup_logging(stream=sink)
+        asyncio.run(run(args.messages))
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
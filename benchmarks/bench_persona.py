@@ -0,0 +1,37 @@
+"""
+Микробенчмарк синтеза реакций Паши: sample_synthetic по контекстам.
+
+    python3 benchmarks/bench_persona.py [--count 200] [--repeat 5]
+
+Печатает лучшее время на одну реплику (мкс) для каждого контекста.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pasha_persona import compile_tables, sample_synthetic  # noqa: E402
+
+CONTEXTS = [None, "delivered", "mail", "design", "video", "sync", "greeting", "problem"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200, help="реплик за один прогон sample_synthetic")
+    parser.add_argument("--repeat", type=int, default=5, help="сколько прогонов, берётся лучший")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    compile_time = min(timeit.repeat(compile_tables, number=1, repeat=args.repeat))
+    print(f"compile_tables: {compile_time * 1e3:.1f} мс")
+    for context in CONTEXTS:
+        best = min(timeit.repeat(lambda: sample_synthetic(args.count, context), number=1, repeat=args.repeat))
+        print(f"{context or 'любой':>10}: {best / args.count * 1e6:6.1f} мкс/реплика")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Детерминированный синтетический корпус рабочего чата: одинаковый seed — одинаковые
+сообщения на любой машине, так что прогоны бенчмарков сравнимы между собой.
+
+    from corpus import generate_messages, generate_chats
+    generate_messages(1000, seed=0)        # список строк
+    generate_chats(100, 60, seed=0)        # {chat_id: [сообщения]}
+"""
+from __future__ import annotations
+
+import random
+
+SUBJECTS = [
+    "макет", "лендинг", "баннер", "презентация", "логотип", "бриф", "видос", "сторис",
+    "мудборд", "гайдлайн", "прототип", "обложка", "анимация", "превью", "дашборд",
+]
+ACTIONS = [
+    "залил", "поправил", "скинул", "переделал", "отрендерил", "собрал", "выгрузил",
+    "согласовал", "проверил", "обновил", "дожал", "накидал",
+]
+PLACES = ["в фигму", "в драйв", "в тред", "в ноушн", "на сервер", "клиенту", "в чат", "в доку"]
+WHEN = ["сегодня", "завтра", "к обеду", "до вечера", "к пятнице", "после созвона", "в понедельник", "через час"]
+PEOPLE = ["@ikarcev", "@durdach", "@smaev", "Паша", "Саня", "Лёха", "клиент", "менеджер"]
+REACTIONS = [
+    "ок", "ахах да", "го", "норм", "огонь", "ну такое", "+", "++", "жиза", "спс",
+    "понял", "ща гляну", "котики это гениально", "лол", "ага",
+]
+QUESTIONS = [
+    "кто сегодня обедать идёт?",
+    "а где ссылка на доку по проекту?",
+    "созвон в {time} в силе?",
+    "{who}, глянешь {subject}?",
+    "а {subject} уже {action}?",
+    "что по {subject} {when}?",
+    "кто-нибудь знает пароль от {tool}?",
+]
+STATEMENTS = [
+    "{action} {subject} {place}, гляньте",
+    "{who} просит сделать {subject} побольше",
+    "{subject} будет {when}, не раньше",
+    "ну короче я посмотрел {subject}, там всё как обычно",
+    "у меня интернет отвалился, я с телефона",
+    "{subject} {action}, можно отправлять {when}",
+    "клиент опять вернул {subject} на правки",
+    "завтра созвон в {time}, не опаздываем",
+    "вот ссылка https://figma.com/file/{code} на {subject}",
+    "готово, {subject} {action} {place}",
+    "сорян, {subject} будет {when}",
+]
+TIMES = ["10", "11", "12", "14:30", "16", "18"]
+TOOLS = ["фигмы", "драйва", "ноушна", "впна", "сервера"]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        subject=rng.choice(SUBJECTS),
+        action=rng.choice(ACTIONS),
+        place=rng.choice(PLACES),
+        tool=rng.choice(TOOLS),
+        when=rng.choice(WHEN),
+        who=rng.choice(PEOPLE),
+        time=rng.choice(TIMES),
+        code="".join(rng.choice("abcdefghijkmnpqrstuvwxyz0123456789") for _ in range(10)),
+    )
+
+
+def generate_message(rng: random.Random) -> str:
+    """Одно сообщение: короткая реакция, вопрос или реплика по работе."""
+    roll = rng.random()
+    if roll < 0.3:
+        return rng.choice(REACTIONS)
+    if roll < 0.55:
+        return _fill(rng.choice(QUESTIONS), rng)
+    return _fill(rng.choice(STATEMENTS), rng)
+
+
+def generate_messages(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [generate_message(rng) for _ in range(count)]
+
+
+def generate_chats(n_chats: int, per_chat: int, seed: int = 0) -> dict[int, list[str]]:
+    """n_chats групп с отрицательными id, по per_chat сообщений в каждой."""
+    rng = random.Random(seed)
+    return {
+        -1_000_000_000 - index: [generate_message(rng) for _ in range(per_chat)]
+        for index in range(n_chats)
+    }
+
+
+def generate_memes(count: int, seed: int = 0) -> list[str]:
+    """Ответы заглушки LLM: короткие реплики, которые проходят санитайзер мемов."""
+    rng = random.Random(seed)
+    openers = ["ну всё,", "классика:", "итог дня:", "спойлер:", "по факту"]
+    endings = ["а мы нет — дожмём", "и это нормально", "держимся, пацаны", "завтра будет лучше", "как и планировали"]
+    return [
+        f"{rng.choice(openers)} {rng.choice(SUBJECTS)} {rng.choice(ACTIONS)}, {rng.choice(endings)}"
+        for _ in range(count)
+    ]
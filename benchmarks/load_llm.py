@@ -0,0 +1,162 @@
+"""
+Нагрузочный прогон /meme офлайн: N пользователей одновременно зовут force_meme_reply
+(LLM с ретраями → fallback на фразы) против mock_llm.py с задержками и ошибками.
+
+    python3 benchmarks/load_llm.py --users 20 --rounds 10 --latency lognormal:0.4,0.6
+    python3 benchmarks/load_llm.py --latency tail:0.2,0.02,15 --timeout 12      # редкие зависания
+    python3 benchmarks/load_llm.py --error-rate 0.2 --error-status 500,429 --leak-rate 0.1
+    python3 benchmarks/load_llm.py --reject-temperature --api-key k --models gpt-4o-mini
+
+Сначала probe_llm_api (как при старте бота), потом нагрузка. Печатает p50/p95/p99
+латентности /meme, откуда пришёл мем (LLM / фразы / ошибка), исходы запросов к LLM
+и кэша из metrics и статусы заглушки; --out — то же в JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate_chats  # noqa: E402
+from mock_llm import add_fault_arguments, server_from_args  # noqa: E402
+
+LLM_OUTCOMES = ("ok", "http_error", "timeout", "error", "cancelled")
+CACHE_RESULTS = ("hit", "miss")
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_load(meme_replies, users: int, rounds: int, seed: int) -> tuple[list[float], dict[str, int]]:
+    chats = generate_chats(users, 40, seed=seed)
+    for chat_id, messages in chats.items():
+        for text in messages:
+            meme_replies.record_chat_message(chat_id, text, chat_type="supergroup")
+
+    latencies: list[float] = []
+    sources = {"llm": 0, "phrases": 0, "error": 0}
+    served_before = meme_replies.LLM_CANDIDATES.value("accepted")
+
+    async def user(index: int, chat_id: int) -> None:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            meme, error = await meme_replies.force_meme_reply(chat_id, 10_000 + index)
+            latencies.append(time.perf_counter() - started)
+            if error:
+                sources["error"] += 1
+            else:
+                sources["phrases"] += 1
+
+    await asyncio.gather(*(user(index, chat_id) for index, chat_id in enumerate(chats)))
+    # мем от LLM — тот, что прошёл санитайзер; остальное — fallback на фразы
+    from_llm = int(meme_replies.LLM_CANDIDATES.value("accepted") - served_before)
+    sources["llm"] = min(from_llm, sources["phrases"])
+    sources["phrases"] -= sources["llm"]
+    return latencies, sources
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="одновременных пользователей /meme")
+    parser.add_argument("--rounds", type=int, default=10, help="/meme на пользователя подряд")
+    parser.add_argument("--timeout", type=float, default=None, help="MEME_LLM_TIMEOUT_SEC, по умолчанию как в боте")
+    parser.add_argument("--hedge", type=int, default=None, help="MEME_LLM_HEDGE")
+    parser.add_argument("--model", default=None, help="MEME_LLM_MODEL")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON с результатами")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    os.environ["SLASHBOT_DATA_DIR"] = tempfile.mkdtemp(prefix="slashbot-load-")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+    from app_logging import setup_logging
+
+    setup_logging()
+
+    import llm_client
+    import meme_replies
+
+    server = server_from_args(args)
+    overrides = {
+        "OPENAI_API_KEY": args.api_key or "load-test",
+        "OPENAI_BASE_URL": server.start(),
+        "MEME_FORCE_COOLDOWN_SEC": 0.0,
+    }
+    if args.timeout is not None:
+        overrides["MEME_LLM_TIMEOUT_SEC"] = args.timeout
+    if args.hedge is not None:
+        overrides["MEME_LLM_HEDGE"] = max(1, args.hedge)
+    if args.model is not None:
+        overrides["MEME_LLM_MODEL"] = args.model
+    for name, value in overrides.items():
+        setattr(meme_replies, name, value)
+    random.seed(args.seed)
+    outcomes_before = {outcome: meme_replies.LLM_SECONDS.count(outcome) for outcome in LLM_OUTCOMES}
+    cache_before = {result: meme_replies.LLM_CACHE.value(result) for result in CACHE_RESULTS}
+
+    async def scenario():
+        try:
+            probe = await meme_replies.probe_llm_api()
+            started = time.perf_counter()
+            latencies, sources = await run_load(meme_replies, args.users, args.rounds, args.seed)
+            return probe, latencies, sources, time.perf_counter() - started
+        finally:
+            await llm_client.close_llm_client()
+
+    try:
+        (probe_ok, probe_detail), latencies, sources, elapsed = asyncio.run(scenario())
+    finally:
+        server.stop()
+
+    llm_outcomes = {
+        outcome: meme_replies.LLM_SECONDS.count(outcome) - outcomes_before[outcome] for outcome in LLM_OUTCOMES
+    }
+    llm_cache = {result: int(meme_replies.LLM_CACHE.value(result) - cache_before[result]) for result in CACHE_RESULTS}
+    report = {
+        "params": {key: value for key, value in vars(args).items() if key != "out"},
+        "probe": {"ok": probe_ok, "detail": probe_detail},
+        "meme_requests": len(latencies),
+        "throughput_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1e3, 1),
+            "p95": round(percentile(latencies, 0.95) * 1e3, 1),
+            "p99": round(percentile(latencies, 0.99) * 1e3, 1),
+            "max": round(max(latencies) * 1e3, 1),
+            "mean": round(statistics.fmean(latencies) * 1e3, 1),
+        },
+        "meme_source": sources,
+        "llm_requests": llm_outcomes,
+        "llm_cache": llm_cache,
+        "server": {str(key): value for key, value in sorted(server.stats.items(), key=str)},
+    }
+
+    print(f"probe_llm_api: {'✅' if probe_ok else '❌'} {probe_detail}")
+    print(f"/meme: {report['meme_requests']} за {elapsed:.1f}с ({report['throughput_per_sec']}/с), {args.users} пользователей")
+    print("латентность, мс: " + ", ".join(f"{key}={value}" for key, value in report["latency_ms"].items()))
+    print("мем: " + ", ".join(f"{key}={value}" for key, value in sources.items()))
+    print("запросы к LLM: " + ", ".join(f"{key}={value}" for key, value in llm_outcomes.items() if value))
+    print("кэш мемов: " + ", ".join(f"{key}={value}" for key, value in llm_cache.items()))
+    print("заглушка: " + ", ".join(f"{key}={value}" for key, value in report["server"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    with contextlib.suppress(KeyboardInterrupt):
+        sys.exit(main())
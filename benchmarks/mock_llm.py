@@ -0,0 +1,276 @@
+"""
+Локальная заглушка OpenAI-совместимого API для бенчмарков и нагрузочных прогонов:
+POST /v1/chat/completions отвечает детерминированными мемами из corpus.generate_memes.
+Крутится в своём потоке со своим event loop — бот ходит в неё по настоящему HTTP
+(keep-alive), как в OpenAI.
+
+Что умеет подсовывать (всё детерминировано seed):
+  latency            — задержка ответа, см. parse_latency: "lognormal:0.4,0.5", "tail:0.2,0.02,6"
+  error_rate         — доля ответов со статусом из error_statuses (500, 429, 503…)
+  reject_temperature — 400 «Unsupported parameter: 'temperature'», как у o1/gpt-5
+  leak_rate          — доля ответов с утечкой служебного промпта (их должен отбраковать санитайзер)
+  api_key / models   — 401 на чужой ключ, 404 на неизвестную модель
+
+    server = MockLLMServer(latency="lognormal:0.4,0.5", error_rate=0.05)
+    base_url = server.start()          # http://127.0.0.1:<порт>/v1
+    ...
+    server.stop(); server.stats        # Counter по статусам + "leak"
+
+Отдельно: python3 benchmarks/mock_llm.py --port 8099 --latency tail:0.2,0.02,6 --error-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import SUBJECTS, generate_memes  # noqa: E402
+
+Latency = Callable[[random.Random], float]
+
+# Ответы, которые ловит PROMPT_LEAK в meme_replies: служебный focus, протёкший в мем
+LEAK_TEMPLATES = [
+    "ПОСЛЕОБЕДЕННЫЙ мем (15:00 МСК): {subject} почти готов, держимся",
+    "Стиль можно как у дур-дачника: {subject} опять на правках",
+    "РЕЖИМ «ДУР-ДАЧНИК»: {subject} уехал на дачу",
+    "Темы дня: {subject}, созвон, правки",
+]
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+            429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+def parse_latency(spec: Optional[str]) -> Latency:
+    """
+    Распределение задержки в секундах:
+      0 / пусто            — без задержки
+      fixed:S              — всегда S
+      uniform:A,B          — равномерно от A до B
+      normal:MEAN,SD       — нормальное, обрезано снизу нулём
+      lognormal:MEDIAN,SIGMA — длинный правый хвост, как у живого API
+      exp:MEAN             — экспоненциальное
+      tail:BASE,P,SLOW     — BASE, но с вероятностью P — SLOW (редкие зависания для p99)
+    """
+    if not spec or spec.strip() in ("0", "none"):
+        return lambda rng: 0.0
+    kind, _, raw = spec.partition(":")
+    try:
+        args = [float(value) for value in raw.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"Не число в задержке {spec!r}") from None
+    shapes: dict[str, tuple[int, Latency]] = {
+        "fixed": (1, lambda rng: args[0]),
+        "uniform": (2, lambda rng: rng.uniform(args[0], args[1])),
+        "normal": (2, lambda rng: max(0.0, rng.gauss(args[0], args[1]))),
+        "lognormal": (2, lambda rng: rng.lognormvariate(math.log(args[0]), args[1])),
+        "exp": (1, lambda rng: rng.expovariate(1.0 / args[0])),
+        "tail": (3, lambda rng: args[2] if rng.random() < args[1] else args[0]),
+    }
+    if kind not in shapes:
+        raise ValueError(f"Неизвестное распределение задержки {kind!r}: {', '.join(shapes)}")
+    arity, sample = shapes[kind]
+    if len(args) != arity:
+        raise ValueError(f"{kind} ждёт {arity} числа, получено {spec!r}")
+    return sample
+
+
+class MockLLMServer:
+    """HTTP/1.1 сервер на asyncio.start_server; stats — Counter ответов по статусам (+ "leak")."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        seed: int = 0,
+        latency: Optional[str] = None,
+        error_rate: float = 0.0,
+        error_statuses: tuple[int, ...] = (500,),
+        reject_temperature: bool = False,
+        leak_rate: float = 0.0,
+        api_key: Optional[str] = None,
+        models: Optional[tuple[str, ...]] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.reject_temperature = reject_temperature
+        self.leak_rate = leak_rate
+        self.api_key = api_key
+        self.models = models
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._memes = itertools.cycle(generate_memes(256, seed=seed))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def requests(self) -> int:
+        return sum(count for status, count in self.stats.items() if isinstance(status, int))
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._run, name="mock-llm", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # Соединения, брошенные клиентом по таймауту, ещё висят в задержке — добиваем их
+            self._server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def _content(self) -> str:
+        if self.leak_rate and self._rng.random() < self.leak_rate:
+            self.stats["leak"] += 1
+            return self._rng.choice(LEAK_TEMPLATES).format(subject=self._rng.choice(SUBJECTS))
+        return next(self._memes)
+
+    def _completion(self, request: dict) -> dict:
+        n = max(1, int(request.get("n") or 1))
+        return {
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion",
+            "model": request.get("model", "mock"),
+            "choices": [
+                {"index": i, "message": {"role": "assistant", "content": self._content()}, "finish_reason": "stop"}
+                for i in range(n)
+            ],
+        }
+
+    async def _respond(self, path: str, headers: dict[str, str], body: bytes) -> tuple[int, dict]:
+        delay = self.latency(self._rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": f"unknown path {path}"}}
+        if self.api_key is not None and headers.get("authorization") != f"Bearer {self.api_key}":
+            return 401, {"error": {"message": "Incorrect API key provided", "code": "invalid_api_key"}}
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": {"message": "invalid json"}}
+        if self.models is not None and request.get("model") not in self.models:
+            return 404, {"error": {"message": f"The model `{request.get('model')}` does not exist"}}
+        if self.reject_temperature and "temperature" in request:
+            return 400, {"error": {
+                "message": "Unsupported parameter: 'temperature' is not supported with this model.",
+                "param": "temperature",
+            }}
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return self._rng.choice(self.error_statuses), {"error": {"message": "injected failure"}}
+        return 200, self._completion(request)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if method == "POST":
+                    status, payload = await self._respond(path, headers, body)
+                else:
+                    status, payload = 405, {"error": {"message": "method not allowed"}}
+                self.stats[status] += 1
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, asyncio.CancelledError):
+            # CancelledError — stop(): завершаемся тихо, иначе asyncio пишет трейсбек на каждое соединение
+            pass
+        finally:
+            writer.close()
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """Флаги заглушки — общие для mock_llm.py и load_llm.py."""
+    parser.add_argument("--latency", default="0", help="распределение задержки, см. parse_latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов с ошибкой")
+    parser.add_argument("--error-status", default="500", help="статусы ошибок через запятую: 500,429,503")
+    parser.add_argument("--reject-temperature", action="store_true", help="400 на параметр temperature")
+    parser.add_argument("--leak-rate", type=float, default=0.0, help="доля ответов с утечкой промпта")
+    parser.add_argument("--api-key", default=None, help="принимать только этот ключ, иначе 401")
+    parser.add_argument("--models", default=None, help="известные модели через запятую, иначе 404")
+
+
+def server_from_args(args: argparse.Namespace, host: str = "127.0.0.1", port: int = 0) -> MockLLMServer:
+    return MockLLMServer(
+        host,
+        port,
+        seed=args.seed,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(status) for status in args.error_status.split(",")),
+        reject_temperature=args.reject_temperature,
+        leak_rate=args.leak_rate,
+        api_key=args.api_key,
+        models=tuple(args.models.split(",")) if args.models else None,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--seed", type=int, default=0)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"OPENAI_BASE_URL={server.start()}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Офлайн-набор бенчмарков: синтетический корпус чата, фейковые апдейты, заглушка LLM.
+
+    python3 benchmarks/run.py [--scales 1,100,1000] [--out benchmarks/last_run.json]
+    python3 benchmarks/run.py --compare baseline.json            # прогнать и сравнить
+    python3 benchmarks/run.py --compare baseline.json new.json   # только сравнить
+
+Без сети: данные — во временном каталоге, OpenAI — локальная заглушка (mock_llm.py).
+Все результаты — мкс на операцию (меньше — лучше). --compare печатает разницу и
+возвращает код 1, если что-то стало медленнее больше чем на --threshold.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate_chats, generate_messages  # noqa: E402
+
+MESSAGES_PER_CHAT = 60
+STATE_DICTS = (
+    "_chat_history", "_chat_daily_history", "_day_indexes", "_last_meme_reply", "_last_force_meme",
+    "_last_chat_activity", "_silence_nudged_activity", "_chat_types",
+)
+
+
+class StubBot:
+    """Bot без сети: отправки только считаются."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+class FakeMessage:
+    def __init__(self, text: str, user, bot: StubBot):
+        self.text = text
+        self.entities = ()
+        self.reply_to_message = None
+        self.from_user = user
+        self._bot = bot
+
+    async def reply_text(self, text, **kwargs):
+        await self._bot.send_message(None, text)
+
+
+def make_update(update_id: int, chat_id: int, text: str, bot: StubBot):
+    chat = SimpleNamespace(id=chat_id, type="supergroup", title=f"Чат {chat_id}")
+    user = SimpleNamespace(id=1000 + update_id % 7, is_bot=False, username=None, first_name="Тест")
+    return SimpleNamespace(update_id=update_id, message=FakeMessage(text, user, bot), effective_chat=chat, effective_user=user)
+
+
+def per_call_us(fn: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """Медиана из repeat прогонов по number вызовов, мкс на вызов."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return statistics.median(samples) * 1e6
+
+
+def reset_state(meme_replies, persistence) -> None:
+    persistence.flush_pending_writes()
+    for name in STATE_DICTS:
+        getattr(meme_replies, name).clear()
+    meme_replies._journal_seq = 0
+    meme_replies._compacted_seq = 0
+    for path in (meme_replies.MEME_STATE_FILE, meme_replies.MEME_JOURNAL_FILE):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def bench_scale(scale: int, updates: int, seed: int) -> dict[str, float]:
+    import bot
+    import meme_replies
+    import pasha_persona
+    import persistence
+
+    reset_state(meme_replies, persistence)
+    random.seed(seed)
+    chats = generate_chats(scale, MESSAGES_PER_CHAT, seed=seed)
+    chat_ids = list(chats)
+    results: dict[str, float] = {}
+
+    started = time.perf_counter()
+    for chat_id, messages in chats.items():
+        for text in messages:
+            meme_replies.record_chat_message(chat_id, text, chat_type="supergroup")
+    results["record_chat_message"] = (time.perf_counter() - started) / (scale * MESSAGES_PER_CHAT) * 1e6
+
+    ids = itertools.cycle(chat_ids)
+    results["_today_history"] = per_call_us(lambda: meme_replies._today_history(next(ids)), 2000)
+
+    texts = meme_replies._today_history(chat_ids[0])
+    results["_collect_phrases"] = per_call_us(lambda: meme_replies._collect_phrases(texts), 200)
+    results["_build_meme"] = per_call_us(lambda: meme_replies._build_meme(texts), 200)
+
+    corpus = itertools.cycle(generate_messages(500, seed=seed))
+    results["synthesize_reaction"] = per_call_us(lambda: pasha_persona.synthesize_reaction(next(corpus)), 2000)
+
+    def save() -> None:
+        meme_replies.save_meme_state(force=True)
+        persistence.flush_pending_writes()
+
+    results["save_meme_state"] = per_call_us(lambda: meme_replies.save_meme_state(force=True), 5, repeat=3)
+    results["save_meme_state+flush"] = per_call_us(save, 1, repeat=3)
+    results["load_meme_state"] = per_call_us(meme_replies.load_meme_state, 1, repeat=3)
+
+    stub = StubBot()
+    context = SimpleNamespace(bot=stub, job_queue=SimpleNamespace(run_once=lambda *a, **k: None))
+    texts_iter = itertools.cycle(generate_messages(1000, seed=seed + 1))
+
+    async def replay() -> float:
+        started = time.perf_counter()
+        for update_id in range(updates):
+            update = make_update(update_id, chat_ids[update_id % scale], next(texts_iter), stub)
+            await bot.ingest_text_message(update, context)
+            await bot.handle_text_message(update, context)
+        return time.perf_counter() - started
+
+    results["handle_text_message"] = asyncio.run(replay()) / updates * 1e6
+    persistence.flush_pending_writes()
+    return {f"{name}@{scale}": round(value, 3) for name, value in results.items()}
+
+
+def bench_llm(requests: int, seed: int) -> dict[str, float]:
+    import llm_client
+    import meme_replies
+    from mock_llm import MockLLMServer
+
+    server = MockLLMServer(seed=seed)
+    base_url = server.start()
+    recent = generate_messages(40, seed=seed)
+    patches = {"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": base_url}
+    saved = {name: getattr(meme_replies, name) for name in patches}
+    for name, value in patches.items():
+        setattr(meme_replies, name, value)
+
+    async def run() -> tuple[float, float, int]:
+        try:
+            await meme_replies._generate_meme_with_llm("прогрев", recent)
+            started = time.perf_counter()
+            for index in range(requests):
+                await meme_replies._generate_meme_with_llm(recent[index % len(recent)], recent)
+            sequential = (time.perf_counter() - started) / requests
+            started = time.perf_counter()
+            memes = await asyncio.gather(*(
+                meme_replies._generate_meme_with_llm(recent[index % len(recent)], recent)
+                for index in range(requests)
+            ))
+            concurrent = (time.perf_counter() - started) / requests
+            return sequential, concurrent, sum(1 for meme in memes if meme)
+        finally:
+            await llm_client.close_llm_client()
+
+    try:
+        sequential, concurrent, accepted = asyncio.run(run())
+    finally:
+        for name, value in saved.items():
+            setattr(meme_replies, name, value)
+        server.stop()
+    if accepted != requests:
+        print(f"⚠️ заглушка LLM: принято {accepted}/{requests}", file=sys.stderr)
+    return {
+        "llm_sequential": round(sequential * 1e6, 3),
+        "llm_concurrent": round(concurrent * 1e6, 3),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_all(scales: list[int], updates: int, llm_requests: int, seed: int) -> dict:
+    results: dict[str, float] = {}
+    for scale in scales:
+        results.update(bench_scale(scale, updates, seed))
+    if llm_requests:
+        results.update(bench_llm(llm_requests, seed))
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "scales": scales,
+            "updates": updates,
+            "llm_requests": llm_requests,
+            "seed": seed,
+        },
+        "unit": "us",
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """Таблица old → new; 1, если что-то медленнее больше чем на threshold."""
+    old, new = baseline["results"], current["results"]
+    regressions = 0
+    print(f"{'':<32} {'было':>10} {'стало':>10} {'Δ':>8}")
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            cells = [f"{table[name]:.1f}" if name in table else "—" for table in (old, new)]
+            print(f"{name:<32} {cells[0]:>10} {cells[1]:>10}")
+            continue
+        delta = new[name] / old[name] - 1 if old[name] else 0.0
+        mark = ""
+        if delta > threshold:
+            regressions += 1
+            mark = "  ⚠️ медленнее"
+        print(f"{name:<32} {old[name]:>10.1f} {new[name]:>10.1f} {delta:>+8.1%}{mark}")
+    return 1 if regressions else 0
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="1,100,1000", help="сколько чатов в состоянии, через запятую")
+    parser.add_argument("--updates", type=int, default=3000, help="апдейтов через handle_text_message на масштаб")
+    parser.add_argument("--llm-requests", type=int, default=200, help="0 — без LLM")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(BENCH_DIR, "last_run.json"))
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="baseline [новый результат]")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление, доля")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare принимает baseline и, опционально, один новый результат")
+    if args.compare and len(args.compare) == 2:
+        return compare(_load(args.compare[0]), _load(args.compare[1]), args.threshold)
+
+    data_dir = tempfile.mkdtemp(prefix="slashbot-bench-")
+    os.environ["SLASHBOT_DATA_DIR"] = data_dir
+    os.environ["OPENAI_API_KEY"] = ""  # локальные мемы; LLM — только в bench_llm через заглушку
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app_logging import setup_logging
+
+    setup_logging()
+    scales = [int(value) for value in args.scales.split(",") if value.strip()]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run_all(scales, args.updates, args.llm_requests, args.seed)
+
+    with open(args.out, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    if args.compare:
+        return compare(_load(args.compare[0]), report, args.threshold)
+    for name, value in report["results"].items():
+        print(f"{name:<32} {value:>10.1f} мкс")
+    print(f"→ {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
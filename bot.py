@@ -7,11 +7,22 @@ from typing import Optional
 
 from app_data import ensure_data_dir, resolve_data_dir
 
+# Каталог данных — до импорта модулей проекта: panel_jobs, meme_replies и др. берут пути при импорте
 _BOT_ROOT = os.path.dirname(os.path.abspath(__file__))
 if not os.environ.get("SLASHBOT_DATA_DIR"):
     os.environ["SLASHBOT_DATA_DIR"] = resolve_data_dir(_BOT_ROOT)
 ensure_data_dir(os.environ["SLASHBOT_DATA_DIR"])
 
+from app_logging import setup_logging
+import bot_runtime
+import metrics
+from broadcast import broadcast
+from chat_cache import get_chat_cache
+from llm_client import close_llm_client
+import panel_events
+import panel_jobs
+from persistence import flush_pending_writes, write_json
+
 from telegram import Update, Bot, BotCommand
 from telegram.warnings import PTBUserWarning
 # В v20 days уже в формате cron (1=пн, 5=пт) — подавляем предупреждение
@@ -26,19 +37,26 @@ except ModuleNotFoundError:
     BOT_TOKEN = os.getenv('BOT_TOKEN', '')
 import pytz
 import json
+import logging
 from meme_replies import (
+    compact_meme_state,
     force_meme_reply,
     generate_silence_meme,
     generate_sp9_scheduled_meme,
+    llm_hedge_stats,
     load_meme_state,
     maybe_meme_reply,
     mark_meme_sent,
     mark_silence_meme_sent,
     probe_llm_api,
     record_chat_message,
+    roll_daily_histories,
     save_meme_state,
     silence_meme_candidates,
     touch_chat_activity,
+    MEME_LLM_HEDGE,
+    MEME_LLM_HEDGE_MODE,
+    MEME_STATE_COMPACT_SEC,
     SILENCE_MEME_CHECK_SEC,
     SILENCE_MEME_ENABLED,
     SILENCE_MEME_SEC,
@@ -47,12 +65,16 @@ from meme_replies import (
 from pasha_persona import (
     BOT_MENTION,
     BOT_USERNAME,
+    TEAM_ROSTER_RELOAD_SEC,
     generate_pasha_response,
     pasha_reply_in_sp9_works,
     pasha_reply_to_message,
+    reload_team_roster,
     strip_bot_mention,
 )
 
+log = logging.getLogger(__name__)
+
 # Каталог данных (из start_both через SLASHBOT_DATA_DIR) и файлы в нём
 _DATA_DIR = os.environ.get('SLASHBOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
 USERS_FILE = os.path.join(_DATA_DIR, "bot_users.json")
@@ -70,6 +92,15 @@ CHAT_IDS = set()  # Множество ID всех чатов (личных и 
 PASHA_BACKGROUND_COOLDOWN_SEC = 15.0
 _last_pasha_background_reply: dict[tuple[int, int], float] = {}
 _conflict_times: list[float] = []
+_WEB_SERVER: Optional[tuple] = None  # (stop_event, task) веб-панели на loop бота
+
+HANDLER_SECONDS = metrics.histogram(
+    "slashbot_handler_seconds", "Время обработки апдейта хендлером.", ("handler",)
+)
+HANDLER_ERRORS = metrics.counter(
+    "slashbot_handler_errors_total", "Исключения, вылетевшие из хендлера.", ("handler",)
+)
+track_handler = metrics.track_async(HANDLER_SECONDS, HANDLER_ERRORS)
 
 # Фиксированное расписание для чата S:P9 works
 SP9_WORKS_CHAT_ID = int(os.getenv("SP9_WORKS_CHAT_ID", "-1002413642408"))
@@ -95,6 +126,14 @@ def ensure_sp9_chat_registered() -> None:
         add_chat(SP9_WORKS_CHAT_ID, "group", "S:P9 works")
 
 
+def _chat_title(update: Update) -> str:
+    chat = update.effective_chat
+    if getattr(chat, 'title', None):
+        return chat.title
+    user = update.effective_user
+    return f"Личный чат с {user.first_name}" if user else "Личный чат"
+
+
 def sender_username(update: Update) -> Optional[str]:
     user = update.effective_user
     return user.username.lower() if user and user.username else None
@@ -109,9 +148,10 @@ def _background_reply_on_cooldown(update: Update) -> bool:
     now = time.monotonic()
     last = _last_pasha_background_reply.get(key)
     if last is not None and now - last < PASHA_BACKGROUND_COOLDOWN_SEC:
-        print(
-            f"⏭️ Cooldown {PASHA_BACKGROUND_COOLDOWN_SEC:.0f}s: "
-            f"chat={key[0]} user={key[1]} update={update.update_id}"
+        log.info(
+            "⏭️ Cooldown %.0fs: chat=%s user=%s update=%s",
+            PASHA_BACKGROUND_COOLDOWN_SEC, key[0], key[1], update.update_id,
+            extra={"sample": "cooldown"},
         )
         return True
     return False
@@ -157,36 +197,38 @@ def load_users():
                 # Поддержка старого формата (user_ids) и нового (chat_ids)
                 chat_list = users_data.get('chat_ids', users_data.get('user_ids', []))
                 CHAT_IDS = set(chat_list)
-                print(f"👥 Загружено чатов: {len(CHAT_IDS)}")
+                log.info("👥 Загружено чатов: %s", len(CHAT_IDS))
         except Exception as e:
-            print(f"⚠️ Ошибка при загрузке чатов: {e}")
+            log.warning("⚠️ Ошибка при загрузке чатов: %s", e)
             CHAT_IDS = set()
     else:
-        print("👥 Файл чатов не найден, создается новый")
+        log.info("👥 Файл чатов не найден, создается новый")
         CHAT_IDS = set()
 
 def save_users():
-    """Сохраняет список чатов в файл"""
-    try:
-        users_data = {
-            'chat_ids': list(CHAT_IDS)
-        }
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"⚠️ Ошибка при сохранении чатов: {e}")
-        return False
+    """Ставит список чатов в очередь записи (пишет поток persistence)"""
+    write_json(USERS_FILE, {'chat_ids': list(CHAT_IDS)}, on_written=lambda: panel_events.publish("chats"))
+    return True
 
-def add_chat(chat_id, chat_type="unknown", chat_title="Unknown"):
-    """Добавляет чат в базу для рассылки"""
+def add_chat(chat_id, chat_type="unknown", chat_title="Unknown", chat=None):
+    """Добавляет чат в базу для рассылки; chat (update.effective_chat) освежает кеш веб-панели"""
     global CHAT_IDS
+    if chat is not None:
+        get_chat_cache().remember_chat(chat)
     if chat_id not in CHAT_IDS:
         CHAT_IDS.add(chat_id)
         save_users()
-        print(f"➕ Добавлен новый чат: {chat_id} | Тип: {chat_type} | Название: {chat_title}")
+        log.info("➕ Добавлен новый чат: %s | Тип: %s | Название: %s", chat_id, chat_type, chat_title)
     return True
 
+def drop_chat(chat_id, reason=""):
+    """Убирает чат из рассылки: бота выгнали / заблокировали / чата больше нет"""
+    get_chat_cache().forget(chat_id)
+    if chat_id in CHAT_IDS:
+        CHAT_IDS.discard(chat_id)
+        save_users()
+        log.info("➖ Чат %s убран из рассылки: %s", chat_id, reason)
+
 def load_settings():
     """Загружает настройки из файла"""
     global SCHEDULED_CHAT_ID, SCHEDULED_TIME, SCHEDULED_TIMEZONE
@@ -205,33 +247,33 @@ def load_settings():
                 timezone_str = settings.get('scheduled_timezone', 'Europe/Moscow')
                 SCHEDULED_TIMEZONE = pytz.timezone(timezone_str)
                 
-                print(f"📂 Настройки загружены:")
-                print(f"   Chat ID: {SCHEDULED_CHAT_ID}")
-                print(f"   Время: {SCHEDULED_TIME.strftime('%H:%M')}")
-                print(f"   Часовой пояс: {timezone_str}")
+                log.info("📂 Настройки загружены:")
+                log.info("   Chat ID: %s", SCHEDULED_CHAT_ID)
+                log.info("   Время: %s", SCHEDULED_TIME.strftime('%H:%M'))
+                log.info("   Часовой пояс: %s", timezone_str)
         except Exception as e:
-            print(f"⚠️ Ошибка при загрузке настроек: {e}")
+            log.warning("⚠️ Ошибка при загрузке настроек: %s", e)
     else:
-        print("📂 Файл настроек не найден, используются настройки по умолчанию")
+        log.info("📂 Файл настроек не найден, используются настройки по умолчанию")
 
 def save_settings():
-    """Сохраняет настройки в файл"""
-    try:
-        settings = {
-            'scheduled_chat_id': SCHEDULED_CHAT_ID,
-            'scheduled_time': SCHEDULED_TIME.strftime('%H:%M'),
-            'scheduled_timezone': str(SCHEDULED_TIMEZONE)
-        }
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, ensure_ascii=False, indent=2)
-        print(f"💾 Настройки сохранены:")
-        print(f"   Chat ID: {SCHEDULED_CHAT_ID}")
-        print(f"   Время: {SCHEDULED_TIME.strftime('%H:%M')}")
-        print(f"   Часовой пояс: {SCHEDULED_TIMEZONE}")
-        return True
-    except Exception as e:
-        print(f"⚠️ Ошибка при сохранении настроек: {e}")
-        return False
+    """Ставит настройки в очередь записи (пишет поток persistence)"""
+    settings = {
+        'scheduled_chat_id': SCHEDULED_CHAT_ID,
+        'scheduled_time': SCHEDULED_TIME.strftime('%H:%M'),
+        'scheduled_timezone': str(SCHEDULED_TIMEZONE)
+    }
+
+    def on_written():
+        # Вызывается потоком persistence, когда файл уже на диске — до этого настройки только в очереди
+        log.info("💾 Настройки сохранены:")
+        log.info("   Chat ID: %s", settings['scheduled_chat_id'])
+        log.info("   Время: %s", settings['scheduled_time'])
+        log.info("   Часовой пояс: %s", settings['scheduled_timezone'])
+        panel_events.publish("scheduled")
+
+    write_json(SETTINGS_FILE, settings, on_written=on_written)
+    return True
 
 # Список прикольных ответов на команды
 FUN_RESPONSES = [
@@ -300,8 +342,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Добавляем чат в базу для рассылки
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
-    chat_title = update.effective_chat.title if hasattr(update.effective_chat, 'title') else f"Личный чат с {update.effective_user.first_name}"
-    add_chat(chat_id, chat_type, chat_title)
+    chat_title = _chat_title(update)
+    add_chat(chat_id, chat_type, chat_title, chat=update.effective_chat)
     
     welcome_message = f"""
 🤖 Привет! Я @ag_slashbot — бот, который отвечает в стиле Паши Чуприна.
@@ -331,14 +373,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     await update.message.reply_text(welcome_message)
 
+@track_handler
 async def handle_any_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Универсальный обработчик для любых команд"""
     # Добавляем чат в базу для рассылки
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
-    chat_title = update.effective_chat.title if hasattr(update.effective_chat, 'title') else f"Личный чат с {update.effective_user.first_name}"
-    add_chat(chat_id, chat_type, chat_title)
-    touch_chat_activity(chat_id, chat_type)
+    chat_title = _chat_title(update)
+    add_chat(chat_id, chat_type, chat_title, chat=update.effective_chat)
     
     command = update.message.text[1:].split('@')[0].strip()  # Убираем слеш и @botname
     
@@ -375,7 +417,7 @@ async def handle_any_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_to_text=reply_to_text,
         )
         if meme:
-            print(f"🎭 Force meme в чат {chat_id}: {meme}")
+            log.info("🎭 Force meme в чат %s: %s", chat_id, meme)
             await update.message.reply_text(meme)
         else:
             await update.message.reply_text(error or "не вышло")
@@ -395,12 +437,13 @@ async def handle_any_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     reply = generate_pasha_response(command=cmd_base, username=sender_username(update))
     await update.message.reply_text(reply)
 
+@track_handler
 async def meme_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /meme — принудительный мем по чату или тексту после команды."""
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
     chat_title = update.effective_chat.title if hasattr(update.effective_chat, 'title') else "Личный чат"
-    add_chat(chat_id, chat_type, chat_title)
+    add_chat(chat_id, chat_type, chat_title, chat=update.effective_chat)
 
     user = update.effective_user
     if not user:
@@ -418,7 +461,7 @@ async def meme_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         reply_to_text=reply_to_text,
     )
     if meme:
-        print(f"🎭 Force meme в чат {chat_id}: {meme}")
+        log.info("🎭 Force meme в чат %s: %s", chat_id, meme)
         await update.message.reply_text(meme)
         return
     await update.message.reply_text(error or "не вышло")
@@ -429,6 +472,7 @@ async def pasha_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         update.effective_chat.id,
         update.effective_chat.type,
         update.effective_chat.title if hasattr(update.effective_chat, 'title') else "Личный чат",
+        chat=update.effective_chat,
     )
     prompt = " ".join(context.args).strip() if context.args else None
     reply = generate_pasha_response(text=prompt, command="pasha", username=sender_username(update))
@@ -477,7 +521,7 @@ async def chat_id_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
     chat_title = update.effective_chat.title if hasattr(update.effective_chat, 'title') else "Личный чат"
-    add_chat(chat_id, chat_type, chat_title)
+    add_chat(chat_id, chat_type, chat_title, chat=update.effective_chat)
     await update.message.reply_text(
         f"🆔 **ID этого чата:** `{chat_id}`\n\n"
         "Чтобы он появился в веб-панели: открой панель → блок «Добавить чат» → вставь этот ID и нажми «Добавить».",
@@ -699,12 +743,12 @@ async def set_bot_name_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await bot.set_my_name(new_name)
         
         await update.message.reply_text(f"✅ Имя бота изменено на: {new_name}")
-        print(f"✅ Имя бота изменено на: {new_name}")
+        log.info("✅ Имя бота изменено на: %s", new_name)
         
     except Exception as e:
         error_msg = f"❌ Ошибка при изменении имени бота: {str(e)}"
         await update.message.reply_text(error_msg)
-        print(error_msg)
+        log.error(error_msg)
 
 async def set_bot_description_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /set_bot_description - устанавливает описание бота"""
@@ -733,12 +777,12 @@ async def set_bot_description_command(update: Update, context: ContextTypes.DEFA
         await bot.set_my_description(new_description)
         
         await update.message.reply_text(f"✅ Описание бота изменено на: {new_description}")
-        print(f"✅ Описание бота изменено на: {new_description}")
+        log.info("✅ Описание бота изменено на: %s", new_description)
         
     except Exception as e:
         error_msg = f"❌ Ошибка при изменении описания бота: {str(e)}"
         await update.message.reply_text(error_msg)
-        print(error_msg)
+        log.error(error_msg)
 
 async def get_bot_info_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /bot_info - показывает информацию о боте"""
@@ -760,24 +804,30 @@ async def get_bot_info_command(update: Update, context: ContextTypes.DEFAULT_TYP
 
 💡 Для изменения имени используйте: /set_bot_name
 💡 Для изменения описания используйте: /set_bot_description"""
+        if MEME_LLM_HEDGE > 1:
+            hedge = llm_hedge_stats()
+            message += (
+                f"\n\n🧠 LLM-хедж ×{MEME_LLM_HEDGE} ({MEME_LLM_HEDGE_MODE}): "
+                f"впустую {hedge['wasted']} из {hedge['candidates']} кандидатов"
+            )
         
         await update.message.reply_text(message)
         
     except Exception as e:
         error_msg = f"❌ Ошибка при получении информации о боте: {str(e)}"
         await update.message.reply_text(error_msg)
-        print(error_msg)
+        log.error(error_msg)
 
 async def test_message_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /test_message - тестирует отправку сообщения в текущий чат"""
     try:
         chat_id = update.effective_chat.id
         await update.message.reply_text("🧪 Тестовое сообщение отправлено успешно!")
-        print(f"✅ Тестовое сообщение отправлено в чат {chat_id}")
+        log.info("✅ Тестовое сообщение отправлено в чат %s", chat_id)
     except Exception as e:
         error_msg = f"❌ Ошибка при отправке тестового сообщения: {str(e)}"
         await update.message.reply_text(error_msg)
-        print(error_msg)
+        log.error(error_msg)
 
 async def send_delayed_message(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет отложенное сообщение 'Заход на завод'"""
@@ -795,33 +845,23 @@ async def send_scheduled_maket_message(context: ContextTypes.DEFAULT_TYPE) -> No
                 chat_id=SCHEDULED_CHAT_ID,
                 text="Че как там по макетам"
             )
-            print(f"✅ Отправлено запланированное сообщение в чат {SCHEDULED_CHAT_ID}")
+            log.info("✅ Отправлено запланированное сообщение в чат %s", SCHEDULED_CHAT_ID)
         except Exception as e:
-            print(f"❌ Ошибка при отправке запланированного сообщения в чат {SCHEDULED_CHAT_ID}: {e}")
+            log.error("❌ Ошибка при отправке запланированного сообщения в чат %s: %s", SCHEDULED_CHAT_ID, e)
     else:
-        print("⚠️ SCHEDULED_CHAT_ID не настроен")
+        log.warning("⚠️ SCHEDULED_CHAT_ID не настроен")
 
 async def send_friday_broadcast(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет сообщение во все чаты (личные и групповые) по пятницам в 17:50 МСК"""
     message_text = "Эх, а скоро дудосинг..."
-    success_count = 0
-    error_count = 0
     
-    print(f"📢 Начало пятничной рассылки во все чаты ({len(CHAT_IDS)} шт.)")
+    log.info("📢 Начало пятничной рассылки во все чаты (%s шт.)", len(CHAT_IDS))
     
-    for chat_id in CHAT_IDS:
-        try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=message_text
-            )
-            success_count += 1
-            print(f"✅ Отправлено в чат {chat_id}")
-        except Exception as e:
-            error_count += 1
-            print(f"❌ Ошибка при отправке в чат {chat_id}: {e}")
+    report = await broadcast(context.bot, list(CHAT_IDS), message_text, on_drop=drop_chat)
+    for chat_id, error in report.failed.items():
+        log.error("❌ Ошибка при отправке в чат %s: %s", chat_id, error, extra={"sample": "broadcast_failed"})
     
-    print(f"📊 Рассылка завершена: успешно={success_count}, ошибок={error_count}")
+    log.info("📊 Рассылка завершена: %s", report.summary())
 
 async def check_sp9_group_access(app: Application) -> None:
     """Проверяет, видит ли бот сообщения в S:P9 works (admin или Group Privacy off)."""
@@ -830,27 +870,27 @@ async def check_sp9_group_access(app: Application) -> None:
         member = await app.bot.get_chat_member(SP9_WORKS_CHAT_ID, me.id)
         status = getattr(member, "status", "")
         if status in ("administrator", "creator"):
-            print(f"✅ SP9 works: бот — {status}, видит все сообщения группы")
+            log.info("✅ SP9 works: бот — %s, видит все сообщения группы", status)
             return
         if getattr(me, "can_read_all_group_messages", False):
-            print("✅ SP9 works: бот не админ, но Group Privacy OFF — видит обычные сообщения группы")
+            log.info("✅ SP9 works: бот не админ, но Group Privacy OFF — видит обычные сообщения группы")
             return
-        print("⚠️ SP9 works: бот НЕ администратор группы")
-        print("   Group Privacy, похоже, включена: бот не видит обычные сообщения → нет рандомных ответов и истории для мемов.")
-        print("   Исправление (одно из двух):")
-        print("   1. @BotFather → Bot Settings → Group Privacy → Turn off")
-        print("   2. Назначить @ag_slashbot администратором чата S:P9 works")
+        log.warning("⚠️ SP9 works: бот НЕ администратор группы")
+        log.info("   Group Privacy, похоже, включена: бот не видит обычные сообщения → нет рандомных ответов и истории для мемов.")
+        log.info("   Исправление (одно из двух):")
+        log.info("   1. @BotFather → Bot Settings → Group Privacy → Turn off")
+        log.info("   2. Назначить @ag_slashbot администратором чата S:P9 works")
     except Exception as exc:
-        print(f"⚠️ SP9 works: не удалось проверить доступ к группе {SP9_WORKS_CHAT_ID}: {exc}")
+        log.warning("⚠️ SP9 works: не удалось проверить доступ к группе %s: %s", SP9_WORKS_CHAT_ID, exc)
 
 
 async def send_sp9_sync_message(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет в S:P9 works сообщение 'Синкуемся?' по будням в 12:00 МСК."""
     try:
         await context.bot.send_message(chat_id=SP9_WORKS_CHAT_ID, text=SP9_SYNC_TEXT)
-        print(f"✅ SP9 sync отправлен в чат {SP9_WORKS_CHAT_ID}")
+        log.info("✅ SP9 sync отправлен в чат %s", SP9_WORKS_CHAT_ID)
     except Exception as e:
-        print(f"❌ Ошибка SP9 sync в чат {SP9_WORKS_CHAT_ID}: {e}")
+        log.error("❌ Ошибка SP9 sync в чат %s: %s", SP9_WORKS_CHAT_ID, e)
 
 
 async def send_sp9_scheduled_meme(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -863,28 +903,43 @@ async def send_sp9_scheduled_meme(context: ContextTypes.DEFAULT_TYPE) -> None:
 
     meme = await generate_sp9_scheduled_meme(SP9_WORKS_CHAT_ID, slot)
     if not meme:
-        print(f"⏭️ SP9 scheduled meme ({slot}): не сгенерировали для чата {SP9_WORKS_CHAT_ID}")
+        log.info("⏭️ SP9 scheduled meme (%s): не сгенерировали для чата %s", slot, SP9_WORKS_CHAT_ID)
         return
 
     try:
         await context.bot.send_message(chat_id=SP9_WORKS_CHAT_ID, text=meme)
         mark_meme_sent(SP9_WORKS_CHAT_ID)
         label = {"afternoon": "🌤️", "evening": "🌆", "evening_friday": "🍻"}.get(slot, "🎭")
-        print(f"{label} SP9 scheduled meme ({slot}) в чат {SP9_WORKS_CHAT_ID}: {meme}")
+        log.info("%s SP9 scheduled meme (%s) в чат %s: %s", label, slot, SP9_WORKS_CHAT_ID, meme)
     except Exception as e:
-        print(f"❌ SP9 scheduled meme ({slot}) ошибка в чат {SP9_WORKS_CHAT_ID}: {e}")
+        log.error("❌ SP9 scheduled meme (%s) ошибка в чат %s: %s", slot, SP9_WORKS_CHAT_ID, e)
 
 
-async def track_chat_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Любое текстовое сообщение человека — активность чата (для мема после тишины)."""
+def _human_text_chat(update: Update):
+    """Чат текстового сообщения человека; None — не текст, бот или апдейт без чата."""
     if not (update.message and update.message.text):
-        return
+        return None
     if update.effective_user and update.effective_user.is_bot:
-        return
-    chat = update.effective_chat
-    if not chat:
-        return
-    touch_chat_activity(chat.id, chat.type)
+        return None
+    return update.effective_chat
+
+
+@track_handler
+async def ingest_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Стадия приёма (group=-1) для текста без команды: история чата и активность
+    одной записью журнала. Дальше handle_text_message только решает, отвечать ли.
+    """
+    chat = _human_text_chat(update)
+    if chat:
+        record_chat_message(chat.id, update.message.text, chat_type=chat.type)
+
+
+async def track_chat_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команды (и прочий текст мимо ingest_text_message) — только активность чата (для мема после тишины)."""
+    chat = _human_text_chat(update)
+    if chat:
+        touch_chat_activity(chat.id, chat.type)
 
 
 async def check_silence_memes(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -892,20 +947,145 @@ async def check_silence_memes(context: ContextTypes.DEFAULT_TYPE) -> None:
     for chat_id in silence_meme_candidates():
         meme = await generate_silence_meme(chat_id)
         if not meme:
-            print(f"⏭️ Silence meme: не сгенерировали для чата {chat_id}")
+            log.info("⏭️ Silence meme: не сгенерировали для чата %s", chat_id)
             continue
         try:
             await context.bot.send_message(chat_id=chat_id, text=meme)
             mark_silence_meme_sent(chat_id)
-            print(f"🤫 Silence meme в чат {chat_id}: {meme}")
+            log.info("🤫 Silence meme в чат %s: %s", chat_id, meme)
         except Exception as e:
-            print(f"❌ Silence meme ошибка в чат {chat_id}: {e}")
+            log.error("❌ Silence meme ошибка в чат %s: %s", chat_id, e)
+
+async def compact_meme_state_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сворачивает журнал истории чатов в снапшот meme_state.json."""
+    compact_meme_state()
+
+async def roll_meme_day_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Полночь по МСК: вчерашняя дневная история чатов уходит целиком."""
+    rolled = roll_daily_histories()
+    if rolled:
+        log.info("🌙 Новый день: дневная история сброшена в %s чат(ах)", rolled)
+
+async def reload_team_roster_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Подхватить правки team_roster.json без рестарта."""
+    reload_team_roster()
+
+async def start_web_server(port: int) -> None:
+    """Веб-панель (Quart + Hypercorn) на event loop бота: маршруты используют application.bot напрямую.
+    Повторный вызов при живом сервере ничего не делает — порт не занимается дважды."""
+    global _WEB_SERVER
+    import web_app
+
+    if _WEB_SERVER is not None and not _WEB_SERVER[1].done():
+        return
+
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(web_app.serve(port, shutdown_trigger=stop_event.wait))
+
+    def _report_exit(done: asyncio.Task) -> None:
+        if not done.cancelled() and done.exception():
+            log.error("❌ Веб-панель упала: %s", done.exception())
+
+    task.add_done_callback(_report_exit)
+    _WEB_SERVER = (stop_event, task)
+    log.info("🌐 Веб-панель: http://0.0.0.0:%s", port)
+
+async def stop_web_server() -> None:
+    global _WEB_SERVER
+    if _WEB_SERVER is None:
+        return
+    stop_event, task = _WEB_SERVER
+    _WEB_SERVER = None
+    stop_event.set()
+    try:
+        await asyncio.wait_for(task, timeout=10.0)
+    except asyncio.TimeoutError:
+        task.cancel()
+    except Exception:
+        pass
+
+async def setup_webhook(app: Application) -> None:
+    """Регистрирует WEBHOOK_URL в Telegram; без него — только локальный приём (curl)."""
+    url = bot_runtime.webhook_full_url()
+    if not url:
+        log.warning("⚠️ WEBHOOK_URL не задан — set_webhook пропущен, апдейты можно слать POST'ом вручную")
+        return
+    await app.bot.set_webhook(
+        url=url,
+        secret_token=bot_runtime.WEBHOOK_SECRET or None,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+    )
+    log.info("🪝 Webhook установлен: %s", url)
+
+async def run_application(application: Application, web_port: Optional[int] = None) -> None:
+    """
+    Жизненный цикл Application без run_polling: веб-панель (и healthcheck на PORT) поднимается
+    до initialize() — getMe и паузы между повторами при недоступном Telegram её не держат.
+    Polling или webhook (апдейты приходят из веб-сервера через bot_runtime) — по BOT_MODE.
+    """
+    import signal
+    import telegram.error
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    if web_port:
+        await start_web_server(web_port)
+    try:
+        # Повторные попытки при временных сетевых ошибках; веб-панель всё это время отвечает
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                await _run_until_stopped(application, stop_event)
+                return
+            except (telegram.error.TimedOut, telegram.error.NetworkError, OSError) as e:
+                if attempt < max_retries - 1:
+                    wait = 10 * (attempt + 1)
+                    log.warning("⚠️ Ошибка сети (%s). Повтор через %s сек... (попытка %s/%s)", e, wait, attempt + 1, max_retries)
+                    await asyncio.sleep(wait)
+                else:
+                    log.error("❌ Не удалось подключиться к Telegram API после нескольких попыток.")
+                    log.info("   Проверьте интернет, VPN и доступ к api.telegram.org")
+                    raise
+    finally:
+        await stop_web_server()
+
+async def _run_until_stopped(application: Application, stop_event: asyncio.Event) -> None:
+    """initialize → post_init → start → (polling) → ждать stop_event; post_shutdown — даже если post_init упал."""
+    try:
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            if not bot_runtime.webhook_mode():
+                await application.updater.start_polling(drop_pending_updates=True)
+            await stop_event.wait()
+        finally:
+            if application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def reload_settings(application):
+    """Веб-панель поменяла bot_settings.json — перечитать и переставить задачу расписания"""
+    load_settings()
+    restart_scheduled_job(application)
 
 def restart_scheduled_job(application):
     """Перезапускает задачу расписания с новыми настройками"""
     job_queue = application.job_queue
     if job_queue is None:
-        print("⚠️ JobQueue не инициализирована. Установите зависимости python-telegram-bot[job-queue] и перезапустите бота")
+        log.warning("⚠️ JobQueue не инициализирована. Установите зависимости python-telegram-bot[job-queue] и перезапустите бота")
         return
     
     # Удаляем старую задачу
@@ -913,7 +1093,7 @@ def restart_scheduled_job(application):
         jobs = job_queue.get_jobs_by_name('daily_maket_reminder')
         for job in jobs:
             job.schedule_removal()
-        print("🗑️ Старая задача расписания удалена")
+        log.info("🗑️ Старая задача расписания удалена")
     except:
         pass
     
@@ -927,12 +1107,17 @@ def restart_scheduled_job(application):
             chat_id=SCHEDULED_CHAT_ID,
             data=None
         )
-        print(f"🔄 Задача расписания перезапущена: {SCHEDULED_TIME.strftime('%H:%M')} ({SCHEDULED_TIMEZONE}) для чата {SCHEDULED_CHAT_ID}")
+        log.info("🔄 Задача расписания перезапущена: %s (%s) для чата %s", SCHEDULED_TIME.strftime('%H:%M'), SCHEDULED_TIMEZONE, SCHEDULED_CHAT_ID)
     else:
-        print("⚠️ Не удалось перезапустить задачу: SCHEDULED_CHAT_ID не настроен")
+        log.warning("⚠️ Не удалось перезапустить задачу: SCHEDULED_CHAT_ID не настроен")
 
+@track_handler
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Текстовые сообщения: триггеры и ответы в стиле Паши."""
+    """
+    Текстовые сообщения: триггеры и ответы в стиле Паши.
+    История и активность уже записаны в ingest_text_message (group=-1);
+    здесь стадии идут от дешёвых к дорогим, и первая сработавшая отвечает.
+    """
     if not (update.message and update.message.text):
         return
 
@@ -942,18 +1127,18 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     message_text = update.message.text
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
-    chat_title = update.effective_chat.title if hasattr(update.effective_chat, 'title') else f"Личный чат с {update.effective_user.first_name}"
 
-    add_chat(chat_id, chat_type, chat_title)
-    record_chat_message(chat_id, message_text)
-    touch_chat_activity(chat_id, chat_type)
+    add_chat(chat_id, chat_type, _chat_title(update), chat=update.effective_chat)
 
-    print(f"📨 Получено сообщение: {message_text}")
-    print(f"   Update ID: {update.update_id} | Chat ID: {chat_id} | Тип: {chat_type} | Название: {chat_title}")
+    log.info(
+        "📨 Получено сообщение: %s",
+        message_text,
+        extra={"sample": "incoming", "update_id": update.update_id, "chat_id": chat_id, "chat_type": chat_type},
+    )
 
     # «Заход» — отложенное сообщение (как раньше)
     if "Заход" in message_text or "заход" in message_text:
-        print(f"✅ Обнаружено слово 'Заход'! Планирую отправку через 60 сек в чат {chat_id}")
+        log.info("✅ Обнаружено слово 'Заход'! Планирую отправку через 60 сек в чат %s", chat_id)
         context.job_queue.run_once(
             send_delayed_message,
             60,
@@ -961,30 +1146,16 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             name=f"zaход_{chat_id}",
         )
 
-    # Ответ в стиле Паши: @ag_slashbot или reply именно на бота
-    clean_text = strip_bot_mention(message_text)
+    # Ответ в стиле Паши: @ag_slashbot или reply именно на бота (is_bot_mentioned проверяет оба)
     if is_bot_mentioned(update):
         reply = generate_pasha_response(
-            text=clean_text or message_text,
-            username=sender_username(update),
-        )
-        await update.message.reply_text(reply)
-        return
-
-    if (
-        update.message.reply_to_message
-        and update.message.reply_to_message.from_user
-        and update.message.reply_to_message.from_user.is_bot
-        and update.message.reply_to_message.from_user.username
-        and update.message.reply_to_message.from_user.username.lower() == BOT_USERNAME
-    ):
-        reply = generate_pasha_response(
-            text=clean_text or message_text,
+            text=strip_bot_mention(message_text) or message_text,
             username=sender_username(update),
         )
         await update.message.reply_text(reply)
         return
 
+    # Фоновые реакции: триггеры сообщения сканируются один раз (classify_message, кэш по тексту)
     if is_sp9_works_chat(chat_id):
         reply = pasha_reply_in_sp9_works(message_text, username=sender_username(update))
     else:
@@ -1007,22 +1178,30 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         reply_to_text=reply_to_text,
     )
     if meme:
-        print(f"🎭 Мемная реплика в чат {chat_id}: {meme}")
+        log.info("🎭 Мемная реплика в чат %s: %s", chat_id, meme)
         await update.message.reply_text(meme)
 
-def main() -> None:
-    """Основная функция для запуска бота"""
+def main(web_port: Optional[int] = None) -> None:
+    """Основная функция для запуска бота. web_port — поднять веб-панель на loop бота (start_both.py)"""
+    setup_logging()
     if not BOT_TOKEN or BOT_TOKEN == "YOUR_BOT_TOKEN" or BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
-        print("❌ Ошибка: BOT_TOKEN не настроен!")
-        print("Задайте переменную окружения BOT_TOKEN (например в Railway: Variables → BOT_TOKEN)")
+        log.error("❌ Ошибка: BOT_TOKEN не настроен!")
+        log.info("Задайте переменную окружения BOT_TOKEN (например в Railway: Variables → BOT_TOKEN)")
+        import sys
+        sys.exit(1)
+    if bot_runtime.webhook_mode() and not bot_runtime.WEBHOOK_SECRET:
+        log.error("❌ Ошибка: BOT_MODE=webhook без WEBHOOK_SECRET — любой сможет слать боту поддельные апдейты")
+        log.info("Задайте WEBHOOK_SECRET (случайная строка, Railway: Variables → WEBHOOK_SECRET)")
+        import sys
+        sys.exit(1)
+    if bot_runtime.webhook_mode() and not web_port:
+        log.error("❌ Ошибка: BOT_MODE=webhook без веб-сервера — Telegram слал бы апдейты в пустоту")
+        log.info("Запускайте через start_both.py (веб-сервер на PORT) или уберите BOT_MODE=webhook")
         import sys
         sys.exit(1)
     
-    print("=" * 60)
-    print("🚀 ЗАПУСК БОТА")
-    print("=" * 60)
-    print(f"📌 Токен: {BOT_TOKEN[:10]}...{BOT_TOKEN[-5:]}")
-    print("=" * 60)
+    log.info("🚀 ЗАПУСК БОТА")
+    log.info("📌 Токен: %s...%s", BOT_TOKEN[:10], BOT_TOKEN[-5:])
     
     # Загружаем настройки из файла
     load_settings()
@@ -1031,12 +1210,15 @@ def main() -> None:
     load_users()
     ensure_sp9_chat_registered()
     load_meme_state()
-    print(f"💾 Каталог данных: {_DATA_DIR}")
+    log.info("💾 Каталог данных: %s", _DATA_DIR)
     
-    llm_ok, llm_msg = probe_llm_api()
-    print(f"{'✅' if llm_ok else '⚠️'} LLM: {llm_msg}")
-
     async def _post_init(app: Application) -> None:
+        bot_runtime.register(app, asyncio.get_running_loop())
+        bot_runtime.set_hook('add_chat', add_chat)
+        bot_runtime.set_hook('drop_chat', drop_chat)
+        bot_runtime.set_hook('reload_settings', lambda: reload_settings(app))
+        llm_ok, llm_msg = await probe_llm_api()
+        log.info("%s LLM: %s", '✅' if llm_ok else '⚠️', llm_msg)
         await app.bot.set_my_commands([
             BotCommand("start", "Запуск @ag_slashbot"),
             BotCommand("help", "Помощь"),
@@ -1047,12 +1229,18 @@ def main() -> None:
             BotCommand("status_schedule", "Статус расписания"),
             BotCommand("bot_info", "Инфо о боте"),
         ])
-        await app.bot.delete_webhook(drop_pending_updates=True)
+        if bot_runtime.webhook_mode():
+            await setup_webhook(app)
+        else:
+            await app.bot.delete_webhook(drop_pending_updates=True)
         await check_sp9_group_access(app)
 
     async def _post_shutdown(app: Application) -> None:
+        bot_runtime.unregister()
         save_meme_state(force=True)
         save_users()
+        await asyncio.to_thread(flush_pending_writes)
+        await close_llm_client()
 
     # Создаем приложение с поддержкой JobQueue (увеличенные таймауты для нестабильной сети)
     request = HTTPXRequest(connect_timeout=30.0, read_timeout=30.0, write_timeout=30.0, pool_timeout=30.0)
@@ -1069,6 +1257,11 @@ def main() -> None:
     global APPLICATION
     APPLICATION = application
     
+    # Стадия приёма: в группе срабатывает первый подходящий — текст пишется в историю, команды только отмечают активность
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.StatusUpdate.ALL, ingest_text_message),
+        group=-1,
+    )
     application.add_handler(MessageHandler(filters.TEXT & ~filters.StatusUpdate.ALL, track_chat_activity), group=-1)
 
     # Добавляем обработчики команд
@@ -1108,32 +1301,27 @@ def main() -> None:
             now = time.monotonic()
             _conflict_times.append(now)
             _conflict_times[:] = [t for t in _conflict_times if now - t < 120]
-            print(
-                f"⚠️ Conflict ({len(_conflict_times)}/8): другой инстанс делает getUpdates. "
-                "Остановите локальный бот или второй деплой."
-            )
+            log.warning("⚠️ Conflict (%s/8): другой инстанс делает getUpdates. Остановите локальный бот или второй деплой.", len(_conflict_times))
             if len(_conflict_times) >= 8:
-                print("❌ Conflict не прекращается — завершаем процесс.")
+                log.error("❌ Conflict не прекращается — завершаем процесс.")
                 save_meme_state(force=True)
                 save_users()
+                flush_pending_writes()
                 sys.exit(2)
             return
-        print(f"❌ Необработанная ошибка: {err}")
+        log.error("❌ Необработанная ошибка: %s", err)
 
     application.add_error_handler(log_bot_error)
     
     # Настраиваем расписание для ежедневной отправки сообщения "Че как там по макетам"
     job_queue = application.job_queue
     if job_queue is None:
-        print("⚠️ JobQueue не инициализирована. Пропускаю настройку задач. Убедитесь, что установлен пакет python-telegram-bot[job-queue]")
-        print("   pip install 'python-telegram-bot[job-queue]'\n")
-        print("Продолжаю запуск без планировщика задач...")
-        print("=")
-        print("")
-        print("🤖 Бот @ag_slashbot запущен! Нажмите Ctrl+C для остановки.")
-        print("📝 Жду сообщения...")
-        print("")
-        application.run_polling(stop_signals=())
+        log.warning("⚠️ JobQueue не инициализирована. Пропускаю настройку задач. Убедитесь, что установлен пакет python-telegram-bot[job-queue]")
+        log.info("   pip install 'python-telegram-bot[job-queue]'\n")
+        log.info("Продолжаю запуск без планировщика задач...")
+        log.info("🤖 Бот @ag_slashbot запущен! Нажмите Ctrl+C для остановки.")
+        log.info("📝 Жду сообщения...")
+        asyncio.run(run_application(application, web_port))
         return
     
     # Запускаем задачу по будням в настроенное время только если есть настроенный чат
@@ -1192,64 +1380,71 @@ def main() -> None:
             first=min(300.0, SILENCE_MEME_CHECK_SEC),
             name='silence_meme_check',
         )
+
+    job_queue.run_repeating(
+        compact_meme_state_job,
+        interval=MEME_STATE_COMPACT_SEC,
+        first=MEME_STATE_COMPACT_SEC,
+        name='meme_state_compact',
+    )
+    job_queue.run_daily(
+        roll_meme_day_job,
+        time=moscow_time(0, 0),
+        name='meme_day_rollover',
+    )
+    if TEAM_ROSTER_RELOAD_SEC > 0:
+        job_queue.run_repeating(
+            reload_team_roster_job,
+            interval=TEAM_ROSTER_RELOAD_SEC,
+            first=TEAM_ROSTER_RELOAD_SEC,
+            name='team_roster_reload',
+        )
+
+    # Отложенные и регулярные сообщения из веб-панели — в тот же JobQueue
+    armed = panel_jobs.rearm_all(job_queue)
+    log.info("🗓️ Задач веб-панели поставлено: %s", armed)
+    if panel_jobs.PANEL_JOBS_RELOAD_SEC > 0:
+        job_queue.run_repeating(
+            panel_jobs.reload_job,
+            interval=panel_jobs.PANEL_JOBS_RELOAD_SEC,
+            first=panel_jobs.PANEL_JOBS_RELOAD_SEC,
+            name='panel_jobs_reload',
+        )
     
-    print("🤖 Бот @ag_slashbot запущен! Нажмите Ctrl+C для остановки.")
-    print("📝 Жду сообщения...")
-    print()
-    print("⏰ УПРАВЛЕНИЕ РАСПИСАНИЕМ:")
+    log.info("🤖 Бот @ag_slashbot запущен! Нажмите Ctrl+C для остановки.")
+    log.info("📝 Жду сообщения...")
+    log.info("⏰ УПРАВЛЕНИЕ РАСПИСАНИЕМ:")
     if SCHEDULED_CHAT_ID:
         timezone_name = str(SCHEDULED_TIMEZONE).split('/')[-1] if '/' in str(SCHEDULED_TIMEZONE) else str(SCHEDULED_TIMEZONE)
-        print(f"   🟢 Расписание АКТИВНО")
-        print(f"   📍 Chat ID: {SCHEDULED_CHAT_ID}")
-        print(f"   ⏰ Время: {SCHEDULED_TIME.strftime('%H:%M')} ({timezone_name}) - по будням (пн-пт)")
-        print(f"   💬 Сообщение: 'Че как там по макетам'")
-        print(f"   ℹ️  Команды: /status_schedule, /set_time, /set_timezone, /stop_schedule")
+        log.info("   🟢 Расписание АКТИВНО")
+        log.info("   📍 Chat ID: %s", SCHEDULED_CHAT_ID)
+        log.info("   ⏰ Время: %s (%s) - по будням (пн-пт)", SCHEDULED_TIME.strftime('%H:%M'), timezone_name)
+        log.info("   💬 Сообщение: 'Че как там по макетам'")
+        log.info("   ℹ️  Команды: /status_schedule, /set_time, /set_timezone, /stop_schedule")
     else:
-        print("   🔴 Расписание НЕ НАСТРОЕНО")
-        print("   ℹ️  Для настройки:")
-        print("      1. Откройте чат, куда нужно отправлять сообщения")
-        print("      2. Отправьте команду /set_schedule")
-    print()
-    print("📢 АВТОМАТИЧЕСКИЕ РАССЫЛКИ:")
-    print(f"   🎉 ПЯТНИЧНАЯ: каждую пятницу в 17:50 МСК")
-    print(f"      💬 Сообщение: 'Эх, а скоро дудосинг...'")
-    print(f"   🕛 S:P9 works (ПН-ПТ): в 12:00 МСК")
-    print(f"      💬 Сообщение: '{SP9_SYNC_TEXT}'")
+        log.info("   🔴 Расписание НЕ НАСТРОЕНО")
+        log.info("   ℹ️  Для настройки:")
+        log.info("      1. Откройте чат, куда нужно отправлять сообщения")
+        log.info("      2. Отправьте команду /set_schedule")
+    log.info("📢 АВТОМАТИЧЕСКИЕ РАССЫЛКИ:")
+    log.info("   🎉 ПЯТНИЧНАЯ: каждую пятницу в 17:50 МСК")
+    log.info("      💬 Сообщение: 'Эх, а скоро дудосинг...'")
+    log.info("   🕛 S:P9 works (ПН-ПТ): в 12:00 МСК")
+    log.info("      💬 Сообщение: '%s'", SP9_SYNC_TEXT)
     if SP9_SCHEDULED_MEME_ENABLED:
-        print(
-            f"   🌤️ S:P9 послеобеденный мем (ПН-ПТ): "
-            f"в {SP9_AFTERNOON_MEME_HOUR:02d}:{SP9_AFTERNOON_MEME_MIN:02d} МСК"
-        )
-        print(
-            f"   🌆 S:P9 вечерний мем (ПН-ПТ): "
-            f"в {SP9_EVENING_MEME_HOUR:02d}:{SP9_EVENING_MEME_MIN:02d} МСК "
-            f"(в пятницу — напутствие на выходные)"
-        )
+        log.info("   🌤️ S:P9 послеобеденный мем (ПН-ПТ): в %s:%s МСК", format(SP9_AFTERNOON_MEME_HOUR, '02d'), format(SP9_AFTERNOON_MEME_MIN, '02d'))
+        log.info("   🌆 S:P9 вечерний мем (ПН-ПТ): в %s:%s МСК (в пятницу — напутствие на выходные)", format(SP9_EVENING_MEME_HOUR, '02d'), format(SP9_EVENING_MEME_MIN, '02d'))
     if SILENCE_MEME_ENABLED:
         silence_hours = int(SILENCE_MEME_SEC // 3600)
         check_min = int(SILENCE_MEME_CHECK_SEC // 60)
-        print(f"   🤫 ТИШИНА В ГРУППЕ: мем после {silence_hours} ч без сообщений (проверка каждые {check_min} мин)")
-    print(f"   👥 Чатов в базе: {len(CHAT_IDS)}")
-    print("=" * 60)
+        log.info("   🤫 ТИШИНА В ГРУППЕ: мем после %s ч без сообщений (проверка каждые %s мин)", silence_hours, check_min)
+    log.info("   👥 Чатов в базе: %s", len(CHAT_IDS))
     
-    # Запускаем бота (с повторными попытками при временных сетевых ошибках)
-    import telegram.error
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            application.run_polling(drop_pending_updates=True, stop_signals=())
-            break
-        except (telegram.error.TimedOut, telegram.error.NetworkError, OSError) as e:
-            if attempt < max_retries - 1:
-                wait = 10 * (attempt + 1)
-                print(f"\n⚠️ Ошибка сети ({e}). Повтор через {wait} сек... (попытка {attempt + 1}/{max_retries})")
-                import time
-                time.sleep(wait)
-            else:
-                print("\n❌ Не удалось подключиться к Telegram API после нескольких попыток.")
-                print("   Проверьте интернет, VPN и доступ к api.telegram.org")
-                raise
+    if bot_runtime.webhook_mode():
+        log.info("🪝 Режим webhook: апдейты принимает веб-сервер на %s", bot_runtime.WEBHOOK_PATH)
+    asyncio.run(run_application(application, web_port))
 
 if __name__ == '__main__':
-    print("🚀 Запуск бота...")
+    setup_logging()
+    log.info("🚀 Запуск бота...")
     main()
@@ -0,0 +1,93 @@
+"""
+Связка бота и веб-сервера в одном процессе (start_both.py).
+
+bot.main() регистрирует здесь запущенное Application и его event loop;
+веб-панель крутится на том же loop, берёт отсюда application.bot
+и отдаёт боту входящие webhook-апдейты.
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import os
+from typing import Any, Callable, Optional
+
+from telegram import Update
+
+# polling — getUpdates (по умолчанию), webhook — Telegram сам шлёт апдейты на WEBHOOK_URL.
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+# Публичный адрес сервиса без пути, например https://slashbot.up.railway.app.
+# Пусто в webhook-режиме — set_webhook не вызывается (локальный прогон через curl).
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook").strip() or "/telegram/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+
+_application = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# Функции бота, которые зовёт панель (drop_chat, add_chat, reload_settings) — без импорта bot.py
+_hooks: dict[str, Callable[..., Any]] = {}
+
+
+def webhook_mode() -> bool:
+    return BOT_MODE == "webhook"
+
+
+def webhook_full_url() -> str:
+    return f"{WEBHOOK_URL}{WEBHOOK_PATH}" if WEBHOOK_URL else ""
+
+
+def register(application, loop: asyncio.AbstractEventLoop) -> None:
+    global _application, _loop
+    _application = application
+    _loop = loop
+
+
+def unregister() -> None:
+    global _application, _loop
+    _application = None
+    _loop = None
+
+
+def get_application():
+    return _application
+
+
+def get_loop() -> Optional[asyncio.AbstractEventLoop]:
+    return _loop
+
+
+def set_hook(name: str, func: Callable[..., Any]) -> None:
+    _hooks[name] = func
+
+
+def call_hook(name: str, *args: Any) -> bool:
+    """Вызвать функцию бота. False — бот в этом процессе не запущен (панель отдельно)."""
+    func = _hooks.get(name)
+    if func is None or _application is None:
+        return False
+    func(*args)
+    return True
+
+
+def check_webhook_secret(header_value: Optional[str]) -> bool:
+    """Заголовок X-Telegram-Bot-Api-Secret-Token; без WEBHOOK_SECRET апдейты не принимаются вовсе."""
+    if not WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest((header_value or "").encode("utf-8"), WEBHOOK_SECRET.encode("utf-8"))
+
+
+async def enqueue_update(payload: dict) -> bool:
+    """
+    Положить апдейт из webhook в очередь Application.
+    False — не webhook-режим, бот ещё не запущен или запущен не в этом процессе.
+    """
+    application, loop = _application, _loop
+    if not webhook_mode() or application is None or loop is None or loop.is_closed():
+        return False
+    update = Update.de_json(payload, application.bot)
+    if loop is asyncio.get_running_loop():
+        await application.update_queue.put(update)
+    else:
+        future = asyncio.run_coroutine_threadsafe(application.update_queue.put(update), loop)
+        await asyncio.wrap_future(future)
+    return True
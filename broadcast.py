@@ -0,0 +1,213 @@
+"""
+Рассылка одного текста во много чатов с учётом лимитов Telegram.
+
+Общий token bucket (~30 сообщений/с на бота) + bucket на каждый чат,
+ограниченная параллельность, RetryAfter ставит на паузу всю рассылку,
+Forbidden / «chat not found» — чат отключается навсегда (колбэк on_drop).
+Используется пятничной рассылкой в bot.py и /api/send веб-панели.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import metrics
+
+BROADCAST_RATE_PER_SEC = float(os.getenv("BROADCAST_RATE_PER_SEC", "25"))
+BROADCAST_CONCURRENCY = max(1, int(os.getenv("BROADCAST_CONCURRENCY", "8")))
+BROADCAST_MAX_RETRIES = max(0, int(os.getenv("BROADCAST_MAX_RETRIES", "3")))
+
+# Лимиты Telegram на один чат: личка ~1 msg/s, группа ~20 msg/min.
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20.0 / 60.0
+
+_DEAD_CHAT_MARKERS = ("chat not found", "user not found", "chat_id is empty", "peer_id_invalid")
+
+BROADCAST_MESSAGES = metrics.counter(
+    "slashbot_broadcast_messages_total", "Итог доставки по чатам: sent, failed, dropped.", ("result",)
+)
+BROADCAST_RETRIES = metrics.counter("slashbot_broadcast_retries_total", "Повторные попытки отправки в рассылках.")
+BROADCAST_SECONDS = metrics.histogram("slashbot_broadcast_seconds", "Длительность рассылки целиком.")
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: acquire() сразу занимает токен (баланс может уйти
+    в минус) и спит ровно столько, сколько нужно. Бот и веб-панель шлют с одного
+    event loop, а между чтением и записью баланса нет await — блокировки не нужны.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Занять токен; вернуть, сколько секунд подождать перед отправкой."""
+        self._refill(time.monotonic())
+        self._tokens -= 1.0
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Никому не выдавать токены ближайшие seconds (RetryAfter)."""
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class DeliveryReport:
+    """Итог рассылки: sent — доставлено, failed — ошибка, dropped — чат отключён."""
+
+    sent: list[int] = field(default_factory=list)
+    failed: dict[int, str] = field(default_factory=dict)
+    dropped: dict[int, str] = field(default_factory=dict)
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.sent) + len(self.failed) + len(self.dropped)
+
+    def error_for(self, chat_id: int) -> Optional[str]:
+        return self.failed.get(chat_id) or self.dropped.get(chat_id)
+
+    def summary(self) -> str:
+        return (
+            f"успешно={len(self.sent)}, ошибок={len(self.failed)}, "
+            f"отключено={len(self.dropped)}, ретраев={self.retries}, за {self.elapsed:.1f}с"
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": list(self.sent),
+            "failed": {str(chat_id): error for chat_id, error in self.failed.items()},
+            "dropped": {str(chat_id): error for chat_id, error in self.dropped.items()},
+            "retries": self.retries,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+def _is_dead_chat(exc: TelegramError) -> bool:
+    if isinstance(exc, Forbidden):
+        return True
+    return isinstance(exc, BadRequest) and any(marker in exc.message.lower() for marker in _DEAD_CHAT_MARKERS)
+
+
+class Broadcaster:
+    """Один на процесс: общий bucket и bucket'ы чатов переживают отдельные рассылки."""
+
+    def __init__(
+        self,
+        *,
+        rate_per_sec: float = BROADCAST_RATE_PER_SEC,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._global = TokenBucket(rate_per_sec, capacity=max(1.0, rate_per_sec))
+        self._chat_buckets: dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 2048:
+                self._chat_buckets = {cid: b for cid, b in self._chat_buckets.items() if not b.idle}
+            bucket = TokenBucket(GROUP_CHAT_RATE if chat_id < 0 else PRIVATE_CHAT_RATE)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def send(
+        self,
+        bot,
+        chat_ids: Iterable[int],
+        text: str,
+        *,
+        on_drop: Optional[Callable[[int, str], None]] = None,
+        **send_kwargs,
+    ) -> DeliveryReport:
+        """
+        Отправить text во все chat_ids. on_drop(chat_id, причина) вызывается
+        для чатов, куда бот больше не может писать (Forbidden / chat not found).
+        """
+        report = DeliveryReport()
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> None:
+            async with semaphore:
+                await self._deliver(bot, chat_id, text, report, send_kwargs)
+            if on_drop is not None and chat_id in report.dropped:
+                on_drop(chat_id, report.dropped[chat_id])
+
+        await asyncio.gather(*(deliver(chat_id) for chat_id in dict.fromkeys(chat_ids)))
+        report.elapsed = time.monotonic() - started
+        BROADCAST_SECONDS.observe(report.elapsed)
+        BROADCAST_MESSAGES.inc("sent", amount=len(report.sent))
+        BROADCAST_MESSAGES.inc("failed", amount=len(report.failed))
+        BROADCAST_MESSAGES.inc("dropped", amount=len(report.dropped))
+        BROADCAST_RETRIES.inc(amount=report.retries)
+        return report
+
+    async def _deliver(self, bot, chat_id: int, text: str, report: DeliveryReport, send_kwargs: dict) -> None:
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            await chat_bucket.acquire()
+            await self._global.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **send_kwargs)
+                report.sent.append(chat_id)
+                return
+            except RetryAfter as exc:
+                # Флуд-лимит общий на бота — притормаживаем всю рассылку, не только этот чат.
+                delay = float(exc.retry_after) + random.uniform(0.0, 0.5)
+                self._global.pause(delay)
+                error: TelegramError = exc
+            except (Forbidden, BadRequest) as exc:
+                if _is_dead_chat(exc):
+                    report.dropped[chat_id] = exc.message
+                else:
+                    report.failed[chat_id] = exc.message
+                return
+            except NetworkError as exc:
+                # TimedOut тоже сюда: экспоненциальный backoff с джиттером.
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+                error = exc
+            except TelegramError as exc:
+                report.failed[chat_id] = exc.message
+                return
+            if attempt < self.max_retries:
+                report.retries += 1
+        report.failed[chat_id] = error.message
+
+
+_broadcaster = Broadcaster()
+
+
+def get_broadcaster() -> Broadcaster:
+    return _broadcaster
+
+
+async def broadcast(bot, chat_ids: Iterable[int], text: str, **kwargs) -> DeliveryReport:
+    return await _broadcaster.send(bot, chat_ids, text, **kwargs)
@@ -0,0 +1,152 @@
+"""
+Кеш метаданных чатов (название, тип) для веб-панели.
+
+Бот кладёт сюда данные из апдейтов, которые и так получает (add_chat),
+поэтому get_chat к Telegram нужен только для чатов, где давно не писали.
+Устаревшая запись отдаётся сразу и обновляется в фоне (stale-while-revalidate),
+недостающие тянутся параллельно с ограничением.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+import panel_events
+
+log = logging.getLogger(__name__)
+
+
+def _float_env(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        log.warning("⚠️ %s=%r не число, использую %s", name, raw, default)
+        return default
+
+
+CHAT_CACHE_TTL_SEC = _float_env("CHAT_CACHE_TTL_SEC", 6 * 3600.0)
+CHAT_CACHE_ERROR_TTL_SEC = _float_env("CHAT_CACHE_ERROR_TTL_SEC", 300.0)
+CHAT_CACHE_CONCURRENCY = max(1, int(_float_env("CHAT_CACHE_CONCURRENCY", 8)))
+
+
+def describe_chat(chat_id: int, chat) -> dict:
+    """{'id', 'title', 'type'} из telegram.Chat — тот же формат, что отдаёт /api/chats."""
+    if chat.type == 'private':
+        title = f"{chat.first_name or ''} {chat.last_name or ''}".strip() or f"User {chat_id}"
+        return {'id': chat_id, 'title': title, 'type': 'private'}
+    return {'id': chat_id, 'title': chat.title or f"Chat {chat_id}", 'type': chat.type}
+
+
+def _unknown_chat(chat_id: int) -> dict:
+    return {'id': chat_id, 'title': f"Chat {chat_id}", 'type': 'unknown'}
+
+
+class ChatCache:
+    """chat_id -> (info, когда получено, ttl). Живёт на event loop бота/панели."""
+
+    def __init__(
+        self,
+        *,
+        ttl: float = CHAT_CACHE_TTL_SEC,
+        error_ttl: float = CHAT_CACHE_ERROR_TTL_SEC,
+        concurrency: int = CHAT_CACHE_CONCURRENCY,
+    ) -> None:
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.concurrency = concurrency
+        self._entries: dict[int, tuple[dict, float, float]] = {}
+        self._refreshing: set[int] = set()
+        self._background: set[asyncio.Task] = set()
+
+    def remember_chat(self, chat) -> None:
+        """Название и тип из update.effective_chat — апдейт у бота уже есть, API не нужен."""
+        self._store(chat.id, describe_chat(chat.id, chat), self.ttl)
+
+    def _store(self, chat_id: int, info: dict, ttl: float) -> None:
+        previous = self._entries.get(chat_id)
+        self._entries[chat_id] = (info, time.monotonic(), ttl)
+        if previous is not None and previous[0] != info:
+            panel_events.publish("chats")  # переименовали чат — открытые панели перечитают список
+
+    def forget(self, chat_id: int) -> None:
+        self._entries.pop(chat_id, None)
+
+    def peek(self, chat_id: int) -> Optional[dict]:
+        entry = self._entries.get(chat_id)
+        return dict(entry[0]) if entry else None
+
+    async def get_many(self, bot, chat_ids: Iterable[int]) -> list[dict]:
+        """Метаданные в порядке chat_ids: свежие и устаревшие из кеша, недостающие — параллельно из API."""
+        now = time.monotonic()
+        chat_ids = list(chat_ids)
+        missing: list[int] = []
+        stale: list[int] = []
+        for chat_id in chat_ids:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                missing.append(chat_id)
+            elif now - entry[1] > entry[2]:
+                stale.append(chat_id)
+
+        if missing:
+            await self._fetch_all(bot, missing)
+        self._schedule_refresh(bot, stale)
+
+        return [dict(self._entries[chat_id][0]) if chat_id in self._entries else _unknown_chat(chat_id)
+                for chat_id in chat_ids]
+
+    def revalidate(self, bot, chat_ids: Iterable[int]) -> None:
+        """Фоном обновить устаревшие записи, не дожидаясь (панель ответила 304 из ETag)."""
+        now = time.monotonic()
+        stale = []
+        for chat_id in chat_ids:
+            entry = self._entries.get(chat_id)
+            if entry is not None and now - entry[1] > entry[2]:
+                stale.append(chat_id)
+        self._schedule_refresh(bot, stale)
+
+    def _schedule_refresh(self, bot, chat_ids: list[int]) -> None:
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id not in self._refreshing]
+        if not chat_ids:
+            return
+        self._refreshing.update(chat_ids)
+        task = asyncio.create_task(self._refresh(bot, chat_ids))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh(self, bot, chat_ids: list[int]) -> None:
+        try:
+            await self._fetch_all(bot, chat_ids)
+        finally:
+            self._refreshing.difference_update(chat_ids)
+
+    async def _fetch_all(self, bot, chat_ids: list[int]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(chat_id: int) -> None:
+            async with semaphore:
+                try:
+                    chat = await bot.get_chat(chat_id)
+                except Exception as e:
+                    log.error("Ошибка при получении информации о чате %s: %s", chat_id, e)
+                    previous = self._entries.get(chat_id)
+                    # Устаревшие данные лучше заглушки; ошибку кешируем коротко, чтобы не долбить API
+                    info = previous[0] if previous else _unknown_chat(chat_id)
+                    self._store(chat_id, info, self.error_ttl)
+                    return
+                self._store(chat_id, describe_chat(chat_id, chat), self.ttl)
+
+        await asyncio.gather(*(fetch(chat_id) for chat_id in chat_ids))
+
+
+_cache = ChatCache()
+
+
+def get_chat_cache() -> ChatCache:
+    return _cache
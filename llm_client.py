@@ -0,0 +1,275 @@
+"""
+Асинхронный HTTP-клиент для OpenAI-совместимого Chat Completions.
+
+Один httpx.AsyncClient на event loop: keep-alive пул (HTTP/2, если установлен h2),
+семафор на число одновременных запросов и общий дедлайн через asyncio.wait_for —
+отмена хендлера отменяет и запрос, соединение возвращается в пул.
+
+LLMBreaker — предохранитель поверх клиента: пока провайдер лежит, мемы идут
+из шаблонов сразу, а не после таймаута на каждую попытку.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  # нужен httpx для HTTP/2
+
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+
+def _int_env(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        log.warning("⚠️ %s=%r не целое число, использую %s", name, raw, default)
+        return default
+
+
+def _float_env(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        log.warning("⚠️ %s=%r не число, использую %s", name, raw, default)
+        return default
+
+
+MEME_LLM_MAX_CONCURRENCY = _int_env("MEME_LLM_MAX_CONCURRENCY", 4)
+MEME_LLM_POOL_SIZE = _int_env("MEME_LLM_POOL_SIZE", 8)
+MEME_LLM_HTTP2 = os.getenv("MEME_LLM_HTTP2", "1").strip().lower() not in ("0", "false", "no")
+# Предохранитель: столько ошибок/медленных ответов подряд — и LLM отключается на cooldown; 0 — выключен
+MEME_LLM_BREAKER_FAILURES = max(0, int(_float_env("MEME_LLM_BREAKER_FAILURES", 4)))
+MEME_LLM_BREAKER_COOLDOWN_SEC = _float_env("MEME_LLM_BREAKER_COOLDOWN_SEC", 60.0)
+# Ответ дольше этого считается для предохранителя сбоем, даже если пришёл
+MEME_LLM_SLOW_SEC = _float_env("MEME_LLM_SLOW_SEC", 8.0)
+# Адаптивный таймаут: p95 последних ответов × 2, но не меньше MIN и не больше MEME_LLM_TIMEOUT_SEC
+MEME_LLM_ADAPTIVE_TIMEOUT = os.getenv("MEME_LLM_ADAPTIVE_TIMEOUT", "1").strip().lower() not in ("0", "false", "no")
+MEME_LLM_MIN_TIMEOUT_SEC = _float_env("MEME_LLM_MIN_TIMEOUT_SEC", 3.0)
+
+
+class LLMHTTPError(Exception):
+    """Ответ API со статусом >= 400; detail — начало тела ответа."""
+
+    def __init__(self, status_code: int, reason: str, detail: str) -> None:
+        super().__init__(f"HTTP {status_code} {reason}")
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+
+
+class LLMClient:
+    """Пул соединений и лимит параллельных запросов к LLM."""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = MEME_LLM_MAX_CONCURRENCY,
+        pool_size: int = MEME_LLM_POOL_SIZE,
+        http2: bool = MEME_LLM_HTTP2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._pool_size = max(pool_size, max_concurrency)
+        self._http2 = http2 and _H2_AVAILABLE
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def http2(self) -> bool:
+        return self._http2
+
+    def _ensure_client(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            # Соединения привязаны к loop: web_app и тесты крутят свой asyncio.run,
+            # старый клиент с чужого loop просто бросаем — закрыть его уже нельзя.
+            self._client = httpx.AsyncClient(
+                http2=self._http2,
+                limits=httpx.Limits(
+                    max_connections=self._pool_size,
+                    max_keepalive_connections=self._pool_size,
+                    keepalive_expiry=90.0,
+                ),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def post_json(self, url: str, payload: dict, *, headers: dict[str, str], timeout: float) -> dict:
+        """
+        POST JSON и вернуть распарсенный ответ.
+        timeout — общий дедлайн, включая ожидание слота семафора.
+        """
+        client, semaphore = self._ensure_client()
+
+        async def _request() -> httpx.Response:
+            async with semaphore:
+                return await client.post(url, json=payload, headers=headers, timeout=timeout)
+
+        response = await asyncio.wait_for(_request(), timeout=timeout)
+        if response.status_code >= 400:
+            raise LLMHTTPError(response.status_code, response.reason_phrase, response.text[:300])
+        return response.json()
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is None or client.is_closed:
+            return
+        try:
+            if self._loop is asyncio.get_running_loop():
+                await client.aclose()
+        finally:
+            self._loop = None
+            self._semaphore = None
+
+
+class LLMBreaker:
+    """
+    closed → (failures сбоев подряд) → open: запросы не идут cooldown секунд →
+    half_open: пропускается один пробный запрос; успех закрывает, сбой снова открывает.
+    Вердикт в open/half_open выносит только пробный запрос (record_*(probe=True)):
+    опоздавшие ответы, ушедшие до открытия, и отменённые кандидаты хеджа его не трогают.
+    Сбой — таймаут, сетевая ошибка, 5xx/429 или ответ дольше slow_sec.
+    timeout() — дедлайн по p95 последних ответов; таймаут идёт в окно как ответ длиной
+    в дедлайн (цензурированный замер), так что при росте задержки провайдера дедлайн
+    расширяется, а не режет всё подряд. Пробному запросу — всегда полный потолок.
+    Живёт на одном event loop (бот и панель делят loop), блокировки не нужны.
+    """
+
+    def __init__(
+        self,
+        *,
+        failures: int = MEME_LLM_BREAKER_FAILURES,
+        cooldown: float = MEME_LLM_BREAKER_COOLDOWN_SEC,
+        slow_sec: float = MEME_LLM_SLOW_SEC,
+        adaptive: bool = MEME_LLM_ADAPTIVE_TIMEOUT,
+        min_timeout: float = MEME_LLM_MIN_TIMEOUT_SEC,
+        window: int = 50,
+        min_samples: int = 10,
+        p95_factor: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failures = failures
+        self.cooldown = cooldown
+        self.slow_sec = slow_sec
+        self.adaptive = adaptive
+        self.min_timeout = min_timeout
+        self.min_samples = min_samples
+        self.p95_factor = p95_factor
+        self._clock = clock
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    @property
+    def blocked(self) -> bool:
+        """Запрос сейчас точно не пойдёт: open или пробный уже в полёте."""
+        state = self.state
+        return state == "open" or (state == "half_open" and self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """Можно ли слать запрос; в half_open занимает единственный пробный слот."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self, latency: float, *, probe: bool = False) -> None:
+        """probe=True — ответ на пробный запрос (тот, кому allow() отдал слот в half_open)."""
+        self._latencies.append(latency)
+        if self.failures and latency >= self.slow_sec:
+            self.record_failure(f"медленный ответ {latency:.1f}с", probe=probe)
+            return
+        if self._opened_at is not None and not probe:
+            # запрос ушёл до открытия (или проиграл хедж пробному) — вердикт не его
+            return
+        self._probe_in_flight = False
+        self._consecutive = 0
+        if self._opened_at is not None:
+            self._opened_at = None
+            log.info("✅ LLM breaker: закрыт, запросы к LLM снова идут")
+
+    def record_failure(self, reason: str, censored: Optional[float] = None, *, probe: bool = False) -> None:
+        """censored — для таймаута: ответ шёл не меньше стольких секунд. probe — как в record_success."""
+        if censored is not None:
+            self._latencies.append(censored)
+        if self._opened_at is not None and not probe:
+            # поздние ответы запросов, ушедших до открытия, не двигают таймер и не трогают пробный слот
+            return
+        self._consecutive += 1
+        self._probe_in_flight = False
+        if not self.failures:
+            return
+        if not probe and self._consecutive < self.failures:
+            return
+        self._opened_at = self._clock()
+        log.warning(
+            "🔌 LLM breaker: открыт на %.0fс (%s подряд, последний: %s) — мемы из шаблонов",
+            self.cooldown, self._consecutive, reason,
+        )
+
+    def record_cancelled(self, *, probe: bool = False) -> None:
+        """Запрос отменён (проиграл хедж) — вердикта нет; пробный слот освобождает только сам пробный."""
+        if probe:
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Пробный запрос завершился без вердикта (неожиданное исключение) — слот не должен зависнуть.
+        Звать только тому, кто держит слот (allow() в half_open)."""
+        self._probe_in_flight = False
+
+    def timeout(self, ceiling: float) -> float:
+        if not self.adaptive or len(self._latencies) < self.min_samples or self.state != "closed":
+            return ceiling
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return max(min(self.min_timeout, ceiling), min(ceiling, p95 * self.p95_factor))
+
+
+_client = LLMClient()
+_breaker = LLMBreaker()
+
+
+def get_llm_client() -> LLMClient:
+    return _client
+
+
+def get_llm_breaker() -> LLMBreaker:
+    return _breaker
+
+
+async def close_llm_client() -> None:
+    """Для post_shutdown: закрыть пул соединений."""
+    await _client.aclose()
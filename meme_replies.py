@@ -8,17 +8,64 @@ from __future__ import annotations
 
 import asyncio
 import datetime as dt
+import functools
+import hashlib
+import heapq
 import json
+import logging
 import os
 import random
 import re
+import sys
 import time
-import urllib.error
-import urllib.request
-from collections import deque
-from typing import Callable, Deque, Optional
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Sequence
+from typing import Callable, Deque, Iterable, Optional
 from zoneinfo import ZoneInfo
 
+import httpx
+
+from llm_client import LLMHTTPError, get_llm_breaker, get_llm_client
+import metrics
+from persistence import append_line, write_json
+
+log = logging.getLogger(__name__)
+
+LLM_SECONDS = metrics.histogram(
+    "slashbot_llm_request_seconds",
+    "Запрос мема к LLM: время до ответа по исходу (ok, http_error, timeout, error, cancelled).",
+    ("outcome",),
+)
+LLM_CANDIDATES = metrics.counter(
+    "slashbot_llm_candidates_total",
+    "Ответы LLM после санитайзера: accepted — годный мем, rejected — отбракован.",
+    ("result",),
+)
+metrics.gauge_callback(
+    "slashbot_llm_breaker_open",
+    "Предохранитель LLM: 1 — запросы не идут (open), 0 — closed/half_open.",
+    lambda: 1.0 if get_llm_breaker().state == "open" else 0.0,
+)
+metrics.gauge_callback(
+    "slashbot_llm_timeout_seconds",
+    "Текущий таймаут запроса к LLM (адаптивный, по p95).",
+    lambda: get_llm_breaker().timeout(MEME_LLM_TIMEOUT_SEC),
+)
+LLM_CACHE = metrics.counter(
+    "slashbot_llm_cache_total",
+    "Кэш мемов LLM: hit — отдан ещё не показанный в чате кандидат без запроса, miss — пошли в LLM.",
+    ("result",),
+)
+metrics.gauge_callback(
+    "slashbot_llm_cache_entries",
+    "Контекстов в кэше мемов LLM.",
+    lambda: len(_llm_cache),
+)
+STATE_SAVE_SECONDS = metrics.histogram(
+    "slashbot_meme_state_save_seconds", "save_meme_state на event loop: снапшот структур в очередь записи."
+)
+
 MEME_HISTORY_SIZE = 24
 MEME_DAILY_HISTORY_SIZE = 220
 MEME_MIN_HISTORY = 2
@@ -31,6 +78,13 @@ MEME_LLM_MODEL = os.getenv("MEME_LLM_MODEL", "gpt-4o-mini")
 MEME_LLM_CHANCE = float(os.getenv("MEME_LLM_CHANCE", "0.85"))
 MEME_LLM_TIMEOUT_SEC = float(os.getenv("MEME_LLM_TIMEOUT_SEC", "12"))
 MEME_LLM_HISTORY_LINES = int(os.getenv("MEME_LLM_HISTORY_LINES", "40"))
+# Хедж: сколько кандидатов LLM запрашивать одновременно (1 — строго по очереди).
+# parallel — N отдельных запросов, n — один запрос с n completions.
+MEME_LLM_HEDGE = max(1, int(os.getenv("MEME_LLM_HEDGE", "1")))
+MEME_LLM_HEDGE_MODE = os.getenv("MEME_LLM_HEDGE_MODE", "parallel").strip().lower()
+# Кэш годных ответов LLM по контексту: сколько контекстов держать (0 — выкл.) и сколько секунд.
+MEME_LLM_CACHE_SIZE = max(0, int(os.getenv("MEME_LLM_CACHE_SIZE", "256")))
+MEME_LLM_CACHE_TTL_SEC = float(os.getenv("MEME_LLM_CACHE_TTL_SEC", "1800"))
 MEME_FORCE_FALLBACK_PROMPT = "в чате тихо, команда ушла в глубокий рендер, но макет дожмём"
 DURDACH_SCHEDULED_CHANCE = float(os.getenv("DURDACH_SCHEDULED_CHANCE", "0.45"))
 SMAEV_SCHEDULED_CHANCE = float(os.getenv("SMAEV_SCHEDULED_CHANCE", "0.25"))
@@ -284,6 +338,8 @@ BROKEN_FRAGMENT = re.compile(
 URL = re.compile(r"https?://|t\.me/", re.I)
 MENTION = re.compile(r"@\w+", re.I)
 WORD = re.compile(r"[a-zA-Zа-яА-ЯёЁ0-9][a-zA-Zа-яА-ЯёЁ0-9\-_]*", re.UNICODE)
+# URL и MENTION одним проходом — для _normalize
+URL_OR_MENTION = re.compile(r"https?://|t\.me/|@\w+", re.I)
 
 STOP_WORDS = frozenset({
     "и", "в", "во", "на", "по", "к", "ко", "с", "со", "у", "о", "об", "от", "до", "за", "из",
@@ -294,7 +350,8 @@ STOP_WORDS = frozenset({
 })
 
 _chat_history: dict[int, Deque[str]] = {}
-_chat_daily_history: dict[int, Deque[dict[str, object]]] = {}
+_chat_daily_history: dict[int, "_DailyHistory"] = {}
+_day_indexes: dict[int, "_DayIndex"] = {}
 _last_meme_reply: dict[int, float] = {}
 _last_force_meme: dict[tuple[int, int], float] = {}
 _last_chat_activity: dict[int, float] = {}
@@ -303,10 +360,17 @@ _chat_types: dict[int, str] = {}
 
 _DATA_DIR = os.environ.get("SLASHBOT_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
 MEME_STATE_FILE = os.path.join(_DATA_DIR, "meme_state.json")
+MEME_JOURNAL_FILE = os.path.join(_DATA_DIR, "meme_state.journal")
 _last_state_save = 0.0
 _state_dirty = False
 STATE_SAVE_INTERVAL_SEC = 30.0
-MEME_STATE_VERSION = 2
+MEME_STATE_VERSION = 3
+
+# Журнал: каждое сообщение/активность — одна компактная строка в meme_state.journal,
+# снапшот meme_state.json пересобирается периодически (compact_meme_state).
+MEME_JOURNAL_ENABLED = os.getenv("MEME_STATE_JOURNAL", "1").strip().lower() not in ("0", "false", "no")
+_journal_seq = 0
+_compacted_seq = 0
 
 
 def _float_env(name: str, default: float) -> float:
@@ -316,7 +380,7 @@ def _float_env(name: str, default: float) -> float:
     try:
         return float(raw)
     except ValueError:
-        print(f"⚠️ {name}={raw!r} не число, использую {default}")
+        log.warning("⚠️ %s=%r не число, использую %s", name, raw, default)
         return default
 
 
@@ -324,6 +388,7 @@ MEME_CHANCE_GROUP = _float_env("MEME_CHANCE_GROUP", 0.035)
 MEME_CHANCE_PRIVATE = _float_env("MEME_CHANCE_PRIVATE", 0.012)
 MEME_COOLDOWN_SEC = _float_env("MEME_COOLDOWN_SEC", 420.0)
 MEME_FORCE_COOLDOWN_SEC = _float_env("MEME_FORCE_COOLDOWN_SEC", 20.0)
+MEME_STATE_COMPACT_SEC = _float_env("MEME_STATE_COMPACT_SEC", 300.0)
 
 
 def _normalize_openai_base_url() -> str:
@@ -347,11 +412,14 @@ def _build_llm_payload(
     *,
     temperature: float,
     include_temperature: bool = True,
+    n: int = 1,
 ) -> dict:
     payload: dict = {
         "model": MEME_LLM_MODEL,
         "messages": messages,
     }
+    if n > 1:
+        payload["n"] = n
     if include_temperature:
         payload["temperature"] = temperature
     token_key = "max_completion_tokens" if _llm_uses_max_completion_tokens(MEME_LLM_MODEL) else "max_tokens"
@@ -364,20 +432,93 @@ def _mark_state_dirty() -> None:
     _state_dirty = True
 
 
-def _today_key() -> str:
-    return dt.datetime.now(MOSCOW_TZ).date().isoformat()
+class _DailyHistory:
+    """
+    Сообщения чата за один день по Москве (не больше maxlen): время — array('d'),
+    текст — та же строка, что и в _chat_history. День целиком в `day` (ordinal).
+
+    Вчерашняя корзина не чистится по записям: в полночь (roll_daily_histories)
+    или на первом сообщении нового дня её заменяют пустой. Переполнение — сдвиг
+    начала, массивы поджимаются раз в maxlen записей, так что append — O(1).
+    """
+
+    __slots__ = ("day", "maxlen", "_ts", "_texts", "_start")
+
+    def __init__(self, day: int, maxlen: Optional[int] = None) -> None:
+        self.day = day
+        self.maxlen = maxlen or MEME_DAILY_HISTORY_SIZE
+        self._ts = array("d")
+        self._texts: list[str] = []
+        self._start = 0
+
+    def __len__(self) -> int:
+        return len(self._texts) - self._start
+
+    @property
+    def texts(self) -> list[str]:
+        return self._texts[self._start:]
+
+    def last_text(self) -> Optional[str]:
+        return self._texts[-1] if len(self) else None
+
+    def append(self, ts: float, text: str) -> Optional[str]:
+        """Добавляет запись; возвращает текст, вытолкнутый по maxlen."""
+        if self._ts and ts < self._ts[-1]:
+            ts = self._ts[-1]  # время не убывает — часы сервера могли отскочить назад
+        self._ts.append(ts)
+        self._texts.append(text)
+        if len(self) <= self.maxlen:
+            return None
+        evicted = self._texts[self._start]
+        self._start += 1
+        if self._start >= self.maxlen:
+            del self._ts[:self._start]
+            del self._texts[:self._start]
+            self._start = 0
+        return evicted
+
+    def to_state(self) -> dict[str, list]:
+        return {"ts": self._ts[self._start:].tolist(), "t": self.texts}
 
 
-def _day_key(ts: float) -> str:
-    return dt.datetime.fromtimestamp(ts, MOSCOW_TZ).date().isoformat()
+# [начало, конец) текущих суток по Москве в unix-времени и их ordinal
+_day_bounds: tuple[float, float, int] = (0.0, 0.0, 0)
 
 
-def _normalize_daily_record(item: object, fallback_ts: Optional[float] = None) -> Optional[dict[str, object]]:
+def _today_ordinal() -> int:
+    """Сегодняшний день по Москве; datetime считается раз в сутки, дальше — сравнение с кешем."""
+    global _day_bounds
+    now = time.time()
+    start, end, ordinal = _day_bounds
+    if start <= now < end:
+        return ordinal
+    today = dt.datetime.fromtimestamp(now, MOSCOW_TZ).date()
+    start_dt = dt.datetime.combine(today, dt.time(), MOSCOW_TZ)
+    end_dt = dt.datetime.combine(today + dt.timedelta(days=1), dt.time(), MOSCOW_TZ)
+    _day_bounds = (start_dt.timestamp(), end_dt.timestamp(), today.toordinal())
+    return _day_bounds[2]
+
+
+def _day_ordinal(ts: float) -> int:
+    start, end, ordinal = _day_bounds
+    if start <= ts < end:
+        return ordinal
+    if ts >= end:
+        # сообщение уже из новых суток, а кеш ещё вчерашний — переложить границы, а не считать datetime на каждое
+        _today_ordinal()
+        start, end, ordinal = _day_bounds
+        if start <= ts < end:
+            return ordinal
+    return dt.datetime.fromtimestamp(ts, MOSCOW_TZ).date().toordinal()
+
+
+def _normalize_daily_record(item: object, fallback_ts: Optional[float] = None) -> Optional[tuple[float, str]]:
+    """Запись дневной истории из старых форматов (строка или {"ts", "day", "text"}) -> (ts, текст)."""
     if isinstance(item, str):
-        text = _normalize(item)
+        text = str(_normalize(item))
         ts = time.time() if fallback_ts is None else fallback_ts
     elif isinstance(item, dict):
-        text = _normalize(str(item.get("text", "")))
+        text = str(_normalize(str(item.get("text", ""))))
         raw_ts = item.get("ts", fallback_ts if fallback_ts is not None else time.time())
         try:
             ts = float(raw_ts)
@@ -388,41 +529,151 @@ def _normalize_daily_record(item: object, fallback_ts: Optional[float] = None) -
 
     if len(text) < 3:
         return None
-    return {"ts": ts, "day": _day_key(ts), "text": text}
+    return ts, text
+
+
+def _daily_history_from_state(raw: object, shared: dict[str, str]) -> Optional[_DailyHistory]:
+    """
+    v3: {"ts": [...], "t": [...]}; v2 и старше — список записей. Остаётся только
+    последний день из снапшота; тексты из shared (короткая история) не дублируются.
+    """
+    if isinstance(raw, dict):
+        pairs = list(zip(raw.get("ts", []), raw.get("t", [])))
+        records = (_normalize_daily_record({"ts": ts, "text": text}) for ts, text in pairs)
+    elif isinstance(raw, list):
+        records = (_normalize_daily_record(item) for item in raw)
+    else:
+        return None
+    history: Optional[_DailyHistory] = None
+    for record in records:
+        if not record:
+            continue
+        ts, text = record
+        day = _day_ordinal(ts)
+        if history is None or day > history.day:
+            history = _DailyHistory(day)
+        history.append(ts, shared.get(text, text))
+    return history
 
 
 def _prune_daily_history(chat_id: int) -> None:
+    """Корзина прошлого дня уходит целиком — O(1), без перебора записей."""
     history = _chat_daily_history.get(chat_id)
-    if not history:
-        return
+    if history is not None and history.day < _today_ordinal():
+        del _chat_daily_history[chat_id]
+        _day_indexes.pop(chat_id, None)
+
 
-    today = _today_key()
-    todays_records = [item for item in history if item.get("day") == today]
-    _chat_daily_history[chat_id] = deque(todays_records[-MEME_DAILY_HISTORY_SIZE:], maxlen=MEME_DAILY_HISTORY_SIZE)
+def roll_daily_histories() -> int:
+    """Полночь по Москве: сбросить вчерашние корзины всех чатов. Возвращает число сброшенных."""
+    stale = [chat_id for chat_id, history in _chat_daily_history.items() if history.day < _today_ordinal()]
+    for chat_id in stale:
+        _prune_daily_history(chat_id)
+    if stale:
+        _mark_state_dirty()
+    return len(stale)
 
 
 def _today_history(chat_id: int) -> list[str]:
-    _prune_daily_history(chat_id)
-    return [
-        str(item.get("text", ""))
-        for item in _chat_daily_history.get(chat_id, [])
-        if item.get("day") == _today_key() and item.get("text")
-    ]
+    history = _chat_daily_history.get(chat_id)
+    if history is None or history.day != _today_ordinal():
+        return []
+    return history.texts
 
 
-def load_meme_state() -> None:
-    """Восстанавливает историю чатов и активность с диска."""
-    global _chat_history, _chat_daily_history, _last_chat_activity, _chat_types, _silence_nudged_activity
+def _apply_chat_message(chat_id: int, cleaned: str, ts: float) -> bool:
+    """Кладёт уже нормализованный текст в оба буфера (одна простая str на оба). False — дубль подряд."""
+    history = _chat_history.setdefault(chat_id, deque(maxlen=MEME_HISTORY_SIZE))
+    if history and history[-1] == cleaned:
+        return False
+    text = str(cleaned)
+    history.append(text)
+    day = _day_ordinal(ts)
+    daily_history = _chat_daily_history.get(chat_id)
+    if daily_history is None or daily_history.day < day:
+        # первое сообщение нового дня, а полуночная задача ещё не успела
+        daily_history = _chat_daily_history[chat_id] = _DailyHistory(day)
+    if daily_history.last_text() != cleaned:
+        index = _day_index(chat_id)
+        index.add(text)
+        evicted = daily_history.append(ts, text)
+        if evicted is not None:
+            index.discard(evicted)
+    return True
+
+
+def _journal_append(record: dict[str, object]) -> None:
+    """Ставит в очередь записи одну строку журнала (пишет поток persistence)."""
+    global _journal_seq
+
+    _journal_seq += 1
+    record["n"] = _journal_seq
+    append_line(MEME_JOURNAL_FILE, json.dumps(record, ensure_ascii=False, separators=(",", ":")))
 
-    if not os.path.exists(MEME_STATE_FILE):
-        print(f"💾 История чатов: файл не найден ({MEME_STATE_FILE})")
-        return
 
+def _replay_journal(snapshot_seq: int) -> int:
+    """Накатывает хвост журнала поверх снапшота. Возвращает число применённых записей."""
+    global _journal_seq, _compacted_seq
+
+    _journal_seq = max(_journal_seq, snapshot_seq)
+    _compacted_seq = snapshot_seq
+    if not os.path.exists(MEME_JOURNAL_FILE):
+        return 0
+
+    applied = 0
+    touched: set[int] = set()
     try:
-        with open(MEME_STATE_FILE, "r", encoding="utf-8") as handle:
-            data = json.load(handle)
-    except (OSError, json.JSONDecodeError) as exc:
-        print(f"⚠️ Не удалось загрузить meme_state.json: {exc}")
+        with open(MEME_JOURNAL_FILE, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                    seq = int(record["n"])
+                    chat_id = int(record["c"])
+                    ts = float(record["ts"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    # Оборванная последняя строка после падения процесса — просто пропускаем.
+                    continue
+                _journal_seq = max(_journal_seq, seq)
+                if seq <= snapshot_seq:
+                    continue
+                op = record.get("op")
+                if op == "m":
+                    cleaned = _normalize(str(record.get("t", "")))
+                    if len(cleaned) >= 3:
+                        _apply_chat_message(chat_id, cleaned, ts)
+                        touched.add(chat_id)
+                    if "ty" in record:
+                        _last_chat_activity[chat_id] = ts
+                        _chat_types[chat_id] = str(record["ty"])
+                elif op == "a":
+                    _last_chat_activity[chat_id] = ts
+                    _chat_types[chat_id] = str(record.get("ty", "group"))
+                else:
+                    continue
+                applied += 1
+    except OSError as exc:
+        log.warning("⚠️ Не удалось прочитать meme_state.journal: %s", exc)
+        return applied
+
+    for chat_id in touched:
+        _prune_daily_history(chat_id)
+    return applied
+
+
+def load_meme_state() -> None:
+    """Восстанавливает историю чатов и активность с диска: снапшот + хвост журнала."""
+    global _chat_history, _chat_daily_history, _last_chat_activity, _chat_types, _silence_nudged_activity
+
+    data: dict = {}
+    if os.path.exists(MEME_STATE_FILE):
+        try:
+            with open(MEME_STATE_FILE, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, json.JSONDecodeError) as exc:
+            log.warning("⚠️ Не удалось загрузить meme_state.json: %s", exc)
+            data = {}
+    elif not (MEME_JOURNAL_ENABLED and os.path.exists(MEME_JOURNAL_FILE)):
+        log.info("💾 История чатов: файл не найден (%s)", MEME_STATE_FILE)
         return
 
     histories = data.get("chat_history", {})
@@ -431,22 +682,18 @@ def load_meme_state() -> None:
         if not isinstance(messages, list):
             continue
         _chat_history[chat_id] = deque(
-            (str(item) for item in messages[-MEME_HISTORY_SIZE:]),
+            (str(_normalize(str(item))) for item in messages[-MEME_HISTORY_SIZE:]),
             maxlen=MEME_HISTORY_SIZE,
         )
 
     daily_histories = data.get("daily_history", {})
-    for raw_chat_id, messages in daily_histories.items():
+    for raw_chat_id, raw_history in daily_histories.items():
         chat_id = int(raw_chat_id)
-        if not isinstance(messages, list):
-            continue
-        normalized = []
-        for item in messages[-MEME_DAILY_HISTORY_SIZE:]:
-            record = _normalize_daily_record(item)
-            if record:
-                normalized.append(record)
-        _chat_daily_history[chat_id] = deque(normalized, maxlen=MEME_DAILY_HISTORY_SIZE)
-        _prune_daily_history(chat_id)
+        shared = {text: text for text in _chat_history.get(chat_id, ())}
+        daily = _daily_history_from_state(raw_history, shared)
+        if daily:
+            _chat_daily_history[chat_id] = daily
+            _prune_daily_history(chat_id)
 
     # Мягкая миграция старого состояния: последние реплики считаем сегодняшним контекстом,
     # чтобы после деплоя плановый мем не ослеп до новых сообщений.
@@ -454,13 +701,11 @@ def load_meme_state() -> None:
     for chat_id, history in _chat_history.items():
         if chat_id in _chat_daily_history and _chat_daily_history[chat_id]:
             continue
-        records = []
+        daily = _DailyHistory(_day_ordinal(now))
         for text in list(history)[-MEME_DAILY_HISTORY_SIZE:]:
-            record = _normalize_daily_record(text, fallback_ts=now)
-            if record:
-                records.append(record)
-        if records:
-            _chat_daily_history[chat_id] = deque(records, maxlen=MEME_DAILY_HISTORY_SIZE)
+            daily.append(now, text)
+        if daily:
+            _chat_daily_history[chat_id] = daily
 
     for raw_chat_id, ts in data.get("last_activity", {}).items():
         _last_chat_activity[int(raw_chat_id)] = float(ts)
@@ -471,32 +716,42 @@ def load_meme_state() -> None:
     for raw_chat_id, ts in data.get("silence_nudged", {}).items():
         _silence_nudged_activity[int(raw_chat_id)] = float(ts)
 
-    print(
-        f"💾 История чатов загружена: {len(_chat_history)} чат(ов), "
-        f"файл {MEME_STATE_FILE}"
+    replayed = 0
+    if MEME_JOURNAL_ENABLED:
+        replayed = _replay_journal(int(data.get("journal_seq", 0) or 0))
+
+    log.info(
+        "💾 История чатов загружена: %s чат(ов), файл %s%s",
+        len(_chat_history), MEME_STATE_FILE, f", из журнала {replayed} запис(ей)" if replayed else "",
     )
 
 
 def save_meme_state(force: bool = False) -> None:
-    """Сохраняет историю и активность на диск (debounce 30 сек)."""
-    global _last_state_save, _state_dirty
+    """
+    Ставит снапшот истории и активности в очередь записи (debounce 30 сек).
+    В режиме журнала снапшот заодно обнуляет meme_state.journal.
+    """
+    global _last_state_save, _state_dirty, _compacted_seq
 
     now = time.time()
     if not force and (not _state_dirty or now - _last_state_save < STATE_SAVE_INTERVAL_SEC):
         return
 
+    started = time.perf_counter()
+
     for chat_id in list(_chat_daily_history):
         _prune_daily_history(chat_id)
 
     payload = {
         "version": MEME_STATE_VERSION,
+        "journal_seq": _journal_seq,
         "chat_history": {
             str(chat_id): list(history)
             for chat_id, history in _chat_history.items()
             if history
         },
         "daily_history": {
-            str(chat_id): list(history)
+            str(chat_id): history.to_state()
             for chat_id, history in _chat_daily_history.items()
             if history
         },
@@ -505,19 +760,50 @@ def save_meme_state(force: bool = False) -> None:
         "silence_nudged": {str(chat_id): ts for chat_id, ts in _silence_nudged_activity.items()},
     }
 
-    try:
-        os.makedirs(_DATA_DIR, exist_ok=True)
-        tmp_path = f"{MEME_STATE_FILE}.tmp"
-        with open(tmp_path, "w", encoding="utf-8") as handle:
-            json.dump(payload, handle, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, MEME_STATE_FILE)
-        _last_state_save = now
-        _state_dirty = False
-    except OSError as exc:
-        print(f"⚠️ Не удалось сохранить meme_state.json: {exc}")
+    # Сериализация и запись — в потоке persistence; здесь только снапшот структур.
+    # Всё с номером <= journal_seq уже в снапшоте: писатель обнулит журнал после
+    # успешной записи, а если упадём раньше — load_meme_state пропустит эти записи.
+    write_json(
+        MEME_STATE_FILE,
+        payload,
+        truncate=MEME_JOURNAL_FILE if MEME_JOURNAL_ENABLED else None,
+    )
+    _last_state_save = now
+    _state_dirty = False
+    if MEME_JOURNAL_ENABLED:
+        _compacted_seq = payload["journal_seq"]
+    STATE_SAVE_SECONDS.observe(time.perf_counter() - started)
+
+
+def compact_meme_state() -> None:
+    """Сворачивает журнал в снапшот (плановая задача и shutdown)."""
+    if MEME_JOURNAL_ENABLED and _journal_seq == _compacted_seq and not _state_dirty:
+        return
+    save_meme_state(force=True)
+
+
+def _llm_headers() -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+async def _post_llm(payload: dict, timeout: float) -> list[str]:
+    """Тексты всех choices ответа (n > 1 — несколько кандидатов)."""
+    body = await get_llm_client().post_json(
+        _openai_completions_url(),
+        payload,
+        headers=_llm_headers(),
+        timeout=timeout,
+    )
+    choices = body["choices"]
+    if not choices:
+        raise IndexError("пустой choices")
+    return [choice["message"]["content"] or "" for choice in choices]
 
 
-def probe_llm_api() -> tuple[bool, str]:
+async def probe_llm_api() -> tuple[bool, str]:
     """Проверка OPENAI_API_KEY и модели при старте."""
     if not OPENAI_API_KEY:
         return False, "OPENAI_API_KEY не задан — мемы только из шаблонов"
@@ -528,67 +814,116 @@ def probe_llm_api() -> tuple[bool, str]:
     ]
     for include_temperature in (True, False):
         payload = _build_llm_payload(messages, temperature=0.2, include_temperature=include_temperature)
-        request = urllib.request.Request(
-            _openai_completions_url(),
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            method="POST",
-        )
         try:
-            with urllib.request.urlopen(request, timeout=min(MEME_LLM_TIMEOUT_SEC, 8.0)) as response:
-                body = json.loads(response.read().decode("utf-8"))
-            content = body["choices"][0]["message"]["content"]
+            content = (await _post_llm(payload, timeout=min(MEME_LLM_TIMEOUT_SEC, 8.0)))[0]
             return True, f"{MEME_LLM_MODEL} @ {_normalize_openai_base_url()} — ok ({content.strip()[:20]})"
-        except urllib.error.HTTPError as exc:
-            detail = ""
-            try:
-                detail = exc.read().decode("utf-8", errors="replace")[:300]
-            except OSError:
-                pass
-            if include_temperature and exc.code == 400 and "temperature" in detail.lower():
+        except LLMHTTPError as exc:
+            if include_temperature and exc.status_code == 400 and "temperature" in exc.detail.lower():
                 continue
             hint = ""
-            if exc.code == 401:
+            if exc.status_code == 401:
                 hint = " — проверь OPENAI_API_KEY"
-            elif exc.code == 404:
+            elif exc.status_code == 404:
                 hint = " — проверь MEME_LLM_MODEL и OPENAI_BASE_URL"
-            return False, f"HTTP {exc.code}: {detail or exc.reason}{hint}"
-        except (urllib.error.URLError, TimeoutError, KeyError, IndexError, json.JSONDecodeError) as exc:
-            return False, str(exc)
+            return False, f"HTTP {exc.status_code}: {exc.detail or exc.reason}{hint}"
+        except asyncio.TimeoutError:
+            return False, "таймаут запроса к LLM"
+        except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError) as exc:
+            return False, str(exc) or type(exc).__name__
 
     return False, "не удалось проверить LLM"
 
 
-def _normalize(text: str) -> str:
-    text = URL.sub("", text)
-    text = MENTION.sub("", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+class _Text(str):
+    """
+    Нормализованный текст сообщения вместе с разбором на слова.
+
+    Это обычная строка (сравнение, JSON, срезы работают как раньше), но слова
+    в lowercase и фразы-кандидаты посчитаны один раз. Сам разбор живёт в общем
+    LRU (_tokenize), а в истории чатов лежат простые str: у подкласса str всегда
+    есть __dict__ (~300 байт), и на 220 сообщений в чате это дороже самих текстов.
+
+    Слова — один кортеж через sys.intern (одинаковые слова всех сообщений — один
+    объект) и битовая маска не-стоп-слов. Слова в исходном регистре нужны редко
+    (_pick_word) и считаются по требованию.
+    """
+
+    lowered: tuple[str, ...]  # слова длиннее одной буквы, в нижнем регистре
+    mask: int  # бит i — lowered[i] не стоп-слово
+    _phrases: Optional[tuple[str, ...]]
+
+    def __new__(cls, normalized: str) -> "_Text":
+        self = super().__new__(cls, normalized)
+        lowered = tuple(sys.intern(w.lower()) for w in WORD.findall(normalized) if len(w) > 1)
+        mask = 0
+        for position, word in enumerate(lowered):
+            if word not in STOP_WORDS:
+                mask |= 1 << position
+        self.lowered = lowered
+        self.mask = mask
+        self._phrases = None
+        return self
+
+    @property
+    def words(self) -> tuple[str, ...]:
+        return tuple(w for w in WORD.findall(self) if len(w) > 1)
+
+    @property
+    def meaningful_words(self) -> list[str]:
+        mask = self.mask
+        return [w for position, w in enumerate(self.words) if mask >> position & 1]
+
+    def terms(self) -> list[str]:
+        """Не стоп-слова от 4 букв в нижнем регистре — для «Тем дня»."""
+        mask = self.mask
+        return [w for position, w in enumerate(self.lowered) if mask >> position & 1 and len(w) >= 4]
+
+    @property
+    def phrases(self) -> tuple[str, ...]:
+        if self._phrases is None:
+            self._phrases = tuple(_split_phrases(self))
+        return self._phrases
+
+
+@functools.lru_cache(maxsize=4096)
+def _tokenize_raw(text: str) -> _Text:
+    return _Text(" ".join(URL_OR_MENTION.sub("", text).split()))
+
+
+def _tokenize(text: str) -> _Text:
+    """Разбор текста: уже разобранный возвращается как есть, остальное — через LRU-кеш."""
+    if isinstance(text, _Text):
+        return text
+    return _tokenize_raw(text)
+
+
+def _normalize(text: str) -> _Text:
+    return _tokenize(text)
 
 
 def _words(text: str) -> list[str]:
+    if isinstance(text, _Text):
+        return list(text.words)
     return [w for w in WORD.findall(text) if len(w) > 1]
 
 
 def _meaningful_words(text: str) -> list[str]:
+    if isinstance(text, _Text):
+        return text.meaningful_words
     return [w for w in _words(text) if w.lower() not in STOP_WORDS]
 
 
 def _top_terms(texts: list[str], limit: int = 10) -> list[str]:
     counts: dict[str, int] = {}
     for text in texts:
-        for word in _meaningful_words(text):
-            lowered = word.lower()
-            if len(lowered) < 4:
-                continue
-            counts[lowered] = counts.get(lowered, 0) + 1
-    return [
-        word
-        for word, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
-    ]
+        for term in _tokenize(text).terms():
+            counts[term] = counts.get(term, 0) + 1
+    return _top_counted(counts, limit)
+
+
+def _top_counted(counts: dict[str, int], limit: int) -> list[str]:
+    """Самые частые слова, при равенстве — по алфавиту; куча на limit вместо полной сортировки."""
+    return [word for word, _ in heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))]
 
 
 def _is_coherent_snippet(snippet: str) -> bool:
@@ -610,7 +945,10 @@ def _is_coherent_snippet(snippet: str) -> bool:
 
 
 def _phrase_candidates(text: str) -> list[str]:
-    cleaned = _normalize(text)
+    return list(_tokenize(text).phrases)
+
+
+def _split_phrases(cleaned: str) -> list[str]:
     if not cleaned or cleaned.startswith("/"):
         return []
 
@@ -713,13 +1051,15 @@ def _llm_context_block(
     reply_to_text: Optional[str] = None,
     *,
     focus: Optional[str] = None,
+    topics: Optional[list[str]] = None,
 ) -> str:
     lines: list[str] = []
     if focus:
         lines.append(focus)
     if recent_texts:
         if len(recent_texts) > 12:
-            topics = _top_terms(recent_texts)
+            if topics is None:
+                topics = _top_terms(recent_texts)
             if topics:
                 lines.append(f"Темы дня: {', '.join(topics)}")
         label = "Сегодняшняя переписка в чате S:P9 works:" if focus else "Недавняя переписка в чате S:P9 works:"
@@ -735,103 +1075,528 @@ def _llm_context_block(
     return "\n".join(lines)
 
 
-def _generate_meme_with_llm(
+class _LLMMemeCache:
+    """
+    LRU с TTL: хэш (системный промпт + контекст) → годные мемы, которые LLM уже вернула,
+    включая лишние кандидаты хеджа. /meme в тихом чате шлёт тот же контекст — вместо
+    нового запроса отдаём кандидат, ещё не показанный в этом чате.
+    Показанное помним по чатам (последние shown_limit), чтобы шутки не повторялись;
+    вызовы без чата (chat_id=None) делят свой отдельный список показанного.
+    """
+
+    def __init__(
+        self,
+        size: int = MEME_LLM_CACHE_SIZE,
+        ttl: float = MEME_LLM_CACHE_TTL_SEC,
+        *,
+        per_key: int = 8,
+        shown_limit: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.per_key = per_key
+        self.shown_limit = shown_limit
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._shown: dict[Optional[int], OrderedDict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(system_prompt: str, context: str) -> str:
+        return hashlib.blake2b(f"{system_prompt}\0{context}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def add(self, key: str, memes: Iterable[Optional[str]]) -> None:
+        if self.size <= 0:
+            return
+        fresh = [meme for meme in memes if meme]
+        if not fresh:
+            return
+        entry = self._get(key)
+        if entry is None:
+            entry = (self._clock(), [])
+            self._entries[key] = entry
+        stored = entry[1]
+        for meme in fresh:
+            if meme not in stored:
+                stored.append(meme)
+        del stored[:-self.per_key]
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def take(
+        self,
+        key: str,
+        chat_id: Optional[int],
+        validator: Optional[Callable[[str], bool]] = None,
+    ) -> Optional[str]:
+        """Первый не показанный в чате мем под этим контекстом; сразу помечается показанным."""
+        entry = self._get(key)
+        if entry is None:
+            return None
+        for meme in entry[1]:
+            if self.seen(chat_id, meme) or (validator is not None and not validator(meme)):
+                continue
+            self.mark_shown(chat_id, meme)
+            return meme
+        return None
+
+    def seen(self, chat_id: Optional[int], meme: str) -> bool:
+        return meme in self._shown.get(chat_id, ())
+
+    def mark_shown(self, chat_id: Optional[int], meme: str) -> None:
+        shown = self._shown.setdefault(chat_id, OrderedDict())
+        shown[meme] = None
+        shown.move_to_end(meme)
+        while len(shown) > self.shown_limit:
+            shown.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._shown.clear()
+
+    def _get(self, key: str) -> Optional[tuple[float, list[str]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry[0] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+
+_llm_cache = _LLMMemeCache()
+
+
+async def _generate_meme_with_llm(
     current_text: str,
     recent_texts: list[str],
     reply_to_text: Optional[str] = None,
     *,
     attempts: int = 1,
     focus: Optional[str] = None,
+    topics: Optional[list[str]] = None,
+    context: Optional[str] = None,
 ) -> Optional[str]:
-    if not OPENAI_API_KEY:
-        return None
-
-    context = _llm_context_block(
+    candidates = await _generate_meme_candidates_with_llm(
         current_text,
         recent_texts,
         reply_to_text=reply_to_text,
+        attempts=attempts,
         focus=focus,
+        topics=topics,
+        context=context,
     )
+    return candidates[0] if candidates else None
+
+
+async def _generate_meme_candidates_with_llm(
+    current_text: str,
+    recent_texts: list[str],
+    reply_to_text: Optional[str] = None,
+    *,
+    attempts: int = 1,
+    focus: Optional[str] = None,
+    topics: Optional[list[str]] = None,
+    n: int = 1,
+    context: Optional[str] = None,
+) -> list[Optional[str]]:
+    """
+    Один запрос к LLM; n > 1 — n completions. Невалидные кандидаты — None.
+    Пока предохранитель открыт — сразу [], без запроса.
+    context — уже собранный _llm_context_block (иначе собираем из аргументов).
+    """
+    breaker = get_llm_breaker()
+    if not OPENAI_API_KEY or not breaker.allow():
+        return []
+    probing = breaker.state == "half_open"
+
+    if context is None:
+        context = _llm_context_block(
+            current_text,
+            recent_texts,
+            reply_to_text=reply_to_text,
+            focus=focus,
+            topics=topics,
+        )
     temperature = 1.28 if attempts > 1 else 1.18
     messages = [
         {"role": "system", "content": LLM_SYSTEM_PROMPT},
         {"role": "user", "content": context},
     ]
+    timeout = breaker.timeout(MEME_LLM_TIMEOUT_SEC)
 
-    for include_temperature in (True, False):
-        payload = _build_llm_payload(
-            messages,
-            temperature=temperature,
-            include_temperature=include_temperature,
-        )
-        request = urllib.request.Request(
-            _openai_completions_url(),
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            method="POST",
-        )
-
-        try:
-            with urllib.request.urlopen(request, timeout=MEME_LLM_TIMEOUT_SEC) as response:
-                body = json.loads(response.read().decode("utf-8"))
-            content = body["choices"][0]["message"]["content"]
-            return _sanitize_llm_reply(content)
-        except urllib.error.HTTPError as exc:
-            detail = ""
+    try:
+        for include_temperature in (True, False):
+            payload = _build_llm_payload(
+                messages,
+                temperature=temperature,
+                include_temperature=include_temperature,
+                n=n,
+            )
+            started = time.perf_counter()
+            outcome = "error"
             try:
-                detail = exc.read().decode("utf-8", errors="replace")[:300]
-            except OSError:
-                pass
-            if include_temperature and exc.code == 400 and "temperature" in detail.lower():
-                continue
-            print(f"⚠️ LLM meme failed: HTTP {exc.code} {exc.reason}" + (f" — {detail}" if detail else ""))
-            return None
-        except (urllib.error.URLError, TimeoutError, KeyError, IndexError, json.JSONDecodeError) as exc:
-            print(f"⚠️ LLM meme failed: {exc}")
-            return None
+                contents = await _post_llm(payload, timeout=timeout)
+                outcome = "ok"
+                breaker.record_success(time.perf_counter() - started, probe=probing)
+                memes = [_sanitize_llm_reply(content) for content in contents]
+                for meme in memes:
+                    LLM_CANDIDATES.inc("accepted" if meme else "rejected")
+                _llm_cache.add(_llm_cache.key(LLM_SYSTEM_PROMPT, context), memes)
+                return memes
+            except LLMHTTPError as exc:
+                outcome = "http_error"
+                if include_temperature and exc.status_code == 400 and "temperature" in exc.detail.lower():
+                    continue
+                # 5xx и 429 — провайдер не справляется; прочие 4xx — ответил, значит жив
+                if exc.status_code >= 500 or exc.status_code == 429:
+                    breaker.record_failure(f"HTTP {exc.status_code}", probe=probing)
+                else:
+                    breaker.record_success(time.perf_counter() - started, probe=probing)
+                log.warning(
+                    "⚠️ LLM meme failed: HTTP %s %s%s",
+                    exc.status_code, exc.reason, f" — {exc.detail}" if exc.detail else "",
+                )
+                return []
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                breaker.record_failure(f"таймаут {timeout:.1f}с", censored=timeout, probe=probing)
+                log.warning("⚠️ LLM meme failed: timeout %.1fs", timeout)
+                return []
+            except asyncio.CancelledError:
+                # хедж: победил другой кандидат
+                outcome = "cancelled"
+                breaker.record_cancelled(probe=probing)
+                raise
+            except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError) as exc:
+                breaker.record_failure(type(exc).__name__, probe=probing)
+                log.warning("⚠️ LLM meme failed: %r", exc)
+                return []
+            finally:
+                LLM_SECONDS.observe(time.perf_counter() - started, outcome)
 
-    return None
+        return []
+    finally:
+        # пробный запрос, упавший с неожиданным исключением, не должен держать слот half_open вечно
+        if probing:
+            breaker.release_probe()
 
 
-def _generate_meme_with_llm_retries(
+async def _generate_meme_with_llm_retries(
     current_text: str,
     recent_texts: list[str],
     reply_to_text: Optional[str] = None,
     *,
     max_attempts: int = 3,
     focus: Optional[str] = None,
+    topics: Optional[list[str]] = None,
     validator: Optional[Callable[[str], bool]] = None,
+    chat_id: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Сначала кэш: не показанный в chat_id мем под тем же контекстом — без запроса.
+    Иначе до max_attempts кандидатов от LLM; уже показанные в чате не принимаются.
+    """
+    # Контекст собираем один раз: он же ключ кэша и он же уходит в каждый запрос к LLM
+    context = _llm_context_block(current_text, recent_texts, reply_to_text=reply_to_text, focus=focus, topics=topics)
+    cache_key = _llm_cache.key(LLM_SYSTEM_PROMPT, context)
+    cached = _llm_cache.take(cache_key, chat_id, validator)
+    if cached:
+        LLM_CACHE.inc("hit")
+        return cached
+    LLM_CACHE.inc("miss")
+    # Предохранитель открыт — не ждём таймаутов на каждую попытку
+    if get_llm_breaker().blocked:
+        return None
+
+    def accept(meme: str) -> bool:
+        return (validator is None or validator(meme)) and not _llm_cache.seen(chat_id, meme)
+
+    meme = await _llm_attempts(
+        current_text,
+        recent_texts,
+        reply_to_text,
+        max_attempts=max_attempts,
+        focus=focus,
+        topics=topics,
+        validator=accept,
+        context=context,
+    )
+    if meme:
+        _llm_cache.mark_shown(chat_id, meme)
+    return meme
+
+
+async def _llm_attempts(
+    current_text: str,
+    recent_texts: list[str],
+    reply_to_text: Optional[str],
+    *,
+    max_attempts: int,
+    focus: Optional[str],
+    topics: Optional[list[str]],
+    validator: Callable[[str], bool],
+    context: Optional[str] = None,
 ) -> Optional[str]:
+    if MEME_LLM_HEDGE > 1:
+        attempt = 1
+        while attempt <= max_attempts:
+            size = min(MEME_LLM_HEDGE, max_attempts - attempt + 1)
+            meme = await _hedged_llm_round(
+                current_text,
+                recent_texts,
+                reply_to_text,
+                first_attempt=attempt,
+                size=size,
+                focus=focus,
+                topics=topics,
+                validator=validator,
+                context=context,
+            )
+            if meme:
+                return meme
+            attempt += size
+        return None
+
     for attempt in range(1, max_attempts + 1):
-        meme = _generate_meme_with_llm(
+        meme = await _generate_meme_with_llm(
             current_text,
             recent_texts,
             reply_to_text=reply_to_text,
             attempts=attempt,
             focus=focus,
+            topics=topics,
+            context=context,
         )
-        if meme and (validator is None or validator(meme)):
+        if meme and validator(meme):
             return meme
     return None
 
 
+_llm_hedge_stats = {"rounds": 0, "candidates": 0, "wasted": 0}
+
+
+def llm_hedge_stats() -> dict[str, int]:
+    """Сколько кандидатов хеджа запрошено и сколько ушло впустую."""
+    return dict(_llm_hedge_stats)
+
+
+def _record_hedge_round(size: int, used: bool) -> None:
+    wasted = size - (1 if used else 0)
+    _llm_hedge_stats["rounds"] += 1
+    _llm_hedge_stats["candidates"] += size
+    _llm_hedge_stats["wasted"] += wasted
+    log.info(
+        "🧠 LLM hedge: %s кандидатов, впустую %s (всего %s/%s)",
+        size, wasted, _llm_hedge_stats['wasted'], _llm_hedge_stats['candidates'],
+    )
+
+
+async def _hedged_llm_round(
+    current_text: str,
+    recent_texts: list[str],
+    reply_to_text: Optional[str],
+    *,
+    first_attempt: int,
+    size: int,
+    focus: Optional[str],
+    validator: Optional[Callable[[str], bool]],
+    topics: Optional[list[str]] = None,
+    context: Optional[str] = None,
+) -> Optional[str]:
+    """
+    size кандидатов сразу: первый прошедший проверку побеждает, остальные запросы отменяются.
+    Отменённые и отбракованные кандидаты считаются потраченными впустую.
+    """
+    def accept(meme: Optional[str]) -> bool:
+        return bool(meme) and (validator is None or validator(meme))
+
+    if MEME_LLM_HEDGE_MODE == "n":
+        candidates = await _generate_meme_candidates_with_llm(
+            current_text,
+            recent_texts,
+            reply_to_text=reply_to_text,
+            attempts=first_attempt,
+            focus=focus,
+            topics=topics,
+            n=size,
+            context=context,
+        )
+        chosen = next((meme for meme in candidates if accept(meme)), None)
+        _record_hedge_round(size, chosen is not None)
+        return chosen
+
+    tasks = [
+        asyncio.create_task(
+            _generate_meme_with_llm(
+                current_text,
+                recent_texts,
+                reply_to_text=reply_to_text,
+                attempts=first_attempt + index,
+                focus=focus,
+                topics=topics,
+                context=context,
+            )
+        )
+        for index in range(size)
+    ]
+    chosen = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            meme = await next_done
+            if accept(meme):
+                chosen = meme
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    _record_hedge_round(size, chosen is not None)
+    return chosen
+
+
 def _collect_phrases(source_texts: list[str]) -> list[str]:
     phrases: list[str] = []
     for text in source_texts:
         phrases.extend(_phrase_candidates(text))
-    # длинные уникальные фразы важнее
-    unique = list(dict.fromkeys(phrases))
-    return [p for p in unique if _is_coherent_snippet(p)]
+    # кандидаты уже прошли _is_coherent_snippet в _split_phrases — только убираем дубли
+    return list(dict.fromkeys(phrases))
+
 
+class _PhraseIndex(Sequence):
+    """
+    Фразы-кандидаты из дневной истории чата, обновляются по одному сообщению.
+
+    У каждой фразы счётчик сообщений, где она встретилась: фраза уходит,
+    когда уходит последнее такое сообщение (история переполнилась или сменился день).
+    Список без дублей — случайная фраза за O(1), без пересборки по всей истории.
+    """
 
-def _build_meme(source_texts: list[str]) -> Optional[str]:
+    def __init__(self) -> None:
+        self._counts: dict[str, int] = {}
+        self._items: list[str] = []
+        self._positions: dict[str, int] = {}
+
+    def add(self, text: str) -> None:
+        for phrase in _tokenize(text).phrases:
+            if phrase == text:
+                phrase = text  # сообщение целиком — та же str, что в истории, а не разбор из LRU
+            count = self._counts.get(phrase, 0)
+            self._counts[phrase] = count + 1
+            if count == 0:
+                self._positions[phrase] = len(self._items)
+                self._items.append(phrase)
+
+    def discard(self, text: str) -> None:
+        for phrase in _tokenize(text).phrases:
+            count = self._counts.get(phrase, 0)
+            if count > 1:
+                self._counts[phrase] = count - 1
+            elif count == 1:
+                del self._counts[phrase]
+                position = self._positions.pop(phrase)
+                last = self._items.pop()
+                if position < len(self._items):
+                    self._items[position] = last
+                    self._positions[last] = position
+
+    def __contains__(self, phrase: object) -> bool:
+        return phrase in self._positions
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, position):
+        return self._items[position]
+
+
+class _PhrasePool(Sequence):
+    """Индекс чата + фразы текущего сообщения/реплая — без копирования индекса."""
+
+    def __init__(self, index: _PhraseIndex, extra_texts: Iterable[Optional[str]] = ()) -> None:
+        self._index = index
+        extra = [phrase for text in extra_texts if text for phrase in _phrase_candidates(text)]
+        self._extra = [phrase for phrase in dict.fromkeys(extra) if phrase not in index]
+
+    def __len__(self) -> int:
+        return len(self._extra) + len(self._index)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if position < len(self._extra):
+            return self._extra[position]
+        return self._index[position - len(self._extra)]
+
+
+class _DayIndex:
+    """Всё, что считается по дневной истории чата: фразы для мемов и частоты слов («Темы дня»)."""
+
+    __slots__ = ("source", "phrases", "terms", "_top")
+
+    def __init__(self, source: Optional[_DailyHistory] = None) -> None:
+        self.source = source  # история из _chat_daily_history, за которой следит индекс
+        self.phrases = _PhraseIndex()
+        self.terms: Counter[str] = Counter()
+        self._top: Optional[tuple[int, list[str]]] = None  # (limit, темы) до следующего изменения
+        for text in source.texts if source is not None else ():
+            self.add(text)
+
+    def add(self, text: str) -> None:
+        self.phrases.add(text)
+        for term in _tokenize(text).terms():
+            self.terms[term] += 1
+        self._top = None
+
+    def discard(self, text: str) -> None:
+        self.phrases.discard(text)
+        for term in _tokenize(text).terms():
+            count = self.terms[term] - 1
+            if count > 0:
+                self.terms[term] = count
+            else:
+                del self.terms[term]
+        self._top = None
+
+    def top_terms(self, limit: int = 10) -> list[str]:
+        if self._top is None or self._top[0] != limit:
+            self._top = (limit, _top_counted(self.terms, limit))
+        return list(self._top[1])
+
+
+def _day_index(chat_id: int) -> _DayIndex:
+    """Индекс дневной истории; пересобирается, только если историю подменили целиком (загрузка)."""
+    history = _chat_daily_history.get(chat_id)
+    index = _day_indexes.get(chat_id)
+    if index is None or index.source is not history:
+        index = _DayIndex(history)
+        _day_indexes[chat_id] = index
+    return index
+
+
+def _chat_phrases(chat_id: int, *extra_texts: Optional[str]) -> _PhrasePool:
+    _prune_daily_history(chat_id)
+    return _PhrasePool(_day_index(chat_id).phrases, extra_texts)
+
+
+def chat_topics(chat_id: int, limit: int = 10) -> list[str]:
+    """«Темы дня» чата — самые частые слова сегодняшней переписки (для LLM и веб-панели)."""
+    _prune_daily_history(chat_id)
+    return _day_index(chat_id).top_terms(limit)
+
+
+def _build_meme(source_texts: list[str], phrases: Optional[Sequence[str]] = None) -> Optional[str]:
     if not source_texts:
         return None
 
-    phrases = _collect_phrases(source_texts)
+    if phrases is None:
+        phrases = _collect_phrases(source_texts)
     if not phrases:
         return None
 
@@ -858,8 +1623,9 @@ def _build_meme(source_texts: list[str]) -> Optional[str]:
     return None
 
 
-def _build_durdach_meme(source_texts: list[str]) -> Optional[str]:
-    phrases = _collect_phrases(source_texts)
+def _build_durdach_meme(source_texts: list[str], phrases: Optional[Sequence[str]] = None) -> Optional[str]:
+    if phrases is None:
+        phrases = _collect_phrases(source_texts)
     snippet = _shorten_snippet(random.choice(phrases)) if phrases else "макет почти гуд"
 
     for _ in range(20):
@@ -894,9 +1660,10 @@ def _build_durdach_meme(source_texts: list[str]) -> Optional[str]:
     return generic if _is_valid_meme(generic) else None
 
 
-def _build_smaev_meme(source_texts: list[str]) -> Optional[str]:
+def _build_smaev_meme(source_texts: list[str], phrases: Optional[Sequence[str]] = None) -> Optional[str]:
     """Пародийный силовой архетип без цитат и имитации реального человека."""
-    phrases = _collect_phrases(source_texts)
+    if phrases is None:
+        phrases = _collect_phrases(source_texts)
     snippet = _shorten_snippet(random.choice(phrases)) if phrases else "макет почти готов"
 
     for _ in range(20):
@@ -914,7 +1681,7 @@ def _build_smaev_meme(source_texts: list[str]) -> Optional[str]:
         if _is_valid_meme(result):
             return result
 
-    return _pick_scheduled_fallback(SMAEV_FALLBACKS, source_texts)
+    return _pick_scheduled_fallback(SMAEV_FALLBACKS, source_texts, phrases=phrases)
 
 
 def _shorten_snippet(text: str, max_len: int = 54) -> str:
@@ -924,12 +1691,15 @@ def _shorten_snippet(text: str, max_len: int = 54) -> str:
     return cleaned[: max_len - 1].rstrip(" ,.;:—–-") + "…"
 
 
-def _generate_meme(
+async def _generate_meme(
     current_text: str,
     recent_texts: list[str],
     reply_to_text: Optional[str] = None,
     *,
     prefer_llm: bool = False,
+    phrases: Optional[Sequence[str]] = None,
+    topics: Optional[list[str]] = None,
+    chat_id: Optional[int] = None,
 ) -> Optional[str]:
     sources = _source_pool(current_text, recent_texts, reply_to_text=reply_to_text)
     if not sources:
@@ -938,42 +1708,55 @@ def _generate_meme(
     use_llm = OPENAI_API_KEY and (prefer_llm or random.random() < MEME_LLM_CHANCE)
     if use_llm:
         llm_attempts = 3 if prefer_llm else 2
-        meme = _generate_meme_with_llm_retries(
+        # кэш → LLM; при открытом предохранителе сразу шаблоны, без ожидания таймаутов
+        meme = await _generate_meme_with_llm_retries(
             current_text,
             recent_texts,
             reply_to_text=reply_to_text,
             max_attempts=llm_attempts,
+            topics=topics,
+            chat_id=chat_id,
         )
         if meme:
-            print(f"🧠 LLM meme: {meme}")
+            log.info("🧠 LLM meme: %s", meme)
             return meme
         if prefer_llm:
-            print("⚠️ LLM meme empty, fallback to phrases")
+            log.warning("⚠️ LLM meme empty, fallback to phrases")
 
-    return _build_meme(sources)
+    return _build_meme(sources, phrases)
 
 
-def record_chat_message(chat_id: int, text: str) -> None:
+def record_chat_message(chat_id: int, text: str, chat_type: Optional[str] = None) -> None:
+    """
+    Сообщение человека в историю чата. С chat_type — заодно и активность
+    (как touch_chat_activity), одной записью журнала вместо двух.
+    """
     cleaned = _normalize(text)
-    if len(cleaned) < 3:
+    now = time.time()
+    if len(cleaned) < 3 or not _apply_chat_message(chat_id, cleaned, now):
+        if chat_type is not None:
+            touch_chat_activity(chat_id, chat_type)
         return
-    history = _chat_history.setdefault(chat_id, deque(maxlen=MEME_HISTORY_SIZE))
-    if history and history[-1] == cleaned:
+    record: dict[str, object] = {"op": "m", "c": chat_id, "ts": now, "t": cleaned}
+    if chat_type is not None:
+        _last_chat_activity[chat_id] = now
+        _chat_types[chat_id] = chat_type
+        record["ty"] = chat_type
+    if MEME_JOURNAL_ENABLED:
+        _journal_append(record)
         return
-    history.append(cleaned)
-    daily_history = _chat_daily_history.setdefault(chat_id, deque(maxlen=MEME_DAILY_HISTORY_SIZE))
-    now = time.time()
-    if not daily_history or daily_history[-1].get("text") != cleaned:
-        daily_history.append({"ts": now, "day": _day_key(now), "text": cleaned})
-        _prune_daily_history(chat_id)
     _mark_state_dirty()
     save_meme_state()
 
 
 def touch_chat_activity(chat_id: int, chat_type: str = "group") -> None:
     """Отмечает активность людей в чате (для мема после тишины)."""
-    _last_chat_activity[chat_id] = time.time()
+    now = time.time()
+    _last_chat_activity[chat_id] = now
     _chat_types[chat_id] = chat_type
+    if MEME_JOURNAL_ENABLED:
+        _journal_append({"op": "a", "c": chat_id, "ts": now, "ty": chat_type})
+        return
     _mark_state_dirty()
     save_meme_state()
 
@@ -1013,13 +1796,7 @@ def silence_meme_candidates() -> list[int]:
 
 async def generate_silence_meme(chat_id: int) -> Optional[str]:
     history = list(_chat_history.get(chat_id, []))
-    meme = await asyncio.to_thread(
-        _generate_meme,
-        SILENCE_MEME_PROMPT,
-        history,
-        prefer_llm=True,
-    )
-    return meme
+    return await _generate_meme(SILENCE_MEME_PROMPT, history, prefer_llm=True, chat_id=chat_id)
 
 
 def _scheduled_meme_config(slot: str) -> tuple[str, tuple[str, ...]]:
@@ -1074,8 +1851,12 @@ def _pick_scheduled_fallback(
     history: list[str],
     *,
     validator: Callable[[str], bool] = _is_valid_meme,
+    phrases: Optional[Sequence[str]] = None,
 ) -> str:
-    phrases = _collect_phrases(history) if history else []
+    if not history:
+        phrases = ()
+    elif phrases is None:
+        phrases = _collect_phrases(history)
     snippet = random.choice(phrases) if phrases else "макет почти гуд"
     for template in random.sample(list(fallbacks), len(fallbacks)):
         try:
@@ -1087,7 +1868,7 @@ def _pick_scheduled_fallback(
     if history:
         # A quoted chat snippet may itself contain a bleak phrase. Retry with a
         # neutral snippet instead of letting that phrase bypass scheduled tone.
-        return _pick_scheduled_fallback(fallbacks, [], validator=validator)
+        return _pick_scheduled_fallback(fallbacks, [], validator=validator, phrases=())
     template = random.choice(fallbacks)
     try:
         return template.format(snippet=snippet) if "{snippet}" in template else template
@@ -1098,7 +1879,10 @@ def _pick_scheduled_fallback(
 async def generate_sp9_scheduled_meme(chat_id: int, slot: str) -> Optional[str]:
     """Плановый мем для S:P9 works: afternoon | evening | evening_friday."""
     _, fallbacks = _scheduled_meme_config(slot)
-    history = _today_history(chat_id) or list(_chat_history.get(chat_id, []))
+    day_history = _today_history(chat_id)
+    history = day_history or list(_chat_history.get(chat_id, []))
+    phrases = _chat_phrases(chat_id) if day_history else None
+    topics = chat_topics(chat_id) if day_history else None
     focus = SP9_SLOT_LLM_FOCUS.get(slot, SP9_SLOT_LLM_FOCUS["evening"])
     style = _pick_scheduled_style(slot, history)
     if style == "durdach":
@@ -1106,37 +1890,43 @@ async def generate_sp9_scheduled_meme(chat_id: int, slot: str) -> Optional[str]:
     elif style == "smaev":
         focus = f"{focus}\n{SMAEV_LLM_FOCUS}"
 
-    meme = await asyncio.to_thread(
-        _generate_scheduled_sp9_meme,
+    return await _generate_scheduled_sp9_meme(
         history,
         focus,
         fallbacks,
         style == "durdach",
         style == "smaev",
+        phrases=phrases,
+        topics=topics,
+        chat_id=chat_id,
     )
-    return meme
 
 
-def _generate_scheduled_sp9_meme(
+async def _generate_scheduled_sp9_meme(
     history: list[str],
     focus: str,
     fallbacks: tuple[str, ...],
     prefer_durdach: bool = False,
     prefer_smaev: bool = False,
+    phrases: Optional[Sequence[str]] = None,
+    topics: Optional[list[str]] = None,
+    chat_id: Optional[int] = None,
 ) -> Optional[str]:
     if OPENAI_API_KEY:
-        meme = _generate_meme_with_llm_retries(
+        meme = await _generate_meme_with_llm_retries(
             "",
             history,
             max_attempts=3,
             focus=focus,
+            topics=topics,
             validator=_is_inspiring_scheduled_meme,
+            chat_id=chat_id,
         )
         if meme:
             label = "durdach " if prefer_durdach else "smaev " if prefer_smaev else ""
-            print(f"🧠 LLM {label}scheduled meme: {meme}")
+            log.info("🧠 LLM %sscheduled meme: %s", label, meme)
             return meme
-        print("⚠️ LLM scheduled meme empty, fallback to phrases")
+        log.warning("⚠️ LLM scheduled meme empty, fallback to phrases")
 
     # `focus` is an instruction for the LLM, never source material for phrase
     # templates.  Using it here used to publish fragments such as
@@ -1153,28 +1943,31 @@ def _generate_scheduled_sp9_meme(
 
     sources = list(history)
     if prefer_durdach:
-        built_durdach = _build_durdach_meme(sources)
+        built_durdach = _build_durdach_meme(sources, phrases)
         if built_durdach and _is_inspiring_scheduled_meme(built_durdach):
             return built_durdach
         return _pick_scheduled_fallback(
             DURDACH_FALLBACKS,
             history,
             validator=_is_inspiring_scheduled_meme,
+            phrases=phrases,
         )
     if prefer_smaev:
-        built_smaev = _build_smaev_meme(sources)
+        built_smaev = _build_smaev_meme(sources, phrases)
         if built_smaev and _is_inspiring_scheduled_meme(built_smaev):
             return built_smaev
         return _pick_scheduled_fallback(
             SMAEV_FALLBACKS,
             history,
             validator=_is_inspiring_scheduled_meme,
+            phrases=phrases,
         )
 
     return _pick_scheduled_fallback(
         fallbacks,
         history,
         validator=_is_inspiring_scheduled_meme,
+        phrases=phrases,
     )
 
 
@@ -1236,13 +2029,11 @@ async def force_meme_reply(
     context_history = day_history or history
     recent = context_history[:-1] if context_history else []
     current = _resolve_force_prompt(prompt_text, context_history)
+    phrases = _chat_phrases(chat_id, reply_to_text, current) if day_history else None
+    topics = chat_topics(chat_id) if day_history else None
 
-    meme = await asyncio.to_thread(
-        _generate_meme,
-        current,
-        recent,
-        reply_to_text,
-        prefer_llm=True,
+    meme = await _generate_meme(
+        current, recent, reply_to_text, prefer_llm=True, phrases=phrases, topics=topics, chat_id=chat_id
     )
     if meme:
         _mark_force_meme(chat_id, user_id)
@@ -1261,10 +2052,12 @@ async def maybe_meme_reply(
     """
     С небольшой вероятностью вернуть мемную реплику по контексту чата.
     """
-    if len(_normalize(message_text)) < MEME_MIN_TEXT_LEN:
+    # Сначала дешёвые проверки и бросок кубика — историю копируем, только если мем всё же будет
+    cleaned = _normalize(message_text)
+    if len(cleaned) < MEME_MIN_TEXT_LEN:
         return None
 
-    history = list(_chat_history.get(chat_id, []))
+    history = _chat_history.get(chat_id, ())
     if len(history) < MEME_MIN_HISTORY and not reply_to_text:
         return None
 
@@ -1276,13 +2069,13 @@ async def maybe_meme_reply(
         return None
 
     day_history = _today_history(chat_id)
-    context_history = day_history if len(day_history) >= MEME_MIN_HISTORY else history
-    recent = [t for t in context_history if t != _normalize(message_text)]
-    meme = await asyncio.to_thread(
-        _generate_meme,
-        message_text,
-        recent,
-        reply_to_text,
+    context_history = day_history if len(day_history) >= MEME_MIN_HISTORY else list(history)
+    recent = [t for t in context_history if t != cleaned]
+    from_day = context_history is day_history
+    phrases = _chat_phrases(chat_id, reply_to_text, message_text) if from_day else None
+    topics = chat_topics(chat_id) if from_day else None
+    meme = await _generate_meme(
+        message_text, recent, reply_to_text, phrases=phrases, topics=topics, chat_id=chat_id
     )
     if meme:
         _mark_meme_reply(chat_id)
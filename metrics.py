@@ -0,0 +1,254 @@
+"""
+Метрики процесса в текстовом формате Prometheus — отдаются на /metrics веб-сервера.
+
+Счётчики и гистограммы без блокировок на горячем пути: у каждого потока свой
+шард (dict label-значения → число), пишет в него только этот поток. Блокировка
+берётся один раз — когда поток впервые трогает метрику — и при сборе /metrics,
+который суммирует шарды. Потоки в процессе: event loop бота (хендлеры, LLM,
+рассылки, панель), писатель persistence, поток логов.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Секунды: от быстрых хендлеров (~0.1 мс) до долгих LLM-запросов и рассылок
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_registry: dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _snapshots(self) -> list[dict]:
+        # dict.copy() под GIL атомарен — поток-владелец может писать параллельно
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счётчик: inc(*label_values, amount=1)."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(shard.get(labels, 0.0) for shard in self._snapshots())
+
+    def render(self) -> list[str]:
+        totals: dict[tuple, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        lines = self._header()
+        for labels in sorted(totals):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(totals[labels])}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: tuple[str, ...]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+
+
+class Histogram(_Metric):
+    """
+    Гистограмма: observe(value, *label_values). В шарде на набор меток — список
+    [счётчики по корзинам..., +Inf, сумма]; _count считается из корзин, поэтому
+    всегда совпадает с бакетом +Inf.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        slot = shard.get(labels)
+        if slot is None:
+            slot = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        slot[bisect_left(self.buckets, value)] += 1
+        slot[-1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        """with HISTOGRAM.time("label"): ... — наблюдает длительность блока в секундах."""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        return sum(sum(shard[labels][:-1]) for shard in self._snapshots() if labels in shard)
+
+    def render(self) -> list[str]:
+        totals: dict[tuple, list] = {}
+        for shard in self._snapshots():
+            for labels, slot in shard.items():
+                slot = list(slot)
+                merged = totals.get(labels)
+                if merged is None:
+                    totals[labels] = slot
+                else:
+                    for i, value in enumerate(slot):
+                        merged[i] += value
+        lines = self._header()
+        bounds = self.buckets + (float("inf"),)
+        for labels in sorted(totals):
+            slot = totals[labels]
+            cumulative = 0
+            for bound, count in zip(bounds, slot):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_number(slot[-1])}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Значение считается в момент сбора: fn() → число."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]) -> None:
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        return self._header() + [f"{self.name} {_number(float(self.fn()))}"]
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            # повторный импорт модуля (тесты, reload) — та же метрика
+            if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help_text, labelnames))
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labelnames: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def gauge_callback(name: str, help_text: str, fn: Callable[[], float]) -> CallbackGauge:
+    return _register(CallbackGauge(name, help_text, fn))
+
+
+def track_async(histogram: Histogram, errors: Optional[Counter] = None):
+    """Декоратор корутины: длительность в histogram с меткой = имя функции, исключения — в errors."""
+
+    def decorate(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+
+        return wrapper
+
+    return decorate
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines: list[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_STARTED_AT = time.time()
+gauge_callback("slashbot_start_time_seconds", "Время запуска процесса, unix-секунды.", lambda: _STARTED_AT)
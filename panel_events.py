@@ -0,0 +1,108 @@
+"""
+Версии данных веб-панели и рассылка изменений открытым вкладкам (SSE).
+
+Темы: scheduled — отложенные и системные расписания, chats — список чатов.
+Бот и панель вызывают publish() после записи файлов; версия темы + mtime
+файлов дают ETag для /api/scheduled и /api/chats. Изменения файлов другим
+процессом (web_app.py отдельно от бота) ловит check_files() по keepalive SSE.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Optional
+
+TOPICS = ("scheduled", "chats")
+
+_lock = threading.Lock()
+_versions: dict[str, int] = {topic: 0 for topic in TOPICS}
+_watched: dict[str, list[str]] = {topic: [] for topic in TOPICS}
+_seen_mtimes: dict[str, tuple[int, ...]] = {}
+_subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+
+def watch(topic: str, *paths: str) -> None:
+    """Файлы, чьё изменение означает новую версию темы."""
+    with _lock:
+        for path in paths:
+            if path not in _watched[topic]:
+                _watched[topic].append(path)
+        _seen_mtimes[topic] = _mtimes(_watched[topic])
+
+
+def _mtimes(paths: list[str]) -> tuple[int, ...]:
+    result = []
+    for path in paths:
+        try:
+            result.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            result.append(0)
+    return tuple(result)
+
+
+def version(topic: str) -> int:
+    return _versions[topic]
+
+
+def etag(topic: str, *extra: object) -> str:
+    """Версия темы + mtime её файлов (+ параметры запроса, например chat_id)."""
+    with _lock:
+        paths = list(_watched[topic])
+        current = _versions[topic]
+    parts = [str(current), *(format(mtime, "x") for mtime in _mtimes(paths))]
+    parts.extend(str(item) for item in extra if item not in (None, ""))
+    return f"{topic}-" + "-".join(parts)
+
+
+def publish(topic: str) -> None:
+    """Тема изменилась. Потокобезопасно: можно звать из потока persistence и из колбэков JobQueue."""
+    with _lock:
+        _versions[topic] += 1
+        current = _versions[topic]
+        _seen_mtimes[topic] = _mtimes(_watched[topic])
+        subscribers = list(_subscribers)
+    for loop, queue in subscribers:
+        if loop.is_closed():
+            continue
+        try:
+            running: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            _offer(queue, topic, current)
+        else:
+            loop.call_soon_threadsafe(_offer, queue, topic, current)
+
+
+def _offer(queue: asyncio.Queue, topic: str, current: int) -> None:
+    try:
+        queue.put_nowait((topic, current))
+    except asyncio.QueueFull:
+        pass  # вкладка не успевает читать — получит следующее событие, данные всё равно перечитает
+
+
+def check_files() -> None:
+    """Опубликовать темы, чьи файлы поменял кто-то вне этого процесса."""
+    changed = []
+    with _lock:
+        for topic, paths in _watched.items():
+            mtimes = _mtimes(paths)
+            if _seen_mtimes.get(topic) != mtimes:
+                _seen_mtimes[topic] = mtimes
+                changed.append(topic)
+    for topic in changed:
+        publish(topic)
+
+
+def subscribe() -> asyncio.Queue:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=32)
+    with _lock:
+        _subscribers.add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(queue: asyncio.Queue) -> None:
+    with _lock:
+        for item in [item for item in _subscribers if item[1] is queue]:
+            _subscribers.discard(item)
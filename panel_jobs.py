@@ -0,0 +1,227 @@
+"""
+Отложенные и регулярные сообщения веб-панели в JobQueue бота.
+
+scheduled_messages.json — единственное хранилище: при старте бот заново
+ставит все задачи из файла (rearm_all), панель добавляет/снимает задачи
+в тот же JobQueue на общем event loop. Панель в отдельном процессе пишет
+только файл — бот подхватывает правки по mtime (reload_job). Отправка — через broadcast.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import bot_runtime
+import panel_events
+from broadcast import broadcast
+
+log = logging.getLogger(__name__)
+
+_DATA_DIR = os.environ.get('SLASHBOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+SCHEDULED_MESSAGES_FILE = os.path.join(_DATA_DIR, "scheduled_messages.json")
+DEFAULT_TZ = "Europe/Moscow"
+# Разовое сообщение, пропущенное из-за рестарта, ещё отправляется, если опоздали не больше чем на столько
+PANEL_JOB_MISFIRE_SEC = float(os.getenv("PANEL_JOB_MISFIRE_SEC", "3600"))
+# Панель в отдельном процессе (start_web.sh) пишет только файл — бот раз в столько секунд сверяет mtime
+PANEL_JOBS_RELOAD_SEC = float(os.getenv("PANEL_JOBS_RELOAD_SEC", "30"))
+
+T = TypeVar("T")
+# Панель и JobQueue правят файл из потоков asyncio.to_thread — чтение-правка-запись под одним замком
+_messages_lock = threading.Lock()
+# mtime файла, по которому задачи поставлены последний раз (None — файла не было)
+_armed_mtime: Optional[int] = None
+
+
+def load_messages() -> list[dict]:
+    """Загружает список запланированных сообщений"""
+    if os.path.exists(SCHEDULED_MESSAGES_FILE):
+        try:
+            with open(SCHEDULED_MESSAGES_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            log.error("Ошибка при загрузке запланированных сообщений: %s", e)
+            return []
+    return []
+
+
+def save_messages(messages: list[dict]) -> bool:
+    """Сохраняет список запланированных сообщений"""
+    try:
+        with open(SCHEDULED_MESSAGES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(messages, f, ensure_ascii=False, indent=2)
+        panel_events.publish('scheduled')
+        return True
+    except Exception as e:
+        log.error("Ошибка при сохранении запланированных сообщений: %s", e)
+        return False
+
+
+def update_messages(change: Callable[[list[dict]], T]) -> T:
+    """
+    Прочитать файл, поправить список на месте через change и записать обратно.
+    Блокирует (диск + замок) — с event loop звать через asyncio.to_thread.
+    change вернул None — править было нечего, файл не переписываем.
+    """
+    with _messages_lock:
+        messages = load_messages()
+        result = change(messages)
+        if result is not None:
+            save_messages(messages)
+        return result
+
+
+def add_message(item: dict) -> None:
+    """Дописать запись в файл (блокирует, см. update_messages)."""
+    update_messages(lambda messages: messages.append(item) or item)
+
+
+def remove_message(message_id: str) -> bool:
+    """Убрать запись из файла (блокирует, см. update_messages). False — такой не было."""
+    def drop(messages: list[dict]) -> Optional[bool]:
+        kept = [m for m in messages if m.get('id') != message_id]
+        if len(kept) == len(messages):
+            return None
+        messages[:] = kept
+        return True
+    return bool(update_messages(drop))
+
+
+def job_name(message_id: str) -> str:
+    return f"panel:{message_id}"
+
+
+def _zone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or DEFAULT_TZ)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TZ)
+
+
+def parse_send_time(value: str, tz_name: Optional[str] = None) -> dt.datetime:
+    """ISO-строка из панели; без смещения — время по Москве (как раньше в DateTrigger)."""
+    when = dt.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=_zone(tz_name))
+    return when
+
+
+def get_job_queue():
+    application = bot_runtime.get_application()
+    return application.job_queue if application is not None else None
+
+
+def disarm(job_queue, message_id: str) -> None:
+    if job_queue is None:
+        return
+    for job in job_queue.get_jobs_by_name(job_name(message_id)):
+        job.schedule_removal()
+
+
+def arm(job_queue, item: dict, *, now: Optional[dt.datetime] = None) -> bool:
+    """
+    Поставить задачу для записи из scheduled_messages.json (старая снимается).
+    Дни регулярных — как в панели и в JobQueue: 0=вс, 1=пн … 6=сб.
+    False — задача не поставлена (нет JobQueue, разовое давно в прошлом, битая запись).
+    """
+    if job_queue is None:
+        return False
+    message_id = item['id']
+    disarm(job_queue, message_id)
+    try:
+        if item.get('is_recurring'):
+            pattern = item.get('recurring_pattern') or {}
+            hour, minute = (int(part) for part in pattern.get('time', '10:00').split(':')[:2])
+            days = tuple(sorted({int(day) % 7 for day in pattern.get('days', [1, 2, 3, 4, 5])}))
+            job_queue.run_daily(
+                send_panel_message,
+                time=dt.time(hour, minute, tzinfo=_zone(pattern.get('timezone'))),
+                days=days,
+                name=job_name(message_id),
+                chat_id=int(item['chat_id']),
+                data=message_id,
+            )
+            return True
+
+        when = parse_send_time(item['send_time'])
+        now = now or dt.datetime.now(dt.timezone.utc)
+        late = (now - when).total_seconds()
+        if late > PANEL_JOB_MISFIRE_SEC:
+            log.warning("⚠️ Разовое сообщение %s пропущено: должно было уйти %s", message_id, when.isoformat())
+            return False
+        job_queue.run_once(
+            send_panel_message,
+            when=when if late < 0 else 0,
+            name=job_name(message_id),
+            chat_id=int(item['chat_id']),
+            data=message_id,
+        )
+        return True
+    except (KeyError, TypeError, ValueError) as e:
+        log.warning("⚠️ Не удалось поставить задачу %s: %s", message_id, e)
+        return False
+
+
+def _file_mtime() -> Optional[int]:
+    try:
+        return os.stat(SCHEDULED_MESSAGES_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def rearm_all(job_queue, messages: Optional[list[dict]] = None, *, mtime: Optional[int] = None) -> int:
+    """
+    Поставить все задачи из файла, снять задачи удалённых записей. Возвращает число поставленных.
+    messages/mtime — уже прочитанные из файла (reload_job читает их в потоке).
+    """
+    global _armed_mtime
+    if messages is None:
+        mtime = _file_mtime()
+        messages = load_messages()
+    _armed_mtime = mtime
+    if job_queue is None:
+        return 0
+    alive = {job_name(str(item.get('id'))) for item in messages}
+    for job in job_queue.jobs():
+        if job.name and job.name.startswith(job_name('')) and job.name not in alive:
+            job.schedule_removal()
+    return sum(1 for item in messages if arm(job_queue, item))
+
+
+async def reload_job(context) -> None:
+    """Колбэк JobQueue: файл поменялся (панель в отдельном процессе) — переставить задачи без рестарта бота."""
+    mtime = await asyncio.to_thread(_file_mtime)
+    if mtime == _armed_mtime:
+        return
+    messages = await asyncio.to_thread(load_messages)
+    armed = rearm_all(context.job_queue, messages, mtime=mtime)
+    log.info("🗓️ Задачи веб-панели перечитаны из файла: поставлено %s", armed)
+
+
+async def send_panel_message(context) -> None:
+    """Колбэк JobQueue: текст берём из файла в момент отправки — правки из панели уже учтены."""
+    message_id = context.job.data
+    messages = await asyncio.to_thread(load_messages)
+    item = next((m for m in messages if m.get('id') == message_id), None)
+    if item is None:
+        return
+    chat_id = int(item['chat_id'])
+    started = time.monotonic()
+    report = await broadcast(context.bot, [chat_id], item['message'], on_drop=_drop_chat)
+    if chat_id in report.sent:
+        log.info("✅ Сообщение панели %s отправлено в чат %s (%.2fс)", message_id, chat_id, time.monotonic() - started)
+    else:
+        log.error("❌ Сообщение панели %s в чат %s не ушло: %s", message_id, chat_id, report.error_for(chat_id))
+    if not item.get('is_recurring'):
+        # Разовое сделало своё дело — убираем из файла, чтобы после рестарта не ушло повторно
+        await asyncio.to_thread(remove_message, message_id)
+
+
+def _drop_chat(chat_id: int, reason: str) -> None:
+    bot_runtime.call_hook('drop_chat', chat_id, reason)
@@ -5,9 +5,17 @@
 - только отклики (без «оставил», «проверь», «закинь»)
 - шаблоны: {оценка}, {согласие}, {оценка}, спасибо и т.д.
 """
+import json
+import logging
+import os
 import random
 import re
-from typing import Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import product
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
 
 BOT_USERNAME = "ag_slashbot"
 BOT_MENTION = f"@{BOT_USERNAME}"
@@ -45,6 +53,14 @@ TEAM_PERSONALIZATION: dict[str, dict[str, list[str]]] = {
     },
 }
 TEAM_USERNAMES = frozenset(TEAM_PERSONALIZATION.keys())
+# Встроенный состав — база, поверх которой накладывается TEAM_ROSTER_FILE
+_BUILTIN_TEAM = {user: dict(profile) for user, profile in TEAM_PERSONALIZATION.items()}
+
+_DATA_DIR = os.environ.get('SLASHBOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+# JSON {"username": {"names": [...], "long": [...]}} — добавляет и переопределяет участников без правки кода
+TEAM_ROSTER_FILE = os.getenv("TEAM_ROSTER_FILE", os.path.join(_DATA_DIR, "team_roster.json"))
+# Как часто бот проверяет, не поменялся ли файл (сек); 0 — только при старте
+TEAM_ROSTER_RELOAD_SEC = float(os.getenv("TEAM_ROSTER_RELOAD_SEC", "60"))
 PERSONALIZE_LONG_CHANCE = 0.24
 PERSONALIZE_NAME_CHANCE = 0.38
 
@@ -265,25 +281,129 @@ BACKGROUND_TRIGGER = re.compile(
     re.I,
 )
 
+# Обращение к боту в тексте: @ag_slashbot и любые @…slashbot
+BOT_MENTION_TRIGGER = re.compile(r"@\w*slashbot", re.I)
+
+
+@dataclass(frozen=True)
+class MessageTriggers:
+    """Что нашлось в тексте: контекст по TRIGGER_CONTEXT, фоновый триггер, обращение к боту."""
 
-def _maybe_cap(word: str) -> str:
-    """Паша часто пишет «Да», «Ага», «Спасибо» с заглавной."""
-    if random.random() < 0.45 and word.islower() and word.isalpha():
-        return word[0].upper() + word[1:]
-    return word
+    context: str = "generic"
+    background: bool = False
+    mentioned: bool = False
+
+
+def _compile_trigger_scan() -> re.Pattern:
+    """
+    Все триггеры одной регуляркой. Ворота (?=…|…) находят позиции, где
+    начинается хоть один триггер, а необязательные lookahead-группы за ними
+    отмечают каждый совпавший — так ни один не прячет другой, и приоритет
+    TRIGGER_CONTEXT (первый в списке побеждает) сохраняется.
+    Без re.I: текст один раз приводится к нижнему регистру — так в разы быстрее.
+    """
+    parts = [(f"c{i}", pattern.pattern) for i, (pattern, _) in enumerate(TRIGGER_CONTEXT)]
+    parts.append(("background", BACKGROUND_TRIGGER.pattern))
+    parts.append(("mention", BOT_MENTION_TRIGGER.pattern))
+    gate = "|".join(f"(?:{source})" for _, source in parts)
+    probes = "".join(f"(?:(?=(?P<{name}>{source})))?" for name, source in parts)
+    return re.compile(f"(?={gate}){probes}")
 
 
-def _pick(pool: list[str], cap: bool = False) -> str:
-    w = random.choice(pool)
-    return _maybe_cap(w) if cap else w
+_TRIGGER_SCAN = _compile_trigger_scan()
+_CONTEXT_GROUPS = [_TRIGGER_SCAN.groupindex[f"c{i}"] for i in range(len(TRIGGER_CONTEXT))]
+_BACKGROUND_GROUP = _TRIGGER_SCAN.groupindex["background"]
+_MENTION_GROUP = _TRIGGER_SCAN.groupindex["mention"]
 
 
-def _pick_simple(kind: str) -> str:
+@lru_cache(maxsize=256)
+def classify_message(text: str) -> MessageTriggers:
+    """
+    Один проход по тексту вместо TRIGGER_CONTEXT по очереди + BACKGROUND_TRIGGER + mention.
+    Кэш по тексту: хендлер, pasha_reply_* и synthesize_reaction в рамках одного
+    апдейта спрашивают про одно и то же сообщение — сканируем его один раз.
+    """
+    lower = text.lower()
+    best = len(TRIGGER_CONTEXT)
+    background = mentioned = False
+    may_mention = "@" in lower
+    for match in _TRIGGER_SCAN.finditer(lower):
+        for i in range(best):
+            if match.start(_CONTEXT_GROUPS[i]) >= 0:
+                best = i
+                break
+        background = background or match.start(_BACKGROUND_GROUP) >= 0
+        mentioned = mentioned or match.start(_MENTION_GROUP) >= 0
+        # лучше уже не будет — дальше не сканируем
+        if best == 0 and background and (mentioned or not may_mention):
+            break
+    context = TRIGGER_CONTEXT[best][1] if best < len(TRIGGER_CONTEXT) else "generic"
+    return MessageTriggers(context, background, mentioned)
+
+
+# --- Компилируемые таблицы реакций ---
+# Шаблоны ниже описывают не случайный выбор, а распределение исходов
+# (фраза → вероятность). compile_tables() раскрывает их при импорте,
+# отсеивает невалидные фразы, и синтез — один random.choices по готовым
+# кумулятивным весам вместо сборки лямбд и повторных проверок регулярками.
+Dist = dict[str, float]
+
+CAP_CHANCE = 0.45  # Паша часто пишет «Да», «Ага», «Спасибо» с заглавной
+
+
+def _uniform(pool: list[str]) -> Dist:
+    dist: Dist = {}
+    for item in pool:
+        dist[item] = dist.get(item, 0.0) + 1 / len(pool)
+    return dist
+
+
+def _capped(dist: Dist, max_len: Optional[int] = None) -> Dist:
+    """Однословные фразы с вероятностью CAP_CHANCE — с заглавной буквы."""
+    out: Dist = {}
+    for word, p in dist.items():
+        if word.islower() and word.isalpha() and (max_len is None or len(word) < max_len):
+            upper = word[0].upper() + word[1:]
+            out[word] = out.get(word, 0.0) + p * (1 - CAP_CHANCE)
+            out[upper] = out.get(upper, 0.0) + p * CAP_CHANCE
+        else:
+            out[word] = out.get(word, 0.0) + p
+    return out
+
+
+def _mix(parts: list[tuple[float, Dist]]) -> Dist:
+    """Смесь распределений с весами (веса не обязаны давать в сумме 1)."""
+    total = sum(weight for weight, _ in parts)
+    out: Dist = {}
+    for weight, dist in parts:
+        for item, p in dist.items():
+            out[item] = out.get(item, 0.0) + p * weight / total
+    return out
+
+
+def _even(*dists: Dist) -> Dist:
+    """Равновероятный выбор шаблона — как random.choice(templates)()."""
+    return _mix([(1.0, dist) for dist in dists])
+
+
+def _join(fmt: str, *dists: Dist) -> Dist:
+    """Склейка независимых блоков по шаблону: _join("{}, {}", lead, eval)."""
+    out: Dist = {}
+    for combo in product(*(dist.items() for dist in dists)):
+        item = fmt.format(*(word for word, _ in combo))
+        p = 1.0
+        for _, part in combo:
+            p *= part
+        out[item] = out.get(item, 0.0) + p
+    return out
+
+
+def _simple(kind: str) -> Dist:
     pools = {"affirm": AFFIRM_SIMPLE, "eval": EVAL_SIMPLE, "lead": LEAD}
-    return _maybe_cap(random.choice(pools[kind]))
+    return _capped(_uniform(pools[kind]))
 
 
-def _block_for(kind: str) -> str:
+def _block(kind: str) -> Dist:
     pools = {
         "affirm": AFFIRM,
         "eval": EVAL,
@@ -296,109 +416,240 @@ def _block_for(kind: str) -> str:
         "thoughtful": THOUGHTFUL,
         "provocative": PROVOCATIVE + PROVOCATIVE_TEASE,
     }
-    pool = pools[kind]
-    item = random.choice(pool)
     # одиночные слова — иногда с заглавной
-    if " " not in item and "," not in item and len(item) < 12:
-        return _maybe_cap(item)
-    return item
+    return _capped(_uniform(pools[kind]), max_len=12)
 
 
-def _weighted_kind(context: str) -> str:
+def _weighted_block(context: str) -> Dist:
     weights = CONTEXT_WEIGHTS.get(context, CONTEXT_WEIGHTS["generic"])
-    kinds = list(weights.keys())
-    w = [weights[k] for k in kinds]
-    return random.choices(kinds, weights=w, k=1)[0]
+    return _mix([(weight, _block(kind)) for kind, weight in weights.items()])
 
 
-def _synthesize_thoughtful() -> str:
+def _thoughtful_dist() -> Dist:
     """Задумчивая реакция — для синка, захода, «го»."""
-    templates = [
-        lambda: random.choice(THOUGHTFUL),
-        lambda: random.choice(THOUGHTFUL_COMPOUND),
-        lambda: f"{random.choice(THOUGHTFUL_LEAD)} {random.choice(THOUGHTFUL_TAIL)}",
-        lambda: f"вроде {random.choice(THOUGHTFUL_TAIL)}",
-        lambda: f"чет {random.choice(['хз', 'ну', 'такое', 'странно'])}",
-        lambda: f"ну, {random.choice(['хз', 'такое', 'интересно', 'сложно'])}",
-        lambda: _maybe_cap(random.choice(["хз", "ну", "ого", "lf"])),
-    ]
-    return random.choice(templates)()
-
-
-def _synthesize_one(context: str = "generic") -> str:
-    """Собрать одну реакцию из блоков в стиле Паши."""
+    return _even(
+        _uniform(THOUGHTFUL),
+        _uniform(THOUGHTFUL_COMPOUND),
+        _join("{} {}", _uniform(THOUGHTFUL_LEAD), _uniform(THOUGHTFUL_TAIL)),
+        _join("вроде {}", _uniform(THOUGHTFUL_TAIL)),
+        _join("чет {}", _uniform(["хз", "ну", "такое", "странно"])),
+        _join("ну, {}", _uniform(["хз", "такое", "интересно", "сложно"])),
+        _capped(_uniform(["хз", "ну", "ого", "lf"])),
+    )
+
+
+def _short_dist(context: str) -> Dist:
+    """Короткие реакции в стиле Паши для контекста — распределение исходов."""
     if context in ("sync", "go"):
-        return _synthesize_thoughtful()
+        return _thoughtful_dist()
 
     if context in ("delivered", "mail", "design", "task"):
-        templates = [
-            lambda: random.choice(["Спасибо", "спасибо", "да", "Да", "Ага", "гуд", "супер", "спс"]),
-            lambda: random.choice(["супер, спасибо", "гуд, спасибо", "отлично, спасибо", "ага, спасибо"]),
-            lambda: _block_for("thanks"),
-            lambda: _block_for("affirm"),
-            lambda: _block_for("eval"),
-            lambda: random.choice(DELIVERED_ANCHORS),
-        ]
-        return random.choice(templates)()
+        return _even(
+            _uniform(["Спасибо", "спасибо", "да", "Да", "Ага", "гуд", "супер", "спс"]),
+            _uniform(["супер, спасибо", "гуд, спасибо", "отлично, спасибо", "ага, спасибо"]),
+            _block("thanks"),
+            _block("affirm"),
+            _block("eval"),
+            _uniform(DELIVERED_ANCHORS),
+        )
 
     if context == "problem":
-        templates = [
-            lambda: random.choice(["да бля", "блэт", "лол", "ого", "блин", "да.", "lf", "ахах"]),
-            lambda: random.choice(["не, так хуже", "все серьезно", "нуу неее", "договор", "ну такое"]),
-            lambda: random.choice(PROVOCATIVE_COMPOUND),
-            lambda: f"ну, {_block_for('provocative')}",
-            lambda: _block_for("provocative"),
-            lambda: _block_for("emphasis"),
-        ]
-        return random.choice(templates)()
-
-    roll = random.random()
-
-    # 35% — готовая якорная фраза из данных
-    if roll < 0.35:
-        return random.choice(ANCHORS)
+        return _even(
+            _uniform(["да бля", "блэт", "лол", "ого", "блин", "да.", "lf", "ахах"]),
+            _uniform(["не, так хуже", "все серьезно", "нуу неее", "договор", "ну такое"]),
+            _uniform(PROVOCATIVE_COMPOUND),
+            _join("ну, {}", _block("provocative")),
+            _block("provocative"),
+            _block("emphasis"),
+        )
 
     # шаблоны синтеза
     templates = [
-        lambda: _block_for(_weighted_kind(context)),
-        lambda: random.choice(COMPOUND),
-        lambda: random.choice(PROVOCATIVE_COMPOUND),
-        lambda: f"{_block_for('provocative')}, {_pick_simple('eval')}",
-        lambda: f"ну, {_block_for('provocative')}",
-        lambda: f"{_pick_simple('lead')}, {_pick_simple('eval')}",
-        lambda: f"{_pick_simple('lead')} {_pick_simple('affirm')}",
-        lambda: f"{_pick_simple('affirm')} {_pick_simple('eval')}",
-        lambda: _block_for("thanks"),
-        lambda: _pick_simple("eval") + "!",
-        lambda: _block_for("emphasis"),
-        lambda: _block_for("social"),
-        lambda: _block_for("provocative"),
+        _weighted_block(context),
+        _uniform(COMPOUND),
+        _uniform(PROVOCATIVE_COMPOUND),
+        _join("{}, {}", _block("provocative"), _simple("eval")),
+        _join("ну, {}", _block("provocative")),
+        _join("{}, {}", _simple("lead"), _simple("eval")),
+        _join("{} {}", _simple("lead"), _simple("affirm")),
+        _join("{} {}", _simple("affirm"), _simple("eval")),
+        _block("thanks"),
+        _join("{}!", _simple("eval")),
+        _block("emphasis"),
+        _block("social"),
+        _block("provocative"),
     ]
 
     # контекстные шаблоны
     if context == "greeting":
-        templates.extend([
-            lambda: random.choice(["салам", "го?", "парни", "ага", "го"]),
-        ])
+        templates.append(_uniform(["салам", "го?", "парни", "ага", "го"]))
     elif context == "thanks":
-        templates.extend([
-            lambda: random.choice(["граци рагаци", "красавчики", "мазлтов!", "супер, спасибо", "лавли"]),
-            lambda: random.choice(PROVOCATIVE_TEASE),
-        ])
+        templates.append(_uniform(["граци рагаци", "красавчики", "мазлтов!", "супер, спасибо", "лавли"]))
+        templates.append(_uniform(PROVOCATIVE_TEASE))
     elif context == "approve":
-        templates.extend([
-            lambda: random.choice(["стопроц", "апрувед", "гуд", "супер", "каеф", "збс", "классика", "экзактли"]),
-        ])
+        templates.append(_uniform(["стопроц", "апрувед", "гуд", "супер", "каеф", "збс", "классика", "экзактли"]))
     elif context == "video":
-        templates.extend([
-            lambda: random.choice(["блэт", "каеф", "ого", "лол", "ахах", "гуд", "классика", "лавли"]),
-        ])
+        templates.append(_uniform(["блэт", "каеф", "ого", "лол", "ахах", "гуд", "классика", "лавли"]))
 
-    result = random.choice(templates)()
-    result = re.sub(r"\s+", " ", result).strip()
-    return result
+    # 35% — готовая якорная фраза из данных
+    return _mix([(0.35, _uniform(ANCHORS)), (0.65, _even(*templates))])
+
+
+def _compile_short(
+    context: str,
+    is_valid: Optional[Callable[..., bool]] = None,
+) -> tuple[tuple[str, ...], list[float]]:
+    """Валидные короткие фразы контекста и кумулятивные веса для random.choices."""
+    is_valid = is_valid or _is_valid_reply
+    values: list[str] = []
+    cum_weights: list[float] = []
+    total = 0.0
+    for item, p in _short_dist(context).items():
+        item = re.sub(r"\s+", " ", item).strip()
+        if not is_valid(item, MAX_SHORT_LEN):
+            continue
+        total += p
+        values.append(item)
+        cum_weights.append(total)
+    return tuple(values), cum_weights
+
+
+def _compile_long(
+    context: str,
+    username: Optional[str] = None,
+    is_valid: Optional[Callable[..., bool]] = None,
+) -> tuple[str, ...]:
+    """Длинные реплики контекста (и цитаты адресата), уже прошедшие валидацию."""
+    is_valid = is_valid or _is_valid_reply
+    own = PROVOCATIVE_LONG.get(context, [])
+    if username and username in TEAM_PERSONALIZATION:
+        own = own + TEAM_PERSONALIZATION[username].get("long", [])
+    if context in ("delivered", "mail", "task", "thanks"):
+        pool = own
+    else:
+        pool = own + PROVOCATIVE_LONG.get("generic", [])
+    return tuple(p for p in pool if is_valid(p, MAX_LONG_LEN, bool(username)))
+
+
+# context → (фразы, кумулятивные веса); (context, username) → длинные реплики;
+# username → личные цитаты из TEAM_PERSONALIZATION["long"]
+_SHORT_TABLES: dict[str, tuple[tuple[str, ...], list[float]]] = {}
+_LONG_TABLES: dict[tuple[str, Optional[str]], tuple[str, ...]] = {}
+_PERSONAL_LONG: dict[str, tuple[str, ...]] = {}
+
+
+def compile_tables() -> None:
+    """Пересобрать таблицы реакций. При импорте вызывается сама; нужна после правки словарей на лету."""
+    # одни и те же фразы встречаются во многих контекстах — проверяем каждую один раз
+    is_valid = lru_cache(maxsize=None)(_is_valid_reply)
+    _SHORT_TABLES.clear()
+    _LONG_TABLES.clear()
+    _PERSONAL_LONG.clear()
+    for context in CONTEXT_WEIGHTS:
+        _SHORT_TABLES[context] = _compile_short(context, is_valid)
+        _LONG_TABLES[(context, None)] = _compile_long(context, None, is_valid)
+    for username in TEAM_PERSONALIZATION:
+        _compile_member(username, is_valid)
+
+
+def _compile_member(username: str, is_valid: Optional[Callable[..., bool]] = None) -> None:
+    """Таблицы одного участника — при смене ростера пересобираются только они."""
+    is_valid = is_valid or _is_valid_reply
+    for key in [key for key in _LONG_TABLES if key[1] == username]:
+        del _LONG_TABLES[key]
+    profile = TEAM_PERSONALIZATION.get(username)
+    if profile is None:
+        _PERSONAL_LONG.pop(username, None)
+        return
+    _PERSONAL_LONG[username] = tuple(
+        p for p in profile.get("long", [])
+        if is_valid(p, MAX_LONG_LEN, True)
+    )
+    for context in CONTEXT_WEIGHTS:
+        _LONG_TABLES[(context, username)] = _compile_long(context, username, is_valid)
+
+
+def _synthesize_one(context: str = "generic") -> Optional[str]:
+    """Одна короткая реакция из скомпилированной таблицы; None — валидных фраз нет."""
+    values, cum_weights = _SHORT_TABLES.get(context) or _SHORT_TABLES["generic"]
+    if not values:
+        return None
+    return random.choices(values, cum_weights=cum_weights)[0]
 
 
+def _compile_team_mention(usernames) -> Optional[re.Pattern]:
+    """Все @username команды одной регуляркой."""
+    if not usernames:
+        return None
+    alternation = "|".join(re.escape(user) for user in sorted(usernames, key=lambda u: (-len(u), u)))
+    return re.compile(rf"@({alternation})\b", re.I)
+
+
+_TEAM_MENTION = _compile_team_mention(TEAM_USERNAMES)
+_roster_mtime: Optional[float] = None
+
+
+def _read_roster(path: str) -> Optional[dict[str, dict[str, list[str]]]]:
+    """Ростер из JSON; None — файл битый (тогда оставляем текущий состав)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ Не удалось прочитать ростер команды %s: %s", path, e)
+        return None
+    if not isinstance(raw, dict):
+        log.warning("⚠️ Ростер команды %s: ожидался объект username → профиль", path)
+        return None
+    roster: dict[str, dict[str, list[str]]] = {}
+    for user, profile in raw.items():
+        if not isinstance(profile, dict):
+            continue
+        roster[str(user).lower().lstrip("@")] = {
+            key: [str(item) for item in profile.get(key) or []]
+            for key in ("names", "long")
+        }
+    return roster
+
+
+def apply_team_roster(roster: dict[str, dict[str, list[str]]]) -> set[str]:
+    """
+    Наложить ростер на встроенный состав. Пересобираются таблицы только
+    изменившихся участников, матчер @username — только если поменялся состав.
+    Возвращает username добавленных, изменённых и удалённых.
+    """
+    global TEAM_USERNAMES, _TEAM_MENTION
+    desired = {**_BUILTIN_TEAM, **roster}
+    changed = {user for user, profile in desired.items() if TEAM_PERSONALIZATION.get(user) != profile}
+    removed = set(TEAM_PERSONALIZATION) - set(desired)
+    for user in removed:
+        del TEAM_PERSONALIZATION[user]
+    for user in changed:
+        TEAM_PERSONALIZATION[user] = desired[user]
+    for user in changed | removed:
+        _compile_member(user)
+    if frozenset(TEAM_PERSONALIZATION) != TEAM_USERNAMES:
+        TEAM_USERNAMES = frozenset(TEAM_PERSONALIZATION)
+        _TEAM_MENTION = _compile_team_mention(TEAM_USERNAMES)
+    return changed | removed
+
+
+def reload_team_roster(force: bool = False) -> bool:
+    """Перечитать TEAM_ROSTER_FILE, если он поменялся. True — состав команды изменился."""
+    global _roster_mtime
+    try:
+        mtime = os.path.getmtime(TEAM_ROSTER_FILE)
+    except OSError:
+        mtime = None
+    if mtime == _roster_mtime and not force:
+        return False
+    roster = _read_roster(TEAM_ROSTER_FILE) if mtime is not None else {}
+    if roster is None:
+        return False
+    _roster_mtime = mtime
+    touched = apply_team_roster(roster)
+    if touched:
+        log.info("👥 Ростер команды: %s чел., обновлены: %s", len(TEAM_PERSONALIZATION), ', '.join(sorted(touched)))
+    return bool(touched)
 
 
 def resolve_target_username(
@@ -410,10 +661,10 @@ def resolve_target_username(
         user = sender_username.lower().lstrip("@")
         if user in TEAM_USERNAMES:
             return user
-    if text:
-        for user in TEAM_USERNAMES:
-            if re.search(rf"@{re.escape(user)}\b", text, re.I):
-                return user
+    if text and _TEAM_MENTION is not None and "@" in text:
+        match = _TEAM_MENTION.search(text)
+        if match:
+            return match.group(1).lower()
     return None
 
 
@@ -442,12 +693,9 @@ def _apply_personalization(reply: str, username: Optional[str]) -> str:
     if names and _starts_with_name(reply, names):
         return reply
     roll = random.random()
-    long_pool = profile.get("long", [])
+    long_pool = _PERSONAL_LONG.get(username)
     if long_pool and roll < PERSONALIZE_LONG_CHANCE:
-        for _ in range(5):
-            pick = random.choice(long_pool)
-            if _is_valid_reply(pick, MAX_LONG_LEN, allow_team_mention=True):
-                return pick
+        return random.choice(long_pool)
     if names and roll < PERSONALIZE_LONG_CHANCE + PERSONALIZE_NAME_CHANCE:
         name = random.choice(names)
         tail = reply
@@ -459,17 +707,6 @@ def _apply_personalization(reply: str, username: Optional[str]) -> str:
     return reply
 
 
-def _long_pool_for(context: str, username: Optional[str] = None) -> list[str]:
-    own = list(PROVOCATIVE_LONG.get(context, []))
-    if username and username in TEAM_PERSONALIZATION:
-        own = own + TEAM_PERSONALIZATION[username].get("long", [])
-    if context in ("delivered", "mail", "task", "thanks"):
-        return own
-    if own:
-        return own + PROVOCATIVE_LONG.get("generic", [])
-    return list(PROVOCATIVE_LONG.get("generic", []))
-
-
 def _long_reply_chance(context: str) -> float:
     if context in ("problem", "design"):
         return 0.38
@@ -483,18 +720,16 @@ def _long_reply_chance(context: str) -> float:
 
 
 def _pick_long_reaction(context: str, username: Optional[str] = None) -> Optional[str]:
-    pool = _long_pool_for(context, username)
-    if not pool:
-        return None
-    return random.choice(pool)
+    pool = _LONG_TABLES.get((context, username))
+    if pool is None:
+        pool = _LONG_TABLES[(context, username)] = _compile_long(context, username)
+    return random.choice(pool) if pool else None
+
 
 def _detect_context(text: Optional[str]) -> str:
     if not text:
         return "generic"
-    for pattern, ctx in TRIGGER_CONTEXT:
-        if pattern.search(text):
-            return ctx
-    return "generic"
+    return classify_message(text).context
 
 
 def synthesize_reaction(
@@ -504,21 +739,18 @@ def synthesize_reaction(
 ) -> str:
     """
     Синтезировать реакцию в стиле Паши.
-    Генерирует несколько вариантов и выбирает валидный.
+    Фразы берутся из таблиц compile_tables() — они уже провалидированы,
+    так что перебор кандидатов не нужен; n_candidates оставлен для совместимости.
     """
     target = resolve_target_username(username, text)
     context = _detect_context(text)
     if random.random() < _long_reply_chance(context):
-        for _ in range(n_candidates * 3):
-            candidate = _pick_long_reaction(context, target)
-            if candidate and _is_valid_reply(candidate, MAX_LONG_LEN, allow_team_mention=bool(target)):
-                return _apply_personalization(candidate, target)
-
-    for _ in range(n_candidates * 2):
-        candidate = _synthesize_one(context)
-        if _is_valid_reply(candidate, MAX_SHORT_LEN):
+        candidate = _pick_long_reaction(context, target)
+        if candidate:
             return _apply_personalization(candidate, target)
-    return _apply_personalization(random.choice(ANCHORS), target)
+
+    candidate = _synthesize_one(context)
+    return _apply_personalization(candidate or random.choice(ANCHORS), target)
 
 
 def generate_pasha_response(
@@ -538,14 +770,14 @@ def generate_pasha_response(
 
 
 def pasha_reply_to_message(message_text: str, username: Optional[str] = None) -> Optional[str]:
-    text = message_text.strip()
-    lower = text.lower()
+    triggers = classify_message(message_text)
 
-    if BOT_MENTION.lower() in lower or re.search(r"@ag_slashbot|@\w*slashbot", lower, re.I):
+    if triggers.mentioned:
+        text = message_text.strip()
         return synthesize_reaction(strip_bot_mention(text) or text, username=username)
 
-    if BACKGROUND_TRIGGER.search(text):
-        return synthesize_reaction(text, username=username)
+    if triggers.background:
+        return synthesize_reaction(message_text, username=username)
 
     return None
 
@@ -579,3 +811,7 @@ def sample_synthetic(count: int = 20, context: Optional[str] = None) -> list[str
         "problem": "баг в верстке",
     }.get(ctx, "")
     return [synthesize_reaction(fake_text or None) for _ in range(count)]
+
+
+compile_tables()
+reload_team_roster()
@@ -0,0 +1,206 @@
+"""
+Фоновая запись файлов состояния (bot_users.json, bot_settings.json, meme_state.*).
+
+Хендлеры на event loop только ставят снапшот в очередь, диск трогает один
+поток-писатель. Повторные записи одного файла схлопываются: пишется только
+последний снапшот. Журналы (append) дописываются в порядке поступления.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+WRITE_SECONDS = metrics.histogram(
+    "slashbot_persist_write_seconds",
+    "Запись файла потоком persistence: json — снапшот (сериализация + os.replace), lines — дозапись журнала.",
+    ("kind",),
+)
+
+
+class StateWriter:
+    """Один поток, который пишет файлы; очередь — «грязные» пути с последним снапшотом."""
+
+    def __init__(self, name: str = "slashbot-state-writer") -> None:
+        self._name = name
+        self._cond = threading.Condition()
+        # path -> (payload, indent, журнал для обнуления после записи, строки журнала под снапшотом,
+        #          колбэки после успешной записи)
+        self._pending_json: dict[str, tuple[object, Optional[int], Optional[str], list[str], list[Callable[[], None]]]] = {}
+        self._pending_lines: dict[str, list[str]] = {}
+        self._handles: dict[str, object] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._busy = False
+
+    def write_json(
+        self,
+        path: str,
+        payload: object,
+        *,
+        indent: Optional[int] = 2,
+        truncate: Optional[str] = None,
+        on_written: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Атомарно заменить файл JSON-снапшотом (tmp + os.replace).
+        truncate — журнал, который обнуляется после успешной записи снапшота
+        и до дозаписи строк, пришедших вместе с ним.
+        on_written — вызывается в потоке-писателе, когда файл уже на диске.
+        """
+        with self._cond:
+            previous = self._pending_json.get(path)
+            covered: list[str] = []
+            callbacks: list[Callable[[], None]] = []
+            if previous is not None:
+                truncate = truncate or previous[2]
+                covered = previous[3]
+                callbacks = previous[4]
+            if truncate:
+                # Строки, поставленные до снапшота, уже в нём — пишем их в журнал,
+                # только если сам снапшот записать не удалось.
+                covered = covered + self._pending_lines.pop(truncate, [])
+            if on_written is not None:
+                callbacks = callbacks + [on_written]
+            self._pending_json[path] = (payload, indent, truncate, covered, callbacks)
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def append_line(self, path: str, line: str) -> None:
+        """Дописать строку в файл (журнал). Порядок строк сохраняется."""
+        with self._cond:
+            self._pending_lines.setdefault(path, []).append(line)
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Дождаться, пока всё поставленное в очередь окажется на диске."""
+        with self._cond:
+            if self._thread is None:
+                return True
+            return self._cond.wait_for(
+                lambda: not self._busy and not self._pending_json and not self._pending_lines,
+                timeout=timeout,
+            )
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending_json or self._pending_lines)
+                json_batch = self._pending_json
+                line_batch = self._pending_lines
+                self._pending_json = {}
+                self._pending_lines = {}
+                self._busy = True
+            try:
+                self._write_batch(json_batch, line_batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write_batch(
+        self,
+        json_batch: dict[str, tuple[object, Optional[int], Optional[str], list[str], list[Callable[[], None]]]],
+        line_batch: dict[str, list[str]],
+    ) -> None:
+        # Порядок важен: снапшот → обнуление журнала → новые строки журнала.
+        for path, (payload, indent, truncate, covered, callbacks) in json_batch.items():
+            with WRITE_SECONDS.time("json"):
+                written = self._replace_json(path, payload, indent)
+            if written and truncate:
+                self._truncate(truncate)
+            elif truncate and covered:
+                self._append(truncate, covered)
+            if written:
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as exc:
+                        log.warning("⚠️ Колбэк после записи %s упал: %s", os.path.basename(path), exc)
+        for path, lines in line_batch.items():
+            with WRITE_SECONDS.time("lines"):
+                self._append(path, lines)
+
+    def _replace_json(self, path: str, payload: object, indent: Optional[int]) -> bool:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, ensure_ascii=False, indent=indent)
+            os.replace(tmp_path, path)
+            return True
+        except (OSError, TypeError, ValueError) as exc:
+            log.warning("⚠️ Не удалось сохранить %s: %s", os.path.basename(path), exc)
+            return False
+
+    def _truncate(self, path: str) -> None:
+        self._close_handle(path)
+        try:
+            with open(path, "w", encoding="utf-8"):
+                pass
+        except OSError as exc:
+            log.warning("⚠️ Не удалось обнулить %s: %s", os.path.basename(path), exc)
+
+    def _append(self, path: str, lines: list[str]) -> None:
+        try:
+            handle = self._handles.get(path)
+            if handle is None:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                handle = open(path, "a", encoding="utf-8")
+                self._handles[path] = handle
+            handle.write("".join(line + "\n" for line in lines))
+            handle.flush()
+        except OSError as exc:
+            self._close_handle(path)
+            log.warning("⚠️ Не удалось дописать %s: %s", os.path.basename(path), exc)
+
+    def _close_handle(self, path: str) -> None:
+        handle = self._handles.pop(path, None)
+        if handle is None:
+            return
+        try:
+            handle.close()
+        except OSError:
+            pass
+
+
+_writer = StateWriter()
+
+
+def write_json(
+    path: str,
+    payload: object,
+    *,
+    indent: Optional[int] = 2,
+    truncate: Optional[str] = None,
+    on_written: Optional[Callable[[], None]] = None,
+) -> None:
+    _writer.write_json(path, payload, indent=indent, truncate=truncate, on_written=on_written)
+
+
+def append_line(path: str, line: str) -> None:
+    _writer.append_line(path, line)
+
+
+def flush_pending_writes(timeout: Optional[float] = 10.0) -> bool:
+    """Для shutdown и тестов: True — очередь записи пуста."""
+    flushed = _writer.flush(timeout=timeout)
+    if not flushed:
+        log.warning("⚠️ Не все файлы состояния успели записаться на диск")
+    return flushed
+
+
+atexit.register(flush_pending_writes)
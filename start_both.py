@@ -2,13 +2,17 @@
 """
 Запуск бота и веб-панели в одном процессе.
 Общий рабочий каталог — один bot_users.json: чаты, в которых активировали бота,
-сразу появляются в веб-интерфейсе без ручного добавления.
+сразу появляются в веб-интерфейсе без ручного добавления. Панель крутится
+на event loop бота (см. bot.start_web_server).
 """
+import logging
 import os
-import threading
-import time
 
 from app_data import acquire_bot_lock, ensure_data_dir, resolve_data_dir
+from app_logging import setup_logging
+
+setup_logging()
+log = logging.getLogger("start_both")
 
 _ROOT = os.path.dirname(os.path.abspath(__file__))
 _DATA_DIR = resolve_data_dir(_ROOT)
@@ -16,26 +20,18 @@ ensure_data_dir(_DATA_DIR)
 os.environ["SLASHBOT_DATA_DIR"] = _DATA_DIR
 os.chdir(_ROOT)
 _users_file = os.path.join(_DATA_DIR, "bot_users.json")
-print(f"[start_both] Данные: {_DATA_DIR}", flush=True)
-print(f"[start_both] bot_users.json: {_users_file}", flush=True)
+log.info("[start_both] Данные: %s", _DATA_DIR)
+log.info("[start_both] bot_users.json: %s", _users_file)
 
 acquire_bot_lock(_DATA_DIR)
 
 
-def run_web(port: int) -> None:
-    import web_app
-    print(f"🌐 Веб-панель: http://0.0.0.0:{port}", flush=True)
-    web_app.app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
-
-
 def main():
     port = int(os.environ.get('PORT', 5001))
-    # Flask в фоне — Railway healthcheck на PORT; бот в главном потоке (run_polling + сигналы)
-    web_thread = threading.Thread(target=run_web, args=(port,), daemon=True)
-    web_thread.start()
-    time.sleep(1)
+    # Веб-панель (ASGI, Hypercorn) слушает PORT на event loop бота ещё до initialize() —
+    # Railway healthcheck отвечает, даже пока Telegram недоступен; маршруты используют application.bot
     import bot
-    bot.main()
+    bot.main(web_port=port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+import unittest
+
+import app_logging
+
+
+class JsonFormatterTests(unittest.TestCase):
+    def test_record_fields_and_extra(self):
+        record = logging.LogRecord("bot", logging.WARNING, __file__, 1, "чат %s", (42,), None)
+        record.chat_id = 42
+
+        payload = json.loads(app_logging.JsonFormatter().format(record))
+
+        self.assertEqual(payload["level"], "WARNING")
+        self.assertEqual(payload["logger"], "bot")
+        self.assertEqual(payload["msg"], "чат 42")
+        self.assertEqual(payload["chat_id"], 42)
+        self.assertIn("ts", payload)
+
+
+class SampleFilterTests(unittest.TestCase):
+    def _record(self, sample=None):
+        record = logging.LogRecord("bot", logging.INFO, __file__, 1, "msg", (), None)
+        if sample is not None:
+            record.sample = sample
+        return record
+
+    def test_every_nth_per_key_and_unsampled_pass(self):
+        sampler = app_logging.SampleFilter(3)
+
+        passed = [sampler.filter(self._record("incoming")) for _ in range(7)]
+        self.assertEqual(passed, [True, False, False, True, False, False, True])
+        self.assertTrue(sampler.filter(self._record("cooldown")))
+        self.assertTrue(all(sampler.filter(self._record()) for _ in range(5)))
+
+
+class SetupLoggingTests(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        saved = (list(root.handlers), root.level)
+
+        def restore():
+            app_logging.shutdown_logging()
+            root.handlers[:] = saved[0]
+            root.setLevel(saved[1])
+
+        self.addCleanup(restore)
+
+    def test_records_reach_stream_through_listener(self):
+        stream = io.StringIO()
+        app_logging.setup_logging("INFO", "json", stream=stream, sample_every=2)
+        log = logging.getLogger("bot")
+
+        log.debug("не видно")
+        for n in range(4):
+            log.info("📨 %s", n, extra={"sample": "incoming"})
+        app_logging.shutdown_logging()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line["msg"] for line in lines], ["📨 0", "📨 2"])
+        self.assertEqual(lines[0]["sample_every"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import telegram.error
+
+import bot
+import web_app
+
+
+class FakeUpdater:
+    def __init__(self, events):
+        self.events = events
+        self.running = False
+        self.polling = asyncio.Event()
+
+    async def start_polling(self, **kwargs):
+        self.events.append("polling")
+        self.running = True
+        self.polling.set()
+
+    async def stop(self):
+        self.events.append("updater_stop")
+        self.running = False
+
+
+class FakeApplication:
+    def __init__(self, events, failures=()):
+        self.events = events
+        self.failures = list(failures)
+        self.updater = FakeUpdater(events)
+        self.post_init = None
+        self.post_shutdown = None
+
+    async def initialize(self):
+        self.events.append("initialize")
+        if self.failures:
+            raise self.failures.pop(0)
+
+    async def start(self):
+        self.events.append("start")
+
+    async def stop(self):
+        self.events.append("stop")
+
+    async def shutdown(self):
+        self.events.append("shutdown")
+
+
+class RunApplicationTests(unittest.TestCase):
+    def test_web_panel_listens_before_telegram_answers_and_through_retries(self):
+        events = []
+        application = FakeApplication(events, [telegram.error.NetworkError("api.telegram.org недоступен")])
+
+        async def start_web(port):
+            events.append(f"web:{port}")
+
+        async def stop_web():
+            events.append("web_stop")
+
+        async def run():
+            task = asyncio.create_task(bot.run_application(application, 8080))
+            await asyncio.wait_for(application.updater.polling.wait(), timeout=1)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        with patch.object(bot, "start_web_server", side_effect=start_web), \
+                patch.object(bot, "stop_web_server", side_effect=stop_web), \
+                patch.object(bot.bot_runtime, "BOT_MODE", "polling"), \
+                patch.object(bot.asyncio, "sleep", AsyncMock()), \
+                self.assertLogs("bot", "WARNING"):
+            asyncio.run(run())
+
+        self.assertEqual(events, [
+            "web:8080", "initialize", "shutdown",
+            "initialize", "start", "polling", "updater_stop", "stop", "shutdown",
+            "web_stop",
+        ])
+
+    def test_start_web_server_binds_once(self):
+        async def fake_serve(port, shutdown_trigger=None):
+            await shutdown_trigger()
+
+        async def run():
+            await bot.start_web_server(8080)
+            await bot.start_web_server(8080)
+            await bot.stop_web_server()
+
+        with patch.object(web_app, "serve", side_effect=fake_serve) as serve, self.assertLogs("bot", "INFO"):
+            asyncio.run(run())
+
+        self.assertEqual(serve.call_count, 1)
+
+
+class MainStartupChecksTests(unittest.TestCase):
+    def test_webhook_mode_without_web_server_refuses_to_start(self):
+        with patch.object(bot, "BOT_TOKEN", "123456:TEST"), \
+                patch.object(bot, "setup_logging"), \
+                patch.object(bot, "load_settings") as load_settings, \
+                patch.object(bot.bot_runtime, "BOT_MODE", "webhook"), \
+                patch.object(bot.bot_runtime, "WEBHOOK_SECRET", "s3cret"), \
+                self.assertLogs("bot", "ERROR"), \
+                self.assertRaises(SystemExit) as exit_info:
+            bot.main()
+
+        self.assertEqual(exit_info.exception.code, 1)
+        load_settings.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+from broadcast import Broadcaster, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, failures):
+        self.failures = {chat_id: list(errors) for chat_id, errors in failures.items()}
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(chat_id)
+
+
+class BroadcasterTests(unittest.TestCase):
+    def test_report_covers_retry_drop_and_failure(self):
+        bot = FakeBot({
+            100: [RetryAfter(0)],
+            200: [Forbidden("bot was kicked from the group chat")],
+            300: [BadRequest("Chat not found")],
+            400: [BadRequest("Message is too long")],
+            500: [TimedOut()],
+        })
+        dropped = []
+        broadcaster = Broadcaster(rate_per_sec=1000, concurrency=3, max_retries=2)
+
+        report = asyncio.run(broadcaster.send(
+            bot,
+            [100, 200, 300, 400, 500, 600],
+            "Эх, а скоро дудосинг...",
+            on_drop=lambda chat_id, reason: dropped.append(chat_id),
+        ))
+
+        self.assertCountEqual(report.sent, [100, 500, 600])
+        self.assertEqual(sorted(report.dropped), [200, 300])
+        self.assertEqual(list(report.failed), [400])
+        self.assertEqual(report.retries, 2)
+        self.assertCountEqual(dropped, [200, 300])
+
+    def test_retry_after_pauses_every_sender(self):
+        bucket = TokenBucket(rate=100.0, capacity=10.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        bucket.pause(0.5)
+        self.assertGreaterEqual(bucket.reserve(), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from chat_cache import ChatCache
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_chat(self, chat_id):
+        self.calls.append(chat_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(id=chat_id, type="supergroup", title=f"API {chat_id}")
+
+
+class ChatCacheTests(unittest.TestCase):
+    def test_remembered_chats_skip_api_and_missing_are_fetched_with_cap(self):
+        cache = ChatCache(ttl=60.0, concurrency=3)
+        cache.remember_chat(SimpleNamespace(id=7, type="private", first_name="Паша", last_name=None))
+        bot = FakeBot()
+
+        chats = asyncio.run(cache.get_many(bot, [7, *range(-10, 0)]))
+
+        self.assertEqual(chats[0], {"id": 7, "title": "Паша", "type": "private"})
+        self.assertNotIn(7, bot.calls)
+        self.assertEqual(len(bot.calls), 10)
+        self.assertLessEqual(bot.max_in_flight, 3)
+
+    def test_stale_entry_is_served_then_refreshed_in_background(self):
+        cache = ChatCache(ttl=0.0)
+        cache.remember_chat(SimpleNamespace(id=-5, type="group", title="старое"))
+        bot = FakeBot()
+
+        async def run():
+            first = await cache.get_many(bot, [-5])
+            await asyncio.sleep(0.05)
+            return first, cache.peek(-5)
+
+        first, refreshed = asyncio.run(run())
+
+        self.assertEqual(first[0]["title"], "старое")
+        self.assertEqual(refreshed["title"], "API -5")
+        self.assertEqual(bot.calls, [-5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,26 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
 import unittest
+from contextlib import ExitStack
 from unittest.mock import patch
 
+import httpx
+
 import meme_replies
+import persistence
+from llm_client import LLMBreaker, LLMClient
 
 
 class ScheduledMemeSafetyTests(unittest.TestCase):
+    def setUp(self):
+        # свой кэш: показанное без чата (chat_id=None) общее и не должно тянуться между тестами
+        patcher = patch.object(meme_replies, "_llm_cache", meme_replies._LLMMemeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_rejects_prompt_leaks_from_screenshots(self):
         leaked_replies = (
             "если ПОСЛЕОБЕДЕННЫЙ мем (15:00 МСК): полусон, макеты висят, прогресса ноль — значит мы обдудосились",
@@ -18,11 +34,11 @@ class ScheduledMemeSafetyTests(unittest.TestCase):
 
     def test_empty_history_uses_only_safe_slot_fallback(self):
         with patch.object(meme_replies, "OPENAI_API_KEY", ""):
-            reply = meme_replies._generate_scheduled_sp9_meme(
+            reply = asyncio.run(meme_replies._generate_scheduled_sp9_meme(
                 [],
                 meme_replies.SP9_SLOT_LLM_FOCUS["afternoon"],
                 meme_replies.SP9_AFTERNOON_FALLBACKS,
-            )
+            ))
 
         rendered_fallbacks = tuple(
             template.format(snippet="макет почти гуд")
@@ -34,11 +50,11 @@ class ScheduledMemeSafetyTests(unittest.TestCase):
 
     def test_history_is_used_without_mixing_in_focus(self):
         with patch.object(meme_replies, "OPENAI_API_KEY", ""):
-            reply = meme_replies._generate_scheduled_sp9_meme(
+            reply = asyncio.run(meme_replies._generate_scheduled_sp9_meme(
                 ["клиент снова попросил перекрасить все кнопки"],
                 meme_replies.SP9_SLOT_LLM_FOCUS["evening"],
                 meme_replies.SP9_EVENING_FALLBACKS,
-            )
+            ))
 
         self.assertIsNotNone(reply)
         self.assertTrue(meme_replies._is_inspiring_scheduled_meme(reply))
@@ -46,12 +62,12 @@ class ScheduledMemeSafetyTests(unittest.TestCase):
 
     def test_smaev_mode_uses_safe_parody_fallback(self):
         with patch.object(meme_replies, "OPENAI_API_KEY", ""):
-            reply = meme_replies._generate_scheduled_sp9_meme(
+            reply = asyncio.run(meme_replies._generate_scheduled_sp9_meme(
                 ["клиент добавил двадцать семь комментариев в макет"],
                 meme_replies.SMAEV_LLM_FOCUS,
                 meme_replies.SP9_EVENING_FALLBACKS,
                 prefer_smaev=True,
-            )
+            ))
 
         self.assertIsNotNone(reply)
         self.assertTrue(meme_replies._is_inspiring_scheduled_meme(reply))
@@ -104,12 +120,12 @@ class ScheduledMemeSafetyTests(unittest.TestCase):
             "_generate_meme_with_llm",
             side_effect=(bleak, inspiring),
         ) as generate:
-            reply = meme_replies._generate_meme_with_llm_retries(
+            reply = asyncio.run(meme_replies._generate_meme_with_llm_retries(
                 "",
                 [],
                 max_attempts=3,
                 validator=meme_replies._is_inspiring_scheduled_meme,
-            )
+            ))
 
         self.assertEqual(reply, inspiring)
         self.assertEqual(generate.call_count, 2)
@@ -134,5 +150,528 @@ class ScheduledMemeSafetyTests(unittest.TestCase):
         )
 
 
+class AsyncLLMClientTests(unittest.TestCase):
+    def setUp(self):
+        # свой предохранитель: таймауты этих тестов не должны открыть общий
+        patcher = patch.object(meme_replies, "get_llm_breaker", return_value=LLMBreaker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(meme_replies, "_llm_cache", meme_replies._LLMMemeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_without_temperature_over_pooled_client(self):
+        seen_payloads = []
+
+        def handler(request):
+            payload = json.loads(request.content)
+            seen_payloads.append(payload)
+            if "temperature" in payload:
+                return httpx.Response(400, json={"error": {"message": "temperature is not supported"}})
+            return httpx.Response(
+                200,
+                json={"choices": [{"message": {"content": "фигма взяла паузу, а мы нет — дожмём"}}]},
+            )
+
+        client = LLMClient(max_concurrency=1, transport=httpx.MockTransport(handler))
+
+        async def run():
+            try:
+                return await meme_replies._generate_meme_with_llm("макет почти готов", ["клиент доволен"])
+            finally:
+                await client.aclose()
+
+        with patch.object(meme_replies, "OPENAI_API_KEY", "test-key"), patch.object(
+            meme_replies, "get_llm_client", return_value=client
+        ):
+            reply = asyncio.run(run())
+
+        self.assertEqual(reply, "фигма взяла паузу, а мы нет — дожмём")
+        self.assertEqual(len(seen_payloads), 2)
+        self.assertNotIn("temperature", seen_payloads[1])
+
+    def test_timeout_cancels_request_and_returns_none(self):
+        async def handler(request):
+            await asyncio.sleep(5)
+            return httpx.Response(200, json={})
+
+        client = LLMClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            try:
+                return await meme_replies._generate_meme_with_llm("макет почти готов", [])
+            finally:
+                await client.aclose()
+
+        with patch.object(meme_replies, "OPENAI_API_KEY", "test-key"), patch.object(
+            meme_replies, "MEME_LLM_TIMEOUT_SEC", 0.05
+        ), patch.object(meme_replies, "get_llm_client", return_value=client), self.assertLogs(
+            "meme_replies", "WARNING"
+        ):
+            self.assertIsNone(asyncio.run(run()))
+
+
+class LLMBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.breaker = LLMBreaker(failures=3, cooldown=30, slow_sec=5, min_timeout=1, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures_then_lets_one_probe_through(self):
+        with self.assertLogs("llm_client", "INFO"):
+            self.breaker.record_failure("таймаут")
+            self.breaker.record_success(6.0)  # медленный ответ — тоже сбой
+            self.assertEqual(self.breaker.state, "closed")
+            self.breaker.record_failure("HTTP 503")
+            self.assertTrue(self.breaker.blocked)
+            self.assertFalse(self.breaker.allow())
+
+            self.now += 31
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record_success(0.4, probe=True)
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        with self.assertLogs("llm_client", "WARNING"):
+            for _ in range(3):
+                self.breaker.record_failure("таймаут")
+            self.now += 31
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure("таймаут", probe=True)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_only_the_probe_settles_half_open(self):
+        with self.assertLogs("llm_client", "WARNING"):
+            for _ in range(3):
+                self.breaker.record_failure("таймаут")
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+
+        # опоздавшие ответы запросов, ушедших до открытия, и проигравший хедж — не вердикт
+        self.breaker.record_failure("таймаут", censored=12.0)
+        self.breaker.record_success(0.4)
+        self.breaker.record_cancelled()
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.blocked)
+        self.assertFalse(self.breaker.allow())
+
+        with self.assertLogs("llm_client", "INFO"):
+            self.breaker.record_success(0.4, probe=True)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_timeout_follows_p95_of_recent_latencies(self):
+        self.assertEqual(self.breaker.timeout(12.0), 12.0)
+        for latency in [0.3] * 18 + [1.5, 2.0]:
+            self.breaker.record_success(latency)
+        self.assertEqual(self.breaker.timeout(12.0), 4.0)
+        self.assertEqual(self.breaker.timeout(3.0), 3.0)
+
+    def test_timeouts_widen_deadline_when_provider_slows_down(self):
+        breaker = LLMBreaker(failures=0, min_timeout=1, clock=lambda: self.now)
+        for _ in range(20):
+            breaker.record_success(0.5)
+        self.assertEqual(breaker.timeout(12.0), 1.0)
+
+        # провайдер стабильно отвечает за 4с: таймауты расширяют окно, а не режут вечно
+        for _ in range(20):
+            deadline = breaker.timeout(12.0)
+            if deadline > 4.0:
+                break
+            breaker.record_failure("таймаут", censored=deadline)
+        self.assertGreater(breaker.timeout(12.0), 4.0)
+
+    def test_probe_gets_full_ceiling_and_is_released_on_unexpected_error(self):
+        for _ in range(20):
+            self.breaker.record_success(0.3)
+        with self.assertLogs("llm_client", "WARNING"):
+            for _ in range(3):
+                self.breaker.record_failure("таймаут")
+        self.now += 31
+
+        async def broken_post(payload, timeout):
+            self.assertEqual(timeout, 12.0)
+            raise AttributeError("неожиданный ответ")
+
+        with patch.object(meme_replies, "OPENAI_API_KEY", "test-key"), patch.object(
+            meme_replies, "MEME_LLM_TIMEOUT_SEC", 12.0
+        ), patch.object(meme_replies, "get_llm_breaker", return_value=self.breaker), patch.object(
+            meme_replies, "_post_llm", side_effect=broken_post
+        ):
+            with self.assertRaises(AttributeError):
+                asyncio.run(meme_replies._generate_meme_candidates_with_llm("макет", []))
+
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+
+    def test_open_breaker_sends_straight_to_phrases(self):
+        with self.assertLogs("llm_client", "WARNING"):
+            for _ in range(3):
+                self.breaker.record_failure("таймаут")
+
+        with patch.object(meme_replies, "OPENAI_API_KEY", "test-key"), patch.object(
+            meme_replies, "get_llm_breaker", return_value=self.breaker
+        ), patch.object(meme_replies, "get_llm_client") as get_client:
+            meme = asyncio.run(meme_replies._generate_meme(
+                "залил макет в фигму", ["клиент просит логотип побольше", "созвон в 12"], prefer_llm=True
+            ))
+
+        get_client.assert_not_called()
+        self.assertTrue(meme)
+
+
+class LLMMemeCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = meme_replies._LLMMemeCache(size=2, ttl=60, clock=lambda: self.now)
+        for patcher in (
+            patch.object(meme_replies, "_llm_cache", self.cache),
+            patch.object(meme_replies, "get_llm_breaker", return_value=LLMBreaker()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeat_meme_in_quiet_chat_uses_leftover_candidates_without_request(self):
+        memes = iter(f"мем номер {index}: макет дожмём" for index in range(100))
+        requests = []
+
+        def handler(request):
+            payload = json.loads(request.content)
+            requests.append(payload)
+            return httpx.Response(200, json={"choices": [
+                {"message": {"content": next(memes)}} for _ in range(payload.get("n", 1))
+            ]})
+
+        client = LLMClient(transport=httpx.MockTransport(handler))
+        recent = ["залил макет в фигму", "клиент просит логотип побольше"]
+
+        async def run(chat_id):
+            return await meme_replies._generate_meme_with_llm_retries(
+                "созвон в 12", recent, max_attempts=3, chat_id=chat_id
+            )
+
+        async def scenario():
+            try:
+                first = [await run(1) for _ in range(3)]
+                return first, await run(2), await run(1)
+            finally:
+                await client.aclose()
+
+        with patch.object(meme_replies, "OPENAI_API_KEY", "test-key"), patch.object(
+            meme_replies, "MEME_LLM_HEDGE", 3
+        ), patch.object(meme_replies, "MEME_LLM_HEDGE_MODE", "n"), patch.object(
+            meme_replies, "get_llm_client", return_value=client
+        ), self.assertLogs("meme_replies", "INFO"):
+            first, other_chat, fourth = asyncio.run(scenario())
+
+        self.assertEqual(len(set(first)), 3)
+        self.assertEqual(other_chat, first[0])
+        self.assertNotIn(fourth, first)
+        self.assertEqual(len(requests), 2)
+
+    def test_entries_expire_and_least_recent_context_is_evicted(self):
+        for key in ("a", "b"):
+            self.cache.add(key, [f"мем {key}", None])
+        self.assertEqual(self.cache.take("a", 1), "мем a")
+        self.cache.add("c", ["мем c"])
+
+        self.assertIsNone(self.cache.take("b", 1))
+        self.assertIsNone(self.cache.take("a", 1))
+        self.assertEqual(self.cache.take("a", 2), "мем a")
+
+        self.now += 61
+        self.assertIsNone(self.cache.take("c", 1))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_callers_without_chat_do_not_repeat_cached_memes(self):
+        self.cache.add("a", ["мем 1", "мем 2"])
+
+        self.assertEqual([self.cache.take("a", None) for _ in range(3)], ["мем 1", "мем 2", None])
+        self.assertEqual(self.cache.take("a", 1), "мем 1")
+
+    def test_context_block_is_built_once_per_request(self):
+        meme = "фигма взяла паузу, а мы нет — собрались и дожмём"
+        with patch.object(meme_replies, "_llm_context_block", wraps=meme_replies._llm_context_block) as build, \
+                patch.object(meme_replies, "_generate_meme_with_llm", return_value=meme) as generate:
+            reply = asyncio.run(meme_replies._generate_meme_with_llm_retries("созвон в 12", ["залил макет"]))
+
+        self.assertEqual(reply, meme)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(generate.call_args.kwargs["context"], "Недавняя переписка в чате S:P9 works:\n- залил макет\n"
+                                                              "Сейчас в чате: созвон в 12")
+
+
+class HedgedLLMTests(unittest.TestCase):
+    def setUp(self):
+        # свой кэш: показанное без чата (chat_id=None) общее и не должно тянуться между тестами
+        patcher = patch.object(meme_replies, "_llm_cache", meme_replies._LLMMemeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_valid_candidate_wins_and_rest_are_cancelled(self):
+        inspiring = "фигма взяла паузу, а мы нет — собрались и дожмём"
+        cancelled = []
+
+        async def fake_llm(current_text, recent_texts, reply_to_text=None, *, attempts=1, focus=None, topics=None, context=None):
+            if attempts == 1:
+                await asyncio.sleep(0.01)
+                return "макеты висят, рендер мёртв"
+            if attempts == 2:
+                await asyncio.sleep(0.02)
+                return inspiring
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(attempts)
+                raise
+            return inspiring
+
+        stats_before = meme_replies.llm_hedge_stats()
+        with patch.object(meme_replies, "MEME_LLM_HEDGE", 3), patch.object(
+            meme_replies, "_generate_meme_with_llm", side_effect=fake_llm
+        ):
+            reply = asyncio.run(meme_replies._generate_meme_with_llm_retries(
+                "",
+                [],
+                max_attempts=3,
+                validator=meme_replies._is_inspiring_scheduled_meme,
+            ))
+
+        stats = meme_replies.llm_hedge_stats()
+        self.assertEqual(reply, inspiring)
+        self.assertEqual(cancelled, [3])
+        self.assertEqual(stats["candidates"] - stats_before["candidates"], 3)
+        self.assertEqual(stats["wasted"] - stats_before["wasted"], 2)
+
+    def test_n_mode_asks_for_several_completions_in_one_request(self):
+        inspiring = "фигма взяла паузу, а мы нет — собрались и дожмём"
+        with patch.object(meme_replies, "MEME_LLM_HEDGE", 3), patch.object(
+            meme_replies, "MEME_LLM_HEDGE_MODE", "n"
+        ), patch.object(
+            meme_replies,
+            "_generate_meme_candidates_with_llm",
+            return_value=[None, inspiring, "и это тоже сгодится, дожмём"],
+        ) as generate:
+            reply = asyncio.run(meme_replies._generate_meme_with_llm_retries("", [], max_attempts=3))
+
+        self.assertEqual(reply, inspiring)
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(generate.call_args.kwargs["n"], 3)
+
+
+class TokenizerTests(unittest.TestCase):
+    def test_single_pass_normalize_matches_old_regex_chain(self):
+        def old_normalize(text):
+            text = meme_replies.URL.sub("", text)
+            text = meme_replies.MENTION.sub("", text)
+            return meme_replies.re.sub(r"\s+", " ", text).strip()
+
+        samples = (
+            "  @pasha глянь   макет https://figma.com/file/x \n ну как?",
+            "t.me/sp9works и всё, типа созвон в 15",
+            "Дедлайн-правки_v2 по лендингу — в чат",
+        )
+        for text in samples:
+            with self.subTest(text=text):
+                tokens = meme_replies._tokenize(text)
+                self.assertEqual(tokens, old_normalize(text))
+                self.assertEqual(list(tokens.words), [w for w in meme_replies.WORD.findall(tokens) if len(w) > 1])
+
+    def test_history_entries_are_plain_strings_with_cached_tokens(self):
+        with patch.object(meme_replies, "_chat_history", {}), \
+                patch.object(meme_replies, "_chat_daily_history", {}), \
+                patch.object(meme_replies, "MEME_JOURNAL_ENABLED", True), \
+                patch.object(meme_replies, "_journal_append", lambda record: None):
+            meme_replies.record_chat_message(5, "@pasha клиент опять просит сделать логотип побольше")
+            entry = meme_replies._chat_history[5][-1]
+            daily_entry = meme_replies._chat_daily_history[5].last_text()
+
+        # в истории простая str (без __dict__ подкласса), одна на обе истории; разбор — из общего LRU
+        self.assertIs(type(entry), str)
+        self.assertIs(daily_entry, entry)
+        tokens = meme_replies._tokenize(entry)
+        self.assertEqual(tokens.meaningful_words, ["клиент", "опять", "просит", "сделать", "логотип", "побольше"])
+        self.assertIs(tokens.lowered[0], sys.intern("клиент"))
+        self.assertEqual(meme_replies._phrase_candidates(entry), [entry])
+        self.assertEqual(json.loads(json.dumps([entry])), [str(entry)])
+
+
+class PhraseIndexTests(unittest.TestCase):
+    def test_index_follows_daily_history_as_it_rolls_over(self):
+        texts = [f"клиент просит перекрасить кнопку номер {i} в зелёный" for i in range(8)]
+        texts.insert(3, texts[1])  # одна фраза в двух сообщениях — уходит только со вторым
+        with patch.object(meme_replies, "_chat_history", {}), \
+                patch.object(meme_replies, "_chat_daily_history", {}), \
+                patch.object(meme_replies, "_day_indexes", {}), \
+                patch.object(meme_replies, "MEME_DAILY_HISTORY_SIZE", 4), \
+                patch.object(meme_replies, "MEME_JOURNAL_ENABLED", True), \
+                patch.object(meme_replies, "_journal_append", lambda record: None):
+            for text in texts:
+                meme_replies.record_chat_message(9, text)
+                expected = meme_replies._collect_phrases(meme_replies._today_history(9))
+                self.assertCountEqual(list(meme_replies._chat_phrases(9)), expected)
+
+                self.assertEqual(
+                    meme_replies.chat_topics(9, limit=3),
+                    meme_replies._top_terms(meme_replies._today_history(9), limit=3),
+                )
+
+            pool = meme_replies._chat_phrases(9, "свежий реплай про шрифты и отступы")
+            self.assertEqual(len(pool), 5)
+            self.assertEqual(pool[0], "свежий реплай про шрифты и отступы")
+            self.assertEqual(len(meme_replies.random.sample(pool, 2)), 2)
+
+
+class DailyHistoryTests(unittest.TestCase):
+    def test_yesterday_bucket_is_dropped_whole_at_midnight(self):
+        today = meme_replies._today_ordinal()
+        yesterday = meme_replies._DailyHistory(today - 1)
+        yesterday.append(meme_replies.time.time() - 86400, "вчерашний созвон по макету")
+        with patch.object(meme_replies, "_chat_history", {}), \
+                patch.object(meme_replies, "_chat_daily_history", {3: yesterday}), \
+                patch.object(meme_replies, "_day_indexes", {}), \
+                patch.object(meme_replies, "MEME_JOURNAL_ENABLED", True), \
+                patch.object(meme_replies, "_journal_append", lambda record: None):
+            self.assertEqual(meme_replies._today_history(3), [])
+            self.assertEqual(meme_replies.roll_daily_histories(), 1)
+            self.assertNotIn(3, meme_replies._chat_daily_history)
+
+            meme_replies.record_chat_message(3, "утром клиент принёс новые правки")
+            self.assertEqual(meme_replies._chat_daily_history[3].day, today)
+            self.assertEqual(meme_replies._today_history(3), ["утром клиент принёс новые правки"])
+
+    def test_record_path_refreshes_day_bounds_after_midnight(self):
+        today = meme_replies._today_ordinal()
+        start, end, _ = meme_replies._day_bounds
+        with patch.object(meme_replies, "_day_bounds", (start - 86400, start, today - 1)), \
+                patch.object(meme_replies.dt, "datetime", wraps=meme_replies.dt.datetime) as datetime:
+            self.assertEqual(meme_replies._day_ordinal(meme_replies.time.time()), today)
+            self.assertEqual(meme_replies._day_bounds, (start, end, today))
+            calls = datetime.fromtimestamp.call_count
+            self.assertEqual(meme_replies._day_ordinal(meme_replies.time.time()), today)
+            self.assertEqual(datetime.fromtimestamp.call_count, calls)
+
+    def test_overflow_keeps_last_maxlen_records(self):
+        history = meme_replies._DailyHistory(meme_replies._today_ordinal(), maxlen=3)
+        evicted = [history.append(float(i), f"m{i}") for i in range(10)]
+
+        self.assertEqual(history.texts, ["m7", "m8", "m9"])
+        self.assertEqual(evicted[3:], [f"m{i}" for i in range(7)])
+        self.assertEqual(history.to_state(), {"ts": [7.0, 8.0, 9.0], "t": ["m7", "m8", "m9"]})
+
+
+class MemeStateJournalTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self._stack = ExitStack()
+        self.addCleanup(self._stack.close)
+        self._patch_paths(self._tmp.name)
+        self._reset_memory()
+
+    def _patch_paths(self, data_dir):
+        self._stack.enter_context(patch.object(meme_replies, "_DATA_DIR", data_dir))
+        self._stack.enter_context(
+            patch.object(meme_replies, "MEME_STATE_FILE", os.path.join(data_dir, "meme_state.json"))
+        )
+        self._stack.enter_context(
+            patch.object(meme_replies, "MEME_JOURNAL_FILE", os.path.join(data_dir, "meme_state.journal"))
+        )
+        self._stack.enter_context(patch.object(meme_replies, "MEME_JOURNAL_ENABLED", True))
+
+    def _reset_memory(self):
+        self.assertTrue(persistence.flush_pending_writes())
+        for name in ("_chat_history", "_chat_daily_history", "_last_chat_activity", "_chat_types",
+                     "_silence_nudged_activity"):
+            self._stack.enter_context(patch.object(meme_replies, name, {}))
+        self._stack.enter_context(patch.object(meme_replies, "_journal_seq", 0))
+        self._stack.enter_context(patch.object(meme_replies, "_compacted_seq", 0))
+
+    def test_messages_survive_restart_without_snapshot(self):
+        meme_replies.record_chat_message(1, "клиент попросил перекрасить кнопки")
+        meme_replies.touch_chat_activity(1, "supergroup")
+        self.assertFalse(os.path.exists(meme_replies.MEME_STATE_FILE))
+
+        self._reset_memory()
+        meme_replies.load_meme_state()
+
+        self.assertEqual(list(meme_replies._chat_history[1]), ["клиент попросил перекрасить кнопки"])
+        self.assertEqual(meme_replies._today_history(1), ["клиент попросил перекрасить кнопки"])
+        self.assertEqual(meme_replies._chat_types[1], "supergroup")
+
+    def test_message_with_chat_type_is_one_journal_record_with_activity(self):
+        meme_replies.record_chat_message(1, "клиент попросил перекрасить кнопки", chat_type="supergroup")
+        meme_replies.record_chat_message(1, "ок", chat_type="supergroup")
+        self.assertTrue(persistence.flush_pending_writes())
+        with open(meme_replies.MEME_JOURNAL_FILE, encoding="utf-8") as handle:
+            ops = [json.loads(line)["op"] for line in handle]
+        # короткое «ок» в историю не идёт, но активность всё равно отмечается
+        self.assertEqual(ops, ["m", "a"])
+
+        self._reset_memory()
+        meme_replies.load_meme_state()
+
+        self.assertEqual(list(meme_replies._chat_history[1]), ["клиент попросил перекрасить кнопки"])
+        self.assertEqual(meme_replies._chat_types[1], "supergroup")
+        self.assertIn(1, meme_replies._last_chat_activity)
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        meme_replies.record_chat_message(1, "первый макет залит")
+        meme_replies.compact_meme_state()
+        persistence.flush_pending_writes()
+        self.assertEqual(os.path.getsize(meme_replies.MEME_JOURNAL_FILE), 0)
+        meme_replies.record_chat_message(1, "второй макет тоже залит")
+
+        self._reset_memory()
+        meme_replies.load_meme_state()
+
+        self.assertEqual(
+            list(meme_replies._chat_history[1]),
+            ["первый макет залит", "второй макет тоже залит"],
+        )
+
+    def test_v2_daily_records_load_into_compact_history_and_save_as_v3(self):
+        now = meme_replies.time.time()
+        with open(meme_replies.MEME_STATE_FILE, "w", encoding="utf-8") as handle:
+            json.dump({
+                "version": 2,
+                "chat_history": {"1": ["макет уехал к клиенту"]},
+                "daily_history": {"1": [
+                    {"ts": now - 3 * 86400, "day": "2020-01-01", "text": "вчерашний созвон"},
+                    {"ts": now, "day": "ignored", "text": "макет уехал к клиенту"},
+                ]},
+            }, handle)
+
+        meme_replies.load_meme_state()
+
+        daily = meme_replies._chat_daily_history[1]
+        self.assertEqual(meme_replies._today_history(1), ["макет уехал к клиенту"])
+        self.assertIs(daily.texts[0], meme_replies._chat_history[1][0])
+
+        meme_replies.save_meme_state(force=True)
+        self.assertTrue(persistence.flush_pending_writes())
+        with open(meme_replies.MEME_STATE_FILE, encoding="utf-8") as handle:
+            saved = json.load(handle)
+        self.assertEqual(saved["version"], 3)
+        self.assertEqual(saved["daily_history"]["1"], {"ts": [now], "t": ["макет уехал к клиенту"]})
+
+    def test_replay_skips_records_already_in_snapshot(self):
+        meme_replies.record_chat_message(1, "первый макет залит")
+        persistence.flush_pending_writes()
+        with open(meme_replies.MEME_JOURNAL_FILE, encoding="utf-8") as handle:
+            journal = handle.read()
+        meme_replies.compact_meme_state()
+        persistence.flush_pending_writes()
+        # Падение между записью снапшота и обнулением журнала.
+        with open(meme_replies.MEME_JOURNAL_FILE, "w", encoding="utf-8") as handle:
+            handle.write(journal + '{"n": 99, "op": "m"')
+
+        self._reset_memory()
+        meme_replies.load_meme_state()
+
+        self.assertEqual(list(meme_replies._chat_history[1]), ["первый макет залит"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import unittest
+
+import metrics
+import web_app
+
+
+class MetricsTests(unittest.TestCase):
+    def test_counter_sums_shards_of_all_threads(self):
+        counter = metrics.Counter("test_events_total", "События.", ("kind",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc("b", amount=2)
+
+        self.assertEqual(counter.value("a"), 4000)
+        self.assertIn('test_events_total{kind="b"} 2', counter.render())
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("test_seconds", "Время.", ("op",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "save")
+
+        lines = histogram.render()
+
+        self.assertEqual(lines[:2], ["# HELP test_seconds Время.", "# TYPE test_seconds histogram"])
+        self.assertEqual(lines[2:], [
+            'test_seconds_bucket{op="save",le="0.1"} 2',
+            'test_seconds_bucket{op="save",le="1"} 3',
+            'test_seconds_bucket{op="save",le="+Inf"} 4',
+            'test_seconds_sum{op="save"} 3.65',
+            'test_seconds_count{op="save"} 4',
+        ])
+
+    def test_track_async_counts_errors_and_duration(self):
+        histogram = metrics.Histogram("test_handler_seconds", "Хендлер.", ("handler",))
+        errors = metrics.Counter("test_handler_errors_total", "Ошибки.", ("handler",))
+
+        @metrics.track_async(histogram, errors)
+        async def broken_handler():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(broken_handler())
+
+        self.assertEqual(histogram.count("broken_handler"), 1)
+        self.assertEqual(errors.value("broken_handler"), 1)
+
+    def test_metrics_endpoint_serves_registry(self):
+        async def fetch():
+            return await web_app.app.test_client().get("/metrics")
+
+        response = asyncio.run(fetch())
+        body = asyncio.run(response.get_data(as_text=True))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE slashbot_start_time_seconds gauge", body)
+        self.assertIn("# TYPE slashbot_broadcast_messages_total counter", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
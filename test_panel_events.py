@@ -0,0 +1,36 @@
+import asyncio
+import unittest
+
+import panel_events
+import web_app
+
+
+class PanelEventsTests(unittest.TestCase):
+    def test_scheduled_etag_returns_304_until_data_changes(self):
+        async def run():
+            client = web_app.app.test_client()
+            first = await client.get("/api/scheduled?chat_id=42")
+            tag = first.headers["ETag"]
+            unchanged = await client.get("/api/scheduled?chat_id=42", headers={"If-None-Match": tag})
+            panel_events.publish("scheduled")
+            changed = await client.get("/api/scheduled?chat_id=42", headers={"If-None-Match": tag})
+            return first.status_code, unchanged.status_code, changed.status_code
+
+        self.assertEqual(asyncio.run(run()), (200, 304, 200))
+
+    def test_publish_reaches_subscribers_from_other_threads(self):
+        async def run():
+            queue = panel_events.subscribe()
+            try:
+                await asyncio.to_thread(panel_events.publish, "chats")
+                return await asyncio.wait_for(queue.get(), timeout=1)
+            finally:
+                panel_events.unsubscribe(queue)
+
+        topic, version = asyncio.run(run())
+        self.assertEqual(topic, "chats")
+        self.assertEqual(version, panel_events.version("chats"))
+
+
+if __name__ == "__main__":
+    unittest.main()
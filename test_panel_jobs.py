@@ -0,0 +1,165 @@
+import asyncio
+import datetime as dt
+import json
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import panel_jobs
+
+
+class FakeJob:
+    def __init__(self, queue, name):
+        self.queue = queue
+        self.name = name
+
+    def schedule_removal(self):
+        self.queue.live.remove(self)
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.daily = []
+        self.once = []
+        self.live = []
+
+    def jobs(self):
+        return tuple(self.live)
+
+    def get_jobs_by_name(self, name):
+        return [job for job in self.live if job.name == name]
+
+    def run_daily(self, callback, time, days, name, chat_id, data):
+        self.daily.append({"time": time, "days": days, "name": name, "chat_id": chat_id, "data": data})
+        self.live.append(FakeJob(self, name))
+
+    def run_once(self, callback, when, name, chat_id, data):
+        self.once.append({"when": when, "name": name, "chat_id": chat_id, "data": data})
+        self.live.append(FakeJob(self, name))
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class PanelJobsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "scheduled_messages.json")
+        patcher = mock.patch.object(panel_jobs, "SCHEDULED_MESSAGES_FILE", path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_rearm_all_restores_recurring_and_pending_one_shot(self):
+        future = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=2)).isoformat()
+        panel_jobs.save_messages([
+            {"id": "msg_1", "chat_id": -100, "message": "планёрка", "is_recurring": True,
+             "recurring_pattern": {"days": [0, 5], "time": "09:30"}},
+            {"id": "msg_2", "chat_id": 42, "message": "позже", "is_recurring": False, "send_time": future},
+            {"id": "msg_3", "chat_id": 42, "message": "давно", "is_recurring": False,
+             "send_time": "2020-01-01T10:00:00"},
+        ])
+        job_queue = FakeJobQueue()
+
+        with self.assertLogs("panel_jobs", "WARNING") as logs:
+            self.assertEqual(panel_jobs.rearm_all(job_queue), 2)
+        self.assertIn("msg_3", logs.output[0])
+
+        daily = job_queue.daily[0]
+        # 0=вс как в панели — JobQueue понимает дни так же, без сдвига
+        self.assertEqual(daily["days"], (0, 5))
+        self.assertEqual((daily["time"].hour, daily["time"].minute), (9, 30))
+        self.assertEqual(str(daily["time"].tzinfo), "Europe/Moscow")
+        self.assertEqual(daily["name"], "panel:msg_1")
+        self.assertEqual([job["data"] for job in job_queue.once], ["msg_2"])
+
+    def test_one_shot_is_sent_and_removed_from_file(self):
+        panel_jobs.save_messages([
+            {"id": "msg_1", "chat_id": 42, "message": "привет", "is_recurring": False,
+             "send_time": "2030-01-01T10:00:00"},
+        ])
+        bot = FakeBot()
+        context = SimpleNamespace(bot=bot, job=SimpleNamespace(data="msg_1"))
+
+        asyncio.run(panel_jobs.send_panel_message(context))
+
+        self.assertEqual(bot.sent, [(42, "привет")])
+        self.assertEqual(panel_jobs.load_messages(), [])
+        with open(panel_jobs.SCHEDULED_MESSAGES_FILE, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [])
+
+    def test_reload_job_picks_up_edits_from_a_separate_panel_process(self):
+        def recurring(message_id, time):
+            return {"id": message_id, "chat_id": 42, "message": message_id, "is_recurring": True,
+                    "recurring_pattern": {"days": [1], "time": time}}
+
+        panel_jobs.save_messages([recurring("msg_1", "09:00"), recurring("msg_2", "10:00")])
+        job_queue = FakeJobQueue()
+        context = SimpleNamespace(job_queue=job_queue)
+        self.assertEqual(panel_jobs.rearm_all(job_queue), 2)
+
+        asyncio.run(panel_jobs.reload_job(context))
+        self.assertEqual(len(job_queue.daily), 2)  # файл не менялся — ничего не трогаем
+
+        # отдельная панель: msg_1 перенесли, msg_2 удалили, msg_3 добавили
+        panel_jobs.save_messages([recurring("msg_1", "18:30"), recurring("msg_3", "11:00")])
+        os.utime(panel_jobs.SCHEDULED_MESSAGES_FILE, ns=(0, panel_jobs._armed_mtime + 1))
+        with self.assertLogs("panel_jobs", "INFO"):
+            asyncio.run(panel_jobs.reload_job(context))
+
+        self.assertEqual(sorted(job.name for job in job_queue.live), ["panel:msg_1", "panel:msg_3"])
+        self.assertEqual(job_queue.daily[-2]["time"].hour, 18)
+
+    def test_concurrent_edits_from_worker_threads_keep_every_message(self):
+        items = [{"id": f"msg_{i}", "chat_id": 42, "message": str(i), "is_recurring": True} for i in range(20)]
+
+        async def run():
+            await asyncio.gather(*(asyncio.to_thread(panel_jobs.add_message, item) for item in items))
+            await asyncio.gather(*(asyncio.to_thread(panel_jobs.remove_message, f"msg_{i}") for i in range(0, 20, 2)))
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(m["id"] for m in panel_jobs.load_messages()),
+                         sorted(f"msg_{i}" for i in range(1, 20, 2)))
+        self.assertFalse(panel_jobs.remove_message("msg_0"))
+
+    def test_panel_update_route_edits_file_off_the_loop(self):
+        import web_app
+
+        panel_jobs.save_messages([{"id": "msg_1", "chat_id": 42, "message": "старое", "is_recurring": True,
+                                   "recurring_pattern": {"days": [1], "time": "10:00"}}])
+
+        async def run():
+            client = web_app.app.test_client()
+            with mock.patch.object(panel_jobs, "load_messages", wraps=panel_jobs.load_messages) as load:
+                response = await client.put("/api/scheduled/msg_1", json={"message": "новое"})
+                missing = await client.put("/api/scheduled/msg_404", json={"message": "x"})
+            loop_thread = threading.get_ident()
+            return response.status_code, missing.status_code, load.call_count, loop_thread
+
+        with mock.patch.object(web_app, "WEB_PASSWORD", ""):
+            threads = []
+            real = panel_jobs.update_messages
+
+            def spy(change):
+                threads.append(threading.get_ident())
+                return real(change)
+
+            with mock.patch.object(panel_jobs, "update_messages", spy):
+                ok, missing, loads, loop_thread = asyncio.run(run())
+
+        self.assertEqual((ok, missing, loads), (200, 404, 2))
+        self.assertNotIn(loop_thread, threads)
+        self.assertEqual(panel_jobs.load_messages()[0]["message"], "новое")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import random
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import pasha_persona
+
+
+class CompiledTablesTests(unittest.TestCase):
+    def test_short_tables_hold_only_valid_replies_with_sane_weights(self):
+        for context, (values, cum_weights) in pasha_persona._SHORT_TABLES.items():
+            self.assertTrue(values, context)
+            self.assertEqual(len(values), len(cum_weights))
+            self.assertEqual(cum_weights, sorted(cum_weights))
+            # невалидных исходов нет — сумма вероятностей почти 1
+            self.assertAlmostEqual(cum_weights[-1], 1.0, places=9)
+            for value in values:
+                self.assertTrue(pasha_persona._is_valid_reply(value, pasha_persona.MAX_SHORT_LEN), value)
+
+    def test_distribution_matches_template_probabilities(self):
+        values, cum_weights = pasha_persona._SHORT_TABLES["sync"]
+        probs = dict(zip(values, (w - prev for w, prev in zip(cum_weights, [0.0, *cum_weights]))))
+        # «хз» с заглавной бывает только из последнего шаблона: 1/7 · 1/4 · 0.45
+        self.assertAlmostEqual(probs["Хз"], 1 / 7 * 1 / 4 * pasha_persona.CAP_CHANCE)
+        self.assertNotIn("го", probs)
+
+    def test_long_tables_drop_invalid_and_allow_mentions_only_for_team(self):
+        generic = pasha_persona._LONG_TABLES[("generic", None)]
+        personal = pasha_persona._LONG_TABLES[("generic", "lx_grzdv")]
+        self.assertNotIn("@lx_grzdv ты жив?", generic)
+        self.assertIn("@lx_grzdv ты жив?", personal)
+        for context in ("delivered", "generic"):
+            for reply in pasha_persona._LONG_TABLES[(context, None)]:
+                self.assertLessEqual(len(reply), pasha_persona.MAX_LONG_LEN)
+                self.assertIsNone(pasha_persona.FORBIDDEN.search(reply), reply)
+
+
+def _classify_sequentially(text):
+    """Прежняя логика: паттерны по очереди, фон и упоминание отдельными поисками."""
+    context = next((ctx for pattern, ctx in pasha_persona.TRIGGER_CONTEXT if pattern.search(text)), "generic")
+    return pasha_persona.MessageTriggers(
+        context,
+        bool(pasha_persona.BACKGROUND_TRIGGER.search(text)),
+        bool(re.search(r"@ag_slashbot|@\w*slashbot", text.lower(), re.I)),
+    )
+
+
+class TriggerScanTests(unittest.TestCase):
+    WORDS = (
+        "готово сделала залил отправил письмо email промо ошибка баг не работает макет Фигма figma "
+        "верстка видео рилс задача notion апрув ревью синк созвон мит meet whereby колл перевод "
+        "привет салам здаров доброе утро спасибо спс го го? заход гуд норм ок окей @ag_slashbot "
+        "@my_slashbot котики кста ну да и в"
+    ).split()
+
+    def test_single_scan_matches_sequential_patterns(self):
+        rng = random.Random(7)
+        for _ in range(3000):
+            text = " ".join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 8)))
+            if rng.random() < 0.3:
+                text = text.replace(" ", "")
+            if rng.random() < 0.2:
+                text = text.upper()
+            self.assertEqual(pasha_persona.classify_message(text), _classify_sequentially(text), text)
+
+    def test_priority_and_flags(self):
+        triggers = pasha_persona.classify_message("@ag_slashbot баг в верстке")
+        self.assertEqual(triggers, pasha_persona.MessageTriggers("problem", False, True))
+        self.assertEqual(pasha_persona.classify_message("котики"), pasha_persona.MessageTriggers())
+
+
+class TeamRosterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "team_roster.json")
+        patcher = mock.patch.object(pasha_persona, "TEAM_ROSTER_FILE", self.path)
+        patcher.start()
+        quiet = mock.patch.object(pasha_persona.log, "disabled", True)
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        # после теста — снова только встроенный состав
+        self.addCleanup(pasha_persona.reload_team_roster, True)
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, roster):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(roster, f, ensure_ascii=False)
+        pasha_persona.reload_team_roster(force=True)
+
+    def test_roster_file_adds_member_and_mention_matcher(self):
+        self.assertIsNone(pasha_persona.resolve_target_username(None, "@new_guy глянь"))
+        self.write({"@New_Guy": {"names": ["Вася"], "long": ["Вася, ну ты даешь"]}})
+
+        self.assertEqual(pasha_persona.resolve_target_username(None, "готово @NEW_GUY"), "new_guy")
+        self.assertEqual(pasha_persona.resolve_target_username(None, "@new_guy1"), None)
+        self.assertEqual(pasha_persona.resolve_target_username("ikarcev", "@new_guy"), "ikarcev")
+        self.assertEqual(pasha_persona._PERSONAL_LONG["new_guy"], ("Вася, ну ты даешь",))
+        self.assertIn("Вася, ну ты даешь", pasha_persona._LONG_TABLES[("design", "new_guy")])
+
+    def test_reload_rebuilds_only_changed_members(self):
+        self.write({"new_guy": {"names": ["Вася"], "long": []}})
+        builtin = pasha_persona._LONG_TABLES[("generic", "ikarcev")]
+        self.write({"new_guy": {"names": ["Вася"], "long": ["Вася, успех"]}})
+        self.assertIs(pasha_persona._LONG_TABLES[("generic", "ikarcev")], builtin)
+        self.assertEqual(pasha_persona._PERSONAL_LONG["new_guy"], ("Вася, успех",))
+
+        os.remove(self.path)
+        pasha_persona.reload_team_roster()
+        self.assertNotIn("new_guy", pasha_persona.TEAM_USERNAMES)
+        self.assertNotIn(("generic", "new_guy"), pasha_persona._LONG_TABLES)
+        self.assertEqual(pasha_persona.resolve_target_username(None, "@lx_grzdv ты тут?"), "lx_grzdv")
+
+    def test_broken_file_keeps_current_roster(self):
+        self.write({"new_guy": {"names": ["Вася"]}})
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{oops")
+        self.assertFalse(pasha_persona.reload_team_roster(force=True))
+        self.assertIn("new_guy", pasha_persona.TEAM_USERNAMES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+import unittest
+
+from persistence import StateWriter
+
+
+class StateWriterTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.writer = StateWriter(name="test-state-writer")
+
+    def _path(self, name):
+        return os.path.join(self._tmp.name, name)
+
+    def test_snapshot_replaces_journal_lines_queued_before_it(self):
+        snapshot, journal = self._path("state.json"), self._path("state.journal")
+        self.writer.append_line(journal, '{"n":1}')
+        self.writer.write_json(snapshot, {"seq": 1}, truncate=journal)
+        self.writer.append_line(journal, '{"n":2}')
+        self.assertTrue(self.writer.flush())
+
+        with open(snapshot, encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle), {"seq": 1})
+        with open(journal, encoding="utf-8") as handle:
+            self.assertEqual(handle.read(), '{"n":2}\n')
+
+    def test_failed_snapshot_keeps_covered_journal_lines(self):
+        journal = self._path("state.journal")
+        missing_dir_file = os.path.join(self._path("state.json"), "blocked.json")
+        with open(self._path("state.json"), "w", encoding="utf-8"):
+            pass
+        self.writer.append_line(journal, '{"n":1}')
+        with self.assertLogs("persistence", "WARNING"):
+            self.writer.write_json(missing_dir_file, {"seq": 1}, truncate=journal)
+            self.assertTrue(self.writer.flush())
+
+        with open(journal, encoding="utf-8") as handle:
+            self.assertEqual(handle.read(), '{"n":1}\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from telegram import Bot
+
+import bot_runtime
+import web_app
+
+RECORDED_UPDATE = {
+    "update_id": 900001,
+    "message": {
+        "message_id": 42,
+        "date": 1760000000,
+        "chat": {"id": -1002413642408, "type": "supergroup", "title": "S:P9 works"},
+        "from": {"id": 1001, "is_bot": False, "first_name": "Паша"},
+        "text": "заход на завод",
+    },
+}
+
+
+class WebhookEndpointTests(unittest.TestCase):
+    def tearDown(self):
+        bot_runtime.unregister()
+
+    async def _post(self, headers):
+        """Бот и панель на одном loop, как в start_both.py."""
+        application = SimpleNamespace(bot=Bot("123456:TEST"), update_queue=asyncio.Queue())
+        bot_runtime.register(application, asyncio.get_running_loop())
+        client = web_app.app.test_client()
+        response = await client.post(bot_runtime.WEBHOOK_PATH, json=RECORDED_UPDATE, headers=headers)
+        return response, application.update_queue
+
+    def test_recorded_update_lands_in_application_queue(self):
+        with patch.object(bot_runtime, "BOT_MODE", "webhook"), patch.object(bot_runtime, "WEBHOOK_SECRET", "s3cret"):
+            response, queue = asyncio.run(self._post({"X-Telegram-Bot-Api-Secret-Token": "s3cret"}))
+
+        self.assertEqual(response.status_code, 200)
+        update = queue.get_nowait()
+        self.assertEqual(update.update_id, 900001)
+        self.assertEqual(update.effective_message.text, "заход на завод")
+
+    def test_wrong_secret_is_rejected(self):
+        with patch.object(bot_runtime, "BOT_MODE", "webhook"), patch.object(bot_runtime, "WEBHOOK_SECRET", "s3cret"):
+            response, queue = asyncio.run(self._post({}))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(queue.empty())
+
+    def test_webhook_without_secret_accepts_nothing(self):
+        with patch.object(bot_runtime, "BOT_MODE", "webhook"), patch.object(bot_runtime, "WEBHOOK_SECRET", ""):
+            response, queue = asyncio.run(self._post({"X-Telegram-Bot-Api-Secret-Token": ""}))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(queue.empty())
+
+    def test_forged_post_in_polling_mode_is_not_found(self):
+        with patch.object(bot_runtime, "BOT_MODE", "polling"), patch.object(
+            bot_runtime, "WEBHOOK_SECRET", ""
+        ), patch.object(web_app, "WEB_PASSWORD", ""):
+            response, queue = asyncio.run(self._post({}))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(queue.empty())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,20 +4,30 @@ load_dotenv()
 # Токен только из env (локально — .env или export; Railway — Variables)
 BOT_TOKEN = os.getenv('BOT_TOKEN', '')
 
-from flask import Flask, render_template, request, jsonify, Response
+from quart import Quart, render_template, request, jsonify, make_response, Response
 from telegram import Bot
 from telegram.request import HTTPXRequest
 import json
+import logging
 from datetime import datetime, timedelta
 import asyncio
+import threading
 from functools import wraps
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.date import DateTrigger
-from apscheduler.triggers.cron import CronTrigger
 from typing import Optional
-import pytz
 
-app = Flask(__name__)
+from app_logging import setup_logging
+import bot_runtime
+import metrics
+from broadcast import broadcast
+from chat_cache import get_chat_cache
+from meme_replies import chat_topics
+import panel_events
+import panel_jobs
+from persistence import write_json
+
+log = logging.getLogger(__name__)
+
+app = Quart(__name__)
 
 # Секретный доступ: если заданы WEB_USER и WEB_PASSWORD — веб-морда закрыта паролем
 WEB_USER = os.environ.get('WEB_USER', '')
@@ -41,13 +51,14 @@ def _auth_response():
     )
 
 @app.before_request
-def require_auth():
-    if _check_auth():
+async def require_auth():
+    # Telegram не умеет Basic Auth — webhook (только в webhook-режиме) защищён своим секретом
+    if (bot_runtime.webhook_mode() and request.path == bot_runtime.WEBHOOK_PATH) or _check_auth():
         return None
     return _auth_response()
 
 def _make_bot():
-    """Создаёт экземпляр Bot с увеличенным пулом соединений. Отдельный экземпляр на запрос избегает Pool timeout при множественных asyncio.run()."""
+    """Создаёт экземпляр Bot с увеличенным пулом соединений (для запуска панели без бота)."""
     request = HTTPXRequest(
         connection_pool_size=16,
         pool_timeout=30.0,
@@ -57,15 +68,30 @@ def _make_bot():
     )
     return Bot(token=BOT_TOKEN, request=request)
 
+_standalone_bot: Optional[tuple] = None  # (loop, Bot) — панель запущена отдельно от бота
+
+def _get_bot():
+    """Bot для текущего event loop: уже прогретый application.bot, если панель крутится на loop бота,
+    иначе один закешированный Bot на loop (отдельный web_app.py)."""
+    global _standalone_bot
+    loop = asyncio.get_running_loop()
+    application = bot_runtime.get_application()
+    if application is not None and bot_runtime.get_loop() is loop:
+        return application.bot
+    if _standalone_bot is None or _standalone_bot[0] is not loop:
+        _standalone_bot = (loop, _make_bot())
+    return _standalone_bot[1]
+
 # Файлы для хранения данных (каталог задаётся из start_both через SLASHBOT_DATA_DIR)
 _DATA_DIR = os.environ.get('SLASHBOT_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
 USERS_FILE = os.path.join(_DATA_DIR, "bot_users.json")
-SCHEDULED_MESSAGES_FILE = os.path.join(_DATA_DIR, "scheduled_messages.json")
+SCHEDULED_MESSAGES_FILE = panel_jobs.SCHEDULED_MESSAGES_FILE
 BOT_SETTINGS_FILE = os.path.join(_DATA_DIR, "bot_settings.json")
-
-# Планировщик для отложенных сообщений
-scheduler = BackgroundScheduler(timezone=pytz.timezone('Europe/Moscow'))
-scheduler.start()
+panel_events.watch('chats', USERS_FILE)
+panel_events.watch('scheduled', SCHEDULED_MESSAGES_FILE, BOT_SETTINGS_FILE)
+SSE_KEEPALIVE_SEC = float(os.environ.get('SSE_KEEPALIVE_SEC', 15))
+# bot_users.json без бота в процессе правят и маршруты (через to_thread), и broadcast — не перемешиваем
+_chats_lock = threading.Lock()
 
 def load_chats():
     """Загружает список чатов"""
@@ -75,44 +101,49 @@ def load_chats():
                 users_data = json.load(f)
                 return users_data.get('chat_ids', [])
         except Exception as e:
-            print(f"Ошибка при загрузке чатов: {e}")
+            log.error("Ошибка при загрузке чатов: %s", e)
             return []
     return []
 
-def add_chat_id(cid: int) -> bool:
-    """Добавляет chat_id в список (для веб-панели). Возвращает True если добавлен или уже был."""
+def _store_chat_id(cid: int) -> bool:
+    """Дописать чат прямо в файл (бота в процессе нет). Блокирует — из async через asyncio.to_thread."""
     try:
-        cid = int(cid)
-        chat_ids = load_chats()
-        if cid not in chat_ids:
-            chat_ids.append(cid)
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump({'chat_ids': chat_ids}, f, ensure_ascii=False, indent=2)
+        with _chats_lock:
+            chat_ids = load_chats()
+            if cid not in chat_ids:
+                chat_ids.append(cid)
+            with open(USERS_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'chat_ids': chat_ids}, f, ensure_ascii=False, indent=2)
+        panel_events.publish('chats')
         return True
     except Exception as e:
-        print(f"Ошибка при сохранении чата: {e}")
+        log.error("Ошибка при сохранении чата: %s", e)
         return False
 
-def load_scheduled_messages():
-    """Загружает список запланированных сообщений"""
-    if os.path.exists(SCHEDULED_MESSAGES_FILE):
-        try:
-            with open(SCHEDULED_MESSAGES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Ошибка при загрузке запланированных сообщений: {e}")
-            return []
-    return []
-
-def save_scheduled_messages(messages):
-    """Сохраняет список запланированных сообщений"""
+def remove_chat_id(cid: int, reason: str = "") -> None:
+    """Убирает чат из списка, если бот туда больше не может писать."""
     try:
-        with open(SCHEDULED_MESSAGES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
-        return True
+        if bot_runtime.call_hook('drop_chat', cid, reason):
+            return
+        with _chats_lock:
+            chat_ids = load_chats()
+            if cid not in chat_ids:
+                return
+            chat_ids.remove(cid)
+            with open(USERS_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'chat_ids': chat_ids}, f, ensure_ascii=False, indent=2)
+        get_chat_cache().forget(cid)
+        panel_events.publish('chats')
+        log.info("➖ Чат %s убран из списка: %s", cid, reason)
     except Exception as e:
-        print(f"Ошибка при сохранении запланированных сообщений: {e}")
-        return False
+        log.error("Ошибка при удалении чата: %s", e)
+
+def _load_bot_settings() -> dict:
+    """bot_settings.json целиком (пустой словарь, если файла нет)."""
+    if not os.path.exists(BOT_SETTINGS_FILE):
+        return {}
+    with open(BOT_SETTINGS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 def get_system_schedules(selected_chat_id: Optional[int] = None):
     """Возвращает системные расписания, определенные в самом боте.
@@ -145,7 +176,7 @@ def get_system_schedules(selected_chat_id: Optional[int] = None):
                         }
                     })
     except Exception as e:
-        print(f"Ошибка при чтении системного расписания: {e}")
+        log.error("Ошибка при чтении системного расписания: %s", e)
 
     # 2) Пятничная рассылка (пятница 17:50) — для всех чатов
     if selected_chat_id is not None:
@@ -166,54 +197,95 @@ def get_system_schedules(selected_chat_id: Optional[int] = None):
     return system_items
 
 async def send_telegram_message(chat_id, text):
-    """Отправляет сообщение в Telegram. Возвращает (success, error_message)."""
-    bot = _make_bot()
-    try:
-        await bot.send_message(chat_id=chat_id, text=text)
-        print(f"✅ Сообщение отправлено в чат {chat_id}")
+    """Отправляет сообщение в Telegram через общий broadcast (лимиты, RetryAfter). Возвращает (success, error_message)."""
+    report = await broadcast(_get_bot(), [chat_id], text, on_drop=remove_chat_id)
+    if chat_id in report.sent:
+        log.info("✅ Сообщение отправлено в чат %s", chat_id)
         return True, None
-    except Exception as e:
-        error_text = str(e)
-        print(f"❌ Ошибка при отправке сообщения в чат {chat_id}: {error_text}")
-        return False, error_text
-
-def send_message_sync(chat_id, text):
-    """Синхронная обертка для отправки сообщения"""
-    asyncio.run(send_telegram_message(chat_id, text))
-
-async def get_chat_info(bot, chat_id):
-    """Получает информацию о чате"""
+    error_text = report.error_for(chat_id) or 'Ошибка при отправке'
+    log.error("❌ Ошибка при отправке сообщения в чат %s: %s", chat_id, error_text)
+    return False, error_text
+
+def _arm(item: dict) -> str:
+    """Поставить задачу в JobQueue бота. Если бот не в этом процессе — задача уже в файле, бот подхватит её по mtime."""
+    job_queue = panel_jobs.get_job_queue()
+    if job_queue is None:
+        return f' (бот в другом процессе — подхватит задачу из файла в течение {panel_jobs.PANEL_JOBS_RELOAD_SEC:g} сек)'
+    panel_jobs.arm(job_queue, item)
+    return ''
+
+@app.route(bot_runtime.WEBHOOK_PATH, methods=['POST'])
+async def telegram_webhook():
+    """Приём апдейтов Telegram (BOT_MODE=webhook): кладёт Update в очередь бота и сразу отвечает 200"""
+    if not bot_runtime.webhook_mode():
+        return jsonify({'ok': False, 'error': 'not found'}), 404
+    if not bot_runtime.check_webhook_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        return jsonify({'ok': False, 'error': 'forbidden'}), 403
+    payload = await request.get_json(silent=True)
+    if not isinstance(payload, dict) or 'update_id' not in payload:
+        return jsonify({'ok': False, 'error': 'ожидается JSON Update'}), 400
     try:
-        chat = await bot.get_chat(chat_id)
-        if chat.type == 'private':
-            return {
-                'id': chat_id,
-                'title': f"{chat.first_name or ''} {chat.last_name or ''}".strip() or f"User {chat_id}",
-                'type': 'private'
-            }
-        else:
-            return {
-                'id': chat_id,
-                'title': chat.title or f"Chat {chat_id}",
-                'type': chat.type
-            }
+        accepted = await bot_runtime.enqueue_update(payload)
     except Exception as e:
-        print(f"Ошибка при получении информации о чате {chat_id}: {e}")
-        return {
-            'id': chat_id,
-            'title': f"Chat {chat_id}",
-            'type': 'unknown'
-        }
+        log.error("❌ Webhook: не удалось принять апдейт %s: %s", payload.get('update_id'), e)
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    if not accepted:
+        return jsonify({'ok': False, 'error': 'бот не запущен в webhook-режиме'}), 503
+    return jsonify({'ok': True})
+
+def _not_modified(tag: str) -> bool:
+    """If-None-Match совпал с текущей версией — можно ответить 304 без чтения файлов"""
+    return tag in request.if_none_match
+
+def _not_modified_response(tag: str):
+    return Response('', 304, {'ETag': f'"{tag}"', 'Cache-Control': 'no-cache'})
+
+def _with_etag(response, tag: str):
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/events')
+async def panel_events_stream():
+    """Server-Sent Events: event scheduled / chats приходит только когда данные поменялись"""
+    async def stream():
+        queue = panel_events.subscribe()
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    topic, version = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    # Файлы мог поменять другой процесс (web_app.py без бота) — сверяем mtime
+                    panel_events.check_files()
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {topic}\ndata: {json.dumps({'version': version})}\n\n"
+        finally:
+            panel_events.unsubscribe(queue)
+
+    response = await make_response(stream(), 200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None
+    return response
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    """Метрики бота и панели для Prometheus (тот же Basic Auth, что и у панели)."""
+    return Response(metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE})
 
 @app.route('/')
-def index():
+async def index():
     """Главная страница"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
 @app.route('/api/chats', methods=['POST'])
-def add_chat():
+async def add_chat():
     """Добавляет чат по ID в список (для веб-панели). Тело: {"chat_id": 123456789}"""
-    data = request.json or {}
+    data = await request.get_json(silent=True) or {}
     cid = data.get('chat_id')
     if cid is None:
         return jsonify({'success': False, 'error': 'Укажите chat_id'}), 400
@@ -221,29 +293,31 @@ def add_chat():
         cid = int(cid)
     except (TypeError, ValueError):
         return jsonify({'success': False, 'error': 'chat_id должен быть числом'}), 400
-    if add_chat_id(cid):
+    if bot_runtime.call_hook('add_chat', cid) or await asyncio.to_thread(_store_chat_id, cid):
         return jsonify({'success': True, 'message': 'Чат добавлен'})
     return jsonify({'success': False, 'error': 'Не удалось сохранить'}), 500
 
 @app.route('/api/chats', methods=['GET'])
-def get_chats():
+async def get_chats():
     """Возвращает список чатов"""
-    chat_ids = load_chats()
-    bot = _make_bot()
-
-    async def fetch_all():
-        result = []
-        for cid in chat_ids:
-            result.append(await get_chat_info(bot, cid))
-        return result
-
-    chats = asyncio.run(fetch_all())
-    return jsonify({'chats': chats})
+    tag = panel_events.etag('chats')
+    if _not_modified(tag):
+        # Список тот же, но устаревшие названия всё равно освежаем — переименование придёт событием chats
+        get_chat_cache().revalidate(_get_bot(), await asyncio.to_thread(load_chats))
+        return _not_modified_response(tag)
+    chat_ids = await asyncio.to_thread(load_chats)
+    chats = await get_chat_cache().get_many(_get_bot(), chat_ids)
+    return _with_etag(jsonify({'chats': chats}), panel_events.etag('chats'))
+
+@app.route('/api/chats/<int(signed=True):chat_id>/topics', methods=['GET'])
+async def get_chat_topics(chat_id):
+    """«Темы дня» чата — частые слова сегодняшней переписки (пусто, если бот запущен не в этом процессе)"""
+    return jsonify({'chat_id': chat_id, 'topics': chat_topics(chat_id)})
 
 @app.route('/api/send', methods=['POST'])
-def send_message():
+async def send_message():
     """Отправляет сообщение немедленно"""
-    data = request.json
+    data = await request.get_json(silent=True) or {}
     chat_id = data.get('chat_id')
     message = data.get('message')
     
@@ -251,7 +325,7 @@ def send_message():
         return jsonify({'success': False, 'error': 'Не указан чат или сообщение'}), 400
     
     try:
-        success, error_message = asyncio.run(send_telegram_message(int(chat_id), message))
+        success, error_message = await send_telegram_message(int(chat_id), message)
         if success:
             return jsonify({'success': True, 'message': 'Сообщение отправлено'})
         else:
@@ -260,9 +334,9 @@ def send_message():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/schedule', methods=['POST'])
-def schedule_message():
+async def schedule_message():
     """Планирует отправку сообщения"""
-    data = request.json
+    data = await request.get_json(silent=True) or {}
     chat_id = data.get('chat_id')
     message = data.get('message')
     send_time = data.get('send_time')  # ISO format datetime string
@@ -273,8 +347,6 @@ def schedule_message():
         return jsonify({'success': False, 'error': 'Не указан чат или сообщение'}), 400
     
     try:
-        scheduled_messages = load_scheduled_messages()
-        
         # Генерируем уникальный ID
         message_id = f"msg_{int(datetime.now().timestamp() * 1000)}"
         
@@ -288,67 +360,38 @@ def schedule_message():
         }
         
         if is_recurring:
-            # Создаем регулярную задачу
             scheduled_data['recurring_pattern'] = recurring_pattern
-            
-            days_of_week = ','.join(map(str, recurring_pattern.get('days', [1,2,3,4,5])))
-            time_parts = recurring_pattern.get('time', '10:00').split(':')
-            hour = int(time_parts[0])
-            minute = int(time_parts[1])
-            
-            trigger = CronTrigger(
-                day_of_week=days_of_week,
-                hour=hour,
-                minute=minute,
-                timezone=pytz.timezone('Europe/Moscow')
-            )
-            
-            scheduler.add_job(
-                send_message_sync,
-                trigger=trigger,
-                args=[int(chat_id), message],
-                id=message_id,
-                name=f"Recurring message to {chat_id}"
-            )
+        elif not send_time:
+            return jsonify({'success': False, 'error': 'Не указано время отправки'}), 400
         else:
-            # Создаем одноразовую задачу
-            send_datetime = datetime.fromisoformat(send_time.replace('Z', '+00:00'))
-            
-            trigger = DateTrigger(
-                run_date=send_datetime,
-                timezone=pytz.timezone('Europe/Moscow')
-            )
-            
-            scheduler.add_job(
-                send_message_sync,
-                trigger=trigger,
-                args=[int(chat_id), message],
-                id=message_id,
-                name=f"Scheduled message to {chat_id}"
-            )
+            panel_jobs.parse_send_time(send_time)  # битая дата — 500 с текстом ошибки, в файл не пишем
         
-        scheduled_messages.append(scheduled_data)
-        save_scheduled_messages(scheduled_messages)
+        await asyncio.to_thread(panel_jobs.add_message, scheduled_data)
+        note = _arm(scheduled_data)
         
         return jsonify({
             'success': True, 
-            'message': 'Сообщение запланировано',
+            'message': 'Сообщение запланировано' + note,
             'message_id': message_id
         })
     except Exception as e:
-        print(f"Ошибка при планировании сообщения: {e}")
+        log.error("Ошибка при планировании сообщения: %s", e)
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/scheduled', methods=['GET'])
-def get_scheduled():
+async def get_scheduled():
     """Возвращает список запланированных сообщений"""
     try:
-        messages = load_scheduled_messages()
+        chat_id_param = request.args.get('chat_id')
+        tag = panel_events.etag('scheduled', chat_id_param)
+        if _not_modified(tag):
+            return _not_modified_response(tag)
+
+        messages = await asyncio.to_thread(panel_jobs.load_messages)
 
         # Фильтрация по выбранному чату, если передан ?chat_id=
-        chat_id_param = request.args.get('chat_id')
         if chat_id_param:
             try:
                 cid = int(chat_id_param)
@@ -357,68 +400,57 @@ def get_scheduled():
                 pass
 
         # Добавляем системные расписания (read-only)
-        system_items = get_system_schedules(int(chat_id_param)) if chat_id_param else []
+        system_items = await asyncio.to_thread(get_system_schedules, int(chat_id_param)) if chat_id_param else []
 
-        return jsonify({'messages': messages + system_items})
+        return _with_etag(jsonify({'messages': messages + system_items}), tag)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/scheduled/<message_id>', methods=['DELETE'])
-def delete_scheduled(message_id):
+async def delete_scheduled(message_id):
     """Удаляет запланированное сообщение"""
     try:
-        messages = load_scheduled_messages()
-        messages = [m for m in messages if m['id'] != message_id]
-        save_scheduled_messages(messages)
-        
-        # Удаляем задачу из планировщика
-        try:
-            scheduler.remove_job(message_id)
-        except:
-            pass
+        await asyncio.to_thread(panel_jobs.remove_message, message_id)
+        panel_jobs.disarm(panel_jobs.get_job_queue(), message_id)
         
         return jsonify({'success': True, 'message': 'Сообщение удалено'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/scheduled/<message_id>', methods=['PUT'])
-def update_scheduled(message_id):
+async def update_scheduled(message_id):
     """Редактирует запланированное сообщение. Поддерживает как пользовательские, так и системные записи.
     Для системных: 
       - sys_daily_maket: можно изменить chat_id и time (HH:MM)
       - sys_friday_*: можно изменить time
     """
     try:
-        payload = request.json or {}
+        payload = await request.get_json(silent=True) or {}
         # Пользовательские задачи в файле
-        messages = load_scheduled_messages()
-        updated = False
-
-        for m in messages:
-            if m.get('id') == message_id:
-                # Разрешаем менять текст, время и паттерн
-                if 'message' in payload:
-                    m['message'] = payload['message']
-                if m.get('is_recurring') and 'recurring_pattern' in payload:
-                    m['recurring_pattern'] = payload['recurring_pattern']
-                if 'send_time' in payload:
-                    m['send_time'] = payload['send_time']
-                if 'chat_id' in payload:
-                    m['chat_id'] = int(payload['chat_id'])
-                save_scheduled_messages(messages)
-                updated = True
-                break
-
-        if updated:
-            return jsonify({'success': True, 'message': 'Задача обновлена'})
+        def edit(messages):
+            for m in messages:
+                if m.get('id') == message_id:
+                    # Разрешаем менять текст, время и паттерн
+                    if 'message' in payload:
+                        m['message'] = payload['message']
+                    if m.get('is_recurring') and 'recurring_pattern' in payload:
+                        m['recurring_pattern'] = payload['recurring_pattern']
+                    if 'send_time' in payload:
+                        m['send_time'] = payload['send_time']
+                    if 'chat_id' in payload:
+                        m['chat_id'] = int(payload['chat_id'])
+                    return m
+            return None
+
+        updated = await asyncio.to_thread(panel_jobs.update_messages, edit)
+        if updated is not None:
+            note = _arm(updated)
+            return jsonify({'success': True, 'message': 'Задача обновлена' + note})
 
         # Системные задачи
         if message_id == 'sys_daily_maket':
-            # Обновляем bot_settings.json
-            settings = {}
-            if os.path.exists(BOT_SETTINGS_FILE):
-                with open(BOT_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
+            # Обновляем bot_settings.json: читаем в потоке, пишем через поток persistence (туда же пишет бот)
+            settings = await asyncio.to_thread(_load_bot_settings)
             # Допустимые поля: scheduled_chat_id, scheduled_time
             if 'chat_id' in payload:
                 settings['scheduled_chat_id'] = int(payload['chat_id'])
@@ -427,8 +459,16 @@ def update_scheduled(message_id):
             # Часовой пояс сохраняем прежним
             if 'scheduled_timezone' not in settings:
                 settings['scheduled_timezone'] = 'Europe/Moscow'
-            with open(BOT_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            loop = asyncio.get_running_loop()
+
+            def on_written():
+                panel_events.publish('scheduled')
+                # /set_* и панель правят одно расписание: бот перечитывает уже записанный файл и переставляет задачу
+                loop.call_soon_threadsafe(bot_runtime.call_hook, 'reload_settings')
+
+            write_json(BOT_SETTINGS_FILE, settings, on_written=on_written)
+            if bot_runtime.get_application() is None:
+                return jsonify({'success': True, 'message': 'Системное расписание обновлено (применится после старта бота)'})
             return jsonify({'success': True, 'message': 'Системное расписание обновлено'})
 
         if message_id.startswith('sys_friday_'):
@@ -441,8 +481,23 @@ def update_scheduled(message_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+async def serve(port: int, shutdown_trigger=None) -> None:
+    """ASGI-сервер (Hypercorn) на текущем event loop. Из бота — с shutdown_trigger, чтобы остановиться вместе с ним."""
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{port}"]
+    config.accesslog = None
+    config.graceful_timeout = 5.0
+    await hypercorn_serve(app, config, shutdown_trigger=shutdown_trigger)
+
 if __name__ == '__main__':
+    setup_logging()
     port = int(os.environ.get('PORT', 5001))
-    print("🌐 Запуск веб-интерфейса...")
-    print(f"📍 Откройте в браузере: http://localhost:{port}" if port == 5001 else f"📍 Слушаю порт {port} (Railway)")
-    app.run(host='0.0.0.0', port=port, debug=(port == 5001))
+    log.info("🌐 Запуск веб-интерфейса...")
+    if port == 5001:
+        log.info("📍 Откройте в браузере: http://localhost:%s", port)
+    else:
+        log.info("📍 Слушаю порт %s (Railway)", port)
+    asyncio.run(serve(port))